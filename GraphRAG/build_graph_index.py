@@ -8,7 +8,6 @@ from __future__ import annotations
 
 import os
 import json
-import time
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
@@ -17,6 +16,11 @@ import numpy as np
 import faiss
 from dotenv import load_dotenv
 
+from ann_index import build_from_flat
+from embed_batches import embed_request, embed_to_array
+from embedding_cache import embed_cached, format_stats
+from graph_artifacts import write_records
+
 try:
     # openai>=1.0
     from openai import OpenAI
@@ -35,7 +39,7 @@ ENV_PATH = ROOT / ".env"
 
 COMM_PROFILES_PATH = ROOT / "data" / "graph" / "communities" / "communities_profiles.json"
 OUT_INDEX_PATH = ROOT / "data" / "graph" / "communities.faiss"
-OUT_META_PATH = ROOT / "data" / "graph" / "communities_meta.json"
+OUT_META_PATH = "communities_meta"   # artefact data/graph (Parquet ou JSON, voir graph_artifacts.py)
 
 
 # ----------------------------
@@ -116,40 +120,25 @@ def _community_text(c: Dict[str, Any]) -> str:
     return text if text else f"COMMUNITY {cid}"
 
 
-def _batched(items: List[Any], batch_size: int) -> List[List[Any]]:
-    return [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
-
-
 def _embed_texts(
     client: OpenAI,
     texts: List[str],
     model: str,
-    batch_size: int = 64,
+    dims: int | None = None,
     max_retries: int = 5,
-    sleep_base: float = 1.5,
 ) -> np.ndarray:
     """
     Returns embeddings as float32 array shape (n, d).
+    Goes through the shared embedding cache: only new / changed profiles hit the API.
+    Missing texts are packed by token count and sent concurrently (embed_batches.py),
+    each response is written straight into a preallocated float32 array.
+    dims: truncated embeddings (text-embedding-3-*), None = native dimension.
     """
-    all_vecs: List[List[float]] = []
-
-    for bi, batch in enumerate(_batched(texts, batch_size), start=1):
-        attempt = 0
-        while True:
-            try:
-                resp = client.embeddings.create(model=model, input=batch)
-                vecs = [d.embedding for d in resp.data]
-                all_vecs.extend(vecs)
-                break
-            except Exception as e:
-                attempt += 1
-                if attempt > max_retries:
-                    raise
-                wait = sleep_base * (2 ** (attempt - 1))
-                print(f"[embed] batch {bi} error: {e} -> retry in {wait:.1f}s")
-                time.sleep(wait)
-
-    X = np.array(all_vecs, dtype="float32")
+    def _one_request(batch: List[str]) -> np.ndarray:
+        return embed_request(client, model, batch, dims=dims, max_retries=max_retries)
+
+    X = embed_cached(texts, lambda missing: embed_to_array(missing, _one_request, label="[embed] profils"),
+                     model, dims=dims)
     if len(X.shape) != 2:
         raise RuntimeError("Embeddings retournés invalides (shape incorrect).")
     return X
@@ -169,11 +158,16 @@ def main() -> None:
 
     embed_model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small").strip()
     use_cosine = os.getenv("GRAPH_INDEX_COSINE", "1").strip() not in {"0", "false", "False"}
+    # 256 / 512 / 1024 / 1536 (empty = native), enforced on the query side via the index meta
+    embed_dims = int(os.getenv("OPENAI_EMBED_DIMENSIONS", "0").strip() or 0) or None
+    # flat | sqfp16 | sq8 | ivf | ivfpq | hnsw | opq | factory string (see ann_index.py)
+    index_spec = os.getenv("GRAPH_INDEX_SPEC", "flat").strip() or "flat"
 
     print(f"ENV: {ENV_PATH if ENV_PATH.exists() else '(no .env found)'}")
     print(f"Input profiles: {COMM_PROFILES_PATH}")
-    print(f"Embed model: {embed_model}")
+    print(f"Embed model: {embed_model} (dims: {embed_dims or 'native'})")
     print(f"Metric: {'cosine (IP on normalized vectors)' if use_cosine else 'L2'}")
+    print(f"Index spec: {index_spec}")
 
     raw = _read_json(COMM_PROFILES_PATH)
     comms = _as_community_list(raw)
@@ -217,10 +211,11 @@ def main() -> None:
 
     # Embeddings
     client = _get_openai_client()
-    X = _embed_texts(client, texts, model=embed_model, batch_size=64)
+    X = _embed_texts(client, texts, model=embed_model, dims=embed_dims)
 
     n, d = X.shape
     print(f"Embeddings: n={n}, d={d}")
+    print(f"[embed] {format_stats()}")
 
     # FAISS index
     OUT_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -233,26 +228,26 @@ def main() -> None:
 
     index.add(X)
 
-    # Save
-    faiss.write_index(index, str(OUT_INDEX_PATH))
-    with open(OUT_META_PATH, "w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "index_path": str(OUT_INDEX_PATH),
-                "meta_count": len(meta),
-                "dim": d,
-                "metric": "cosine" if use_cosine else "l2",
-                "embed_model": embed_model,
-                "items": meta,
-            },
-            f,
-            ensure_ascii=False,
-            indent=2,
-        )
+    # Save (flat → index_spec, recall/latency report, <index>.meta.json read by the retriever)
+    index = build_from_flat(index, OUT_INDEX_PATH, index_spec, metric="ip" if use_cosine else "l2",
+                            embed_model=embed_model, dims=embed_dims)
+    meta_paths = write_records(
+        OUT_META_PATH,
+        meta,
+        metadata={
+            "index_path": str(OUT_INDEX_PATH),
+            "meta_count": len(meta),
+            "dim": d,
+            "metric": "cosine" if use_cosine else "l2",
+            "index_spec": index_spec,
+            "embed_model": embed_model,
+            "dims": embed_dims,
+        },
+    )
 
     print("✅ Done.")
     print(f"FAISS index: {OUT_INDEX_PATH}")
-    print(f"Meta:       {OUT_META_PATH}")
+    print(f"Meta:       {', '.join(map(str, meta_paths))}")
 
 
 if __name__ == "__main__":
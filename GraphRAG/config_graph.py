@@ -1,10 +1,15 @@
 # src/config_graph.py
+import os
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 
 ENV_PATH = ROOT / ".env"
 
+# artefacts du graphe (voir graph_artifacts.py) : parquet | json | both
+GRAPH_DIR = ROOT / "data" / "graph"
+GRAPH_ARTIFACT_FORMAT = os.getenv("GRAPH_ARTIFACT_FORMAT", "parquet")
+
 OPENAI_CHAT_MODEL = "gpt-4o-mini"          # ou gpt-4.1-mini
 OPENAI_EMBED_MODEL = "text-embedding-3-small"
 
@@ -12,7 +17,6 @@ SOURCE_NAME_GRAPH = "CGI 2025 (GraphRAG Communities)"
 
 # chemins index communities
 GRAPH_INDEX_PATH = ROOT / "data" / "graph" / "communities.faiss"
-GRAPH_META_PATH  = ROOT / "data" / "graph" / "communities_meta.json"
 
 K_CANDIDATES = 20
 TOP_K_COMMUNITIES = 3
@@ -0,0 +1,311 @@
+# src/graph_artifacts.py
+"""
+Couche d'I/O unique pour les artefacts de data/graph/.
+
+Format par défaut : Parquet (colonnes, compression zstd) avec encodage dictionnaire
+des colonnes très répétées (ids, types de relations, evidence...), et lecture
+par projection de colonnes (on ne décode que ce qu'on lit).
+
+Un artefact est désigné par son nom relatif à data/graph/, sans extension :
+    "graph_edges_v2"            -> graph_edges_v2.parquet  (ou .json)
+    "communities/communities"   -> communities/communities.parquet
+
+Format d'écriture : GRAPH_ARTIFACT_FORMAT = parquet | json | both (config_graph / env).
+Une écriture au format configuré supprime la copie de l'autre format (devenue périmée) ;
+en lecture, le format configuré est préféré, sinon l'autre est relu (anciens JSON).
+Les exports JSON gardent exactement les formes historiques (liste, dict, dict + items).
+
+    python graph_artifacts.py convert              # JSON existants -> Parquet
+    python graph_artifacts.py export-json NOM ...  # Parquet -> JSON (inspection, outils tiers)
+"""
+import argparse
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow absent -> tout en JSON
+    pa = None
+    pq = None
+
+from config_graph import GRAPH_ARTIFACT_FORMAT, GRAPH_DIR
+
+# colonnes encodées en dictionnaire, par artefact connu
+DICTIONARY_COLUMNS = {
+    "graph_nodes": ["type"],
+    "graph_nodes_v2": ["type"],
+    "graph_edges": ["head", "tail", "relation", "chunk_id", "evidence"],
+    "graph_edges_v2": ["head_id", "tail_id", "relation", "chunk_id", "evidence"],
+    "communities_v2": ["community_id"],
+    "communities/communities": ["community_id", "member"],
+    "communities_meta": ["community_id"],
+}
+
+
+# =========================
+# 1) Chemins / format
+# =========================
+
+def artifact_path(name: str, fmt: str) -> Path:
+    return GRAPH_DIR / f"{name}.{fmt}"
+
+
+def _write_formats(fmt: Optional[str]) -> List[str]:
+    fmt = (fmt or GRAPH_ARTIFACT_FORMAT).lower()
+    if pa is None:
+        return ["json"]
+    return ["parquet", "json"] if fmt == "both" else [fmt]
+
+
+def exists(name: str) -> bool:
+    return artifact_path(name, "parquet").exists() or artifact_path(name, "json").exists()
+
+
+def _read_path(name: str) -> Path:
+    pq_path = artifact_path(name, "parquet")
+    js_path = artifact_path(name, "json")
+    candidates = [js_path, pq_path] if GRAPH_ARTIFACT_FORMAT.lower() == "json" else [pq_path, js_path]
+    for path in candidates:
+        if path.exists() and (path.suffix == ".json" or pq is not None):
+            return path
+    raise FileNotFoundError(f"Artefact introuvable : {pq_path} / {js_path}")
+
+
+def _drop_stale(name: str, written: Sequence[Path]) -> None:
+    # écriture au format configuré : la copie dans l'autre format n'est plus à jour
+    for f in ("parquet", "json"):
+        path = artifact_path(name, f)
+        if path not in written and path.exists():
+            path.unlink()
+
+
+def _dump_json(path: Path, obj: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _write_parquet(path: Path, rows: List[Dict[str, Any]], dictionary: Sequence[str],
+                   metadata: Optional[Dict[str, Any]] = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pylist(rows)
+    if metadata:
+        table = table.replace_schema_metadata(
+            {b"graph_artifact": json.dumps(metadata, ensure_ascii=False).encode("utf-8")}
+        )
+    cols = [c for c in dictionary if c in table.column_names]
+    pq.write_table(table, path, use_dictionary=cols or False, compression="zstd")
+
+
+# =========================
+# 2) Tables (liste d'objets)
+# =========================
+
+def write_records(
+    name: str,
+    rows: Iterable[Dict[str, Any]],
+    metadata: Optional[Dict[str, Any]] = None,
+    json_key: Optional[str] = None,
+    fmt: Optional[str] = None,
+) -> List[Path]:
+    """
+    Écrit une table (liste d'objets de même forme).
+
+    metadata : champs scalaires associés (ex: dim / metric de l'index) ; en JSON ils
+               sont écrits à côté de "items" : {**metadata, "items": [...]}.
+    json_key : si donné, l'export JSON est un dict {str(row[json_key]): row}.
+    """
+    rows = list(rows)
+    written = []
+    for f in _write_formats(fmt):
+        path = artifact_path(name, f)
+        if f == "parquet":
+            _write_parquet(path, rows, DICTIONARY_COLUMNS.get(name, []), metadata)
+        else:
+            obj: Any = {str(r[json_key]): r for r in rows} if json_key else rows
+            if metadata is not None:
+                obj = {**metadata, "items": obj}
+            _dump_json(path, obj)
+        written.append(path)
+    if fmt is None:
+        _drop_stale(name, written)
+    return written
+
+
+def read_table(name: str, columns: Optional[Sequence[str]] = None):
+    """
+    Table Arrow (Parquet uniquement) avec projection de colonnes ; les colonnes
+    encodées en dictionnaire restent des DictionaryArray (pas de chaînes dupliquées).
+    """
+    if pq is None:
+        raise ImportError("pyarrow requis pour read_table (pip install pyarrow)")
+    path = artifact_path(name, "parquet")
+    columns = _existing_columns(path, columns)
+    dict_cols = [c for c in DICTIONARY_COLUMNS.get(name, []) if columns is None or c in columns]
+    return pq.read_table(path, columns=columns, read_dictionary=dict_cols)
+
+
+def _existing_columns(path: Path, columns: Optional[Sequence[str]]) -> Optional[List[str]]:
+    # colonnes demandées absentes du fichier : ignorées (comme r.get(c) en JSON)
+    if not columns:
+        return None
+    names = set(pq.read_schema(path).names)
+    return [c for c in columns if c in names]
+
+
+def read_records(name: str, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Lit une table en liste de dict (Parquet de préférence, sinon JSON historique).
+    `columns` limite les champs lus / retournés (les absents sont ignorés).
+    """
+    path = _read_path(name)
+    if path.suffix == ".parquet":
+        return pq.read_table(path, columns=_existing_columns(path, columns)).to_pylist()
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, dict) and "items" in data:
+        data = data["items"]
+    if isinstance(data, dict):
+        data = list(data.values())
+    if columns:
+        cols = list(columns)
+        data = [{c: r[c] for c in cols if c in r} for r in data]
+    return data
+
+
+def read_metadata(name: str) -> Dict[str, Any]:
+    """
+    Champs scalaires écrits avec `metadata=` (sans les lignes).
+    """
+    path = _read_path(name)
+    if path.suffix == ".parquet":
+        raw = (pq.read_schema(path).metadata or {}).get(b"graph_artifact")
+        return json.loads(raw) if raw else {}
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, dict) and "items" in data:
+        return {k: v for k, v in data.items() if k != "items"}
+    return {}
+
+
+# =========================
+# 3) Mappings (clé -> valeur / clé -> liste)
+# =========================
+
+def write_mapping(name: str, mapping: Dict[Any, Any], key_col: str, value_col: str,
+                  fmt: Optional[str] = None) -> List[Path]:
+    """
+    Écrit un dict {clé: valeur} ou {clé: [valeurs]} (ex: communauté -> membres).
+    En Parquet : table longue (key_col, value_col), une ligne par valeur.
+    """
+    written = []
+    for f in _write_formats(fmt):
+        path = artifact_path(name, f)
+        if f == "json":
+            _dump_json(path, mapping)
+        else:
+            rows = []
+            for k, v in mapping.items():
+                for x in (v if isinstance(v, list) else [v]):
+                    rows.append({key_col: str(k), value_col: x})
+            _write_parquet(path, rows, DICTIONARY_COLUMNS.get(name, []),
+                           {"mapping": [key_col, value_col], "multi": any(isinstance(v, list) for v in mapping.values())})
+        written.append(path)
+    if fmt is None:
+        _drop_stale(name, written)
+    return written
+
+
+def read_mapping(name: str) -> Dict[str, Any]:
+    path = _read_path(name)
+    if path.suffix == ".json":
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    meta = read_metadata(name)
+    key_col, value_col = meta["mapping"]
+    table = pq.read_table(path, columns=[key_col, value_col])
+    keys = table.column(key_col).to_pylist()
+    values = table.column(value_col).to_pylist()
+    if not meta.get("multi"):
+        return dict(zip(keys, values))
+
+    out: Dict[str, List[Any]] = defaultdict(list)
+    for k, v in zip(keys, values):
+        out[k].append(v)
+    return dict(out)
+
+
+# =========================
+# 4) Artefacts connus
+# =========================
+
+def read_communities() -> Dict[str, List[str]]:
+    """
+    communities/communities : {community_id: [membres]}.
+    """
+    return read_mapping("communities/communities")
+
+
+def write_communities(comm: Dict[str, List[str]], fmt: Optional[str] = None) -> List[Path]:
+    return write_mapping("communities/communities", comm, "community_id", "member", fmt=fmt)
+
+
+# artefact -> (type, args) pour la conversion JSON -> Parquet
+KNOWN_ARTIFACTS = {
+    "graph_nodes": ("records", {}),
+    "graph_edges": ("records", {}),
+    "graph_nodes_v2": ("records", {}),
+    "graph_edges_v2": ("records", {}),
+    "communities_v2": ("mapping", {"key_col": "node_id", "value_col": "community_id"}),
+    "communities_v2_info": ("records", {"json_key": "community_id"}),
+    "communities/communities": ("mapping", {"key_col": "community_id", "value_col": "member"}),
+    "communities_meta": ("records", {"metadata": True}),
+}
+
+
+def _normalize_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # anciens fichiers : chunk_id entier, les nouveaux sont des chaînes
+    for r in rows:
+        if "chunk_id" in r and r["chunk_id"] is not None:
+            r["chunk_id"] = str(r["chunk_id"])
+    return rows
+
+
+def convert(name: str, fmt: str) -> List[Path]:
+    kind, kw = KNOWN_ARTIFACTS[name]
+    if kind == "mapping":
+        return write_mapping(name, read_mapping(name), kw["key_col"], kw["value_col"], fmt=fmt)
+
+    rows = _normalize_rows(read_records(name))
+    metadata = read_metadata(name) if kw.get("metadata") else None
+    return write_records(name, rows, metadata=metadata, json_key=kw.get("json_key"), fmt=fmt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Artefacts data/graph : conversion JSON <-> Parquet")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_conv = sub.add_parser("convert", help="Réécrit les artefacts existants en Parquet")
+    p_conv.add_argument("names", nargs="*", help="Artefacts (défaut : tous ceux trouvés)")
+    p_exp = sub.add_parser("export-json", help="Exporte des artefacts en JSON")
+    p_exp.add_argument("names", nargs="*", help="Artefacts (défaut : tous ceux trouvés)")
+    args = parser.parse_args()
+
+    fmt = "parquet" if args.cmd == "convert" else "json"
+    if fmt == "parquet" and pa is None:
+        raise ImportError("pyarrow requis pour écrire du Parquet (pip install pyarrow)")
+
+    names = args.names or [n for n in KNOWN_ARTIFACTS if exists(n)]
+    for name in names:
+        before = artifact_path(name, "json")
+        size_before = before.stat().st_size if before.exists() else None
+        for path in convert(name, fmt):
+            msg = f"✅ {name} → {path.name} ({path.stat().st_size / 1e3:.0f} Ko"
+            if size_before and fmt == "parquet":
+                msg += f", JSON {size_before / 1e3:.0f} Ko"
+            print(msg + ")")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,19 @@
 # src/graphrag_refine_communities.py
-import json
-from pathlib import Path
 from collections import Counter, defaultdict
 
 import networkx as nx
 
+from graph_artifacts import exists, read_records, write_mapping, write_records
+
 
 # -----------------------
-# Paths projet (adaptés à ta structure)
+# Artefacts data/graph/ (Parquet ou JSON, voir graph_artifacts.py)
 # -----------------------
-PROJECT_ROOT = Path(__file__).resolve().parents[1]
-GRAPH_DIR = PROJECT_ROOT / "data" / "graph"
-NODES_PATH = GRAPH_DIR / "graph_nodes.json"
-EDGES_PATH = GRAPH_DIR / "graph_edges.json"
+NODES_PATH = "graph_nodes"
+EDGES_PATH = "graph_edges"
 
-OUT_COMMUNITIES = GRAPH_DIR / "communities_v2.json"          # mapping node_id -> community_id
-OUT_COMMUNITY_SUMMARY = GRAPH_DIR / "communities_v2_info.json"  # infos + thème + top nodes
+OUT_COMMUNITIES = "communities_v2"              # mapping node_id -> community_id
+OUT_COMMUNITY_SUMMARY = "communities_v2_info"   # infos + thème + top nodes
 
 
 # -----------------------
@@ -36,9 +34,10 @@ TOP_KEYWORDS = 10
 # -----------------------
 # Helpers
 # -----------------------
-def load_graph(nodes_path: Path, edges_path: Path) -> nx.Graph:
-    nodes = json.loads(nodes_path.read_text(encoding="utf-8"))
-    edges = json.loads(edges_path.read_text(encoding="utf-8"))
+def load_graph(nodes_path: str, edges_path: str) -> nx.Graph:
+    nodes = read_records(nodes_path)
+    # seules les colonnes utiles au graphe (evidence, chunk_id... ne sont pas décodés)
+    edges = read_records(edges_path, columns=["head", "tail", "relation", "weight"])
 
     G = nx.Graph()
 
@@ -180,8 +179,8 @@ def build_community_info(G: nx.Graph, node_to_comm: dict) -> dict:
 
 
 def main():
-    if not NODES_PATH.exists() or not EDGES_PATH.exists():
-        raise FileNotFoundError("graph_nodes.json / graph_edges.json introuvables dans data/graph/")
+    if not exists(NODES_PATH) or not exists(EDGES_PATH):
+        raise FileNotFoundError("graph_nodes / graph_edges introuvables dans data/graph/")
 
     print("📥 Chargement du graphe...")
     G = load_graph(NODES_PATH, EDGES_PATH)
@@ -203,13 +202,12 @@ def main():
     print("🏷️ Génération des thèmes + résumé...")
     info = build_community_info(G, node_to_comm)
 
-    OUT_COMMUNITIES.parent.mkdir(parents=True, exist_ok=True)
-    OUT_COMMUNITIES.write_text(json.dumps(node_to_comm, ensure_ascii=False, indent=2), encoding="utf-8")
-    OUT_COMMUNITY_SUMMARY.write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding="utf-8")
+    paths = write_mapping(OUT_COMMUNITIES, node_to_comm, "node_id", "community_id")
+    paths += write_records(OUT_COMMUNITY_SUMMARY, list(info.values()), json_key="community_id")
 
     print("✅ Sauvegardé :")
-    print(f"   - {OUT_COMMUNITIES}")
-    print(f"   - {OUT_COMMUNITY_SUMMARY}")
+    for p in paths:
+        print(f"   - {p}")
 
 
 if __name__ == "__main__":
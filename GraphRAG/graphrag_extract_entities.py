@@ -2,15 +2,16 @@
 import json
 import time
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator
 
 from dotenv import load_dotenv
 from openai import OpenAI
 
 from config_cgi import ENV_PATH
+from chunk_manifest import apply_manifest_to_jsonl
+from chunks_io import default_chunks_path, iter_chunks
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
-CHUNKS_PATH = PROJECT_ROOT / "data" / "json" / "cgi-2025_chunks.json"
 
 OUT_DIR = PROJECT_ROOT / "data" / "graph" / "entities"
 OUT_PATH = OUT_DIR / "entities.jsonl"
@@ -34,9 +35,11 @@ SYSTEM = (
 def ensure_dirs():
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def load_chunks() -> List[Dict[str, Any]]:
-    with open(CHUNKS_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+def load_chunks() -> Iterator[Dict[str, Any]]:
+    """
+    Flux de chunks (JSONL lu ligne à ligne) : pas de chargement du tableau complet.
+    """
+    return iter_chunks(default_chunks_path())
 
 def extract_entities_one(client: OpenAI, chunk: Dict[str, Any]) -> Dict[str, Any]:
     chunk_id = chunk.get("id")
@@ -64,8 +67,8 @@ Tâche:
 
 Réponds EXACTEMENT avec ce JSON:
 {{
-  "chunk_id": {chunk_id},
-  "source": "cgi-2025",
+  "chunk_id": {json.dumps(chunk_id)},
+  "source": {json.dumps(chunk.get("source") or "cgi-2025", ensure_ascii=False)},
   "title": {json.dumps(title, ensure_ascii=False)},
   "article": {json.dumps(article, ensure_ascii=False)},
   "entities": [
@@ -90,24 +93,29 @@ def main():
     client = OpenAI()
 
     ensure_dirs()
-    chunks = load_chunks()
-    print(f"📦 {len(chunks)} chunks chargés.")
+    print(f"📦 Lecture des chunks (en flux) : {default_chunks_path()}")
 
     # Reprise: si fichier existe, on saute ceux déjà traités
+    # Chunks supprimés / modifiés depuis le dernier build : leurs lignes sont purgées,
+    # la reprise ci-dessous les retraite.
+    purged = apply_manifest_to_jsonl(OUT_PATH)
+    if purged:
+        print(f"🧾 Manifest: {purged} lignes obsolètes purgées.")
+
     done = set()
     if OUT_PATH.exists():
         with open(OUT_PATH, "r", encoding="utf-8") as f:
             for line in f:
                 try:
                     obj = json.loads(line)
-                    done.add(obj.get("chunk_id"))
+                    done.add(str(obj.get("chunk_id")))
                 except Exception:
                     pass
         print(f"↩️ Reprise activée: {len(done)} chunks déjà traités.")
 
     with open(OUT_PATH, "a", encoding="utf-8") as out:
-        for i, ch in enumerate(chunks, start=1):
-            cid = ch.get("id")
+        for i, ch in enumerate(load_chunks(), start=1):
+            cid = str(ch.get("id"))
             if cid in done:
                 continue
 
@@ -115,7 +123,7 @@ def main():
                 obj = extract_entities_one(client, ch)
                 out.write(json.dumps(obj, ensure_ascii=False) + "\n")
                 if i % 20 == 0:
-                    print(f"✅ {i}/{len(chunks)}")
+                    print(f"✅ {i} chunks parcourus")
                 time.sleep(0.05)  # petite pause anti-rate-limit
             except Exception as e:
                 print(f"❌ chunk {cid} erreur: {e}")
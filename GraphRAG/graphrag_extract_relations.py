@@ -8,10 +8,12 @@ from dotenv import load_dotenv
 from openai import OpenAI
 
 from config_cgi import ENV_PATH
+from article_refs import extract_refs
+from chunk_manifest import apply_manifest_to_jsonl
+from chunks_io import default_chunks_path, iter_chunks
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
-CHUNKS_PATH = PROJECT_ROOT / "data" / "json" / "cgi-2025_chunks.json"
 ENTITIES_PATH = PROJECT_ROOT / "data" / "graph" / "entities" / "entities.jsonl"
 
 OUT_DIR = PROJECT_ROOT / "data" / "graph" / "relations"
@@ -33,10 +35,8 @@ ALLOWED_RELATIONS = [
     "REFERENCE"
 ]
 
-def load_chunks() -> Dict[int, Dict[str, Any]]:
-    with open(CHUNKS_PATH, "r", encoding="utf-8") as f:
-        arr = json.load(f)
-    return {int(c["id"]): c for c in arr}
+def load_chunks() -> Dict[str, Dict[str, Any]]:
+    return {str(c["id"]): c for c in iter_chunks(default_chunks_path())}
 
 def iter_entities():
     with open(ENTITIES_PATH, "r", encoding="utf-8") as f:
@@ -59,6 +59,15 @@ def extract_relations_one(client: OpenAI, chunk: Dict[str, Any], entities_obj: D
     # On ne garde que les entités “fiables”
     entities = [e for e in entities if (e.get("label") and (e.get("confidence", 0) >= 0.55))]
 
+    # Renvois entre articles déjà extraits sans LLM (article_refs.py → arêtes REFERENCE)
+    known_refs = sorted({r["dst"] for r in extract_refs(text)})
+    refs_rule = ""
+    if known_refs:
+        refs_rule = (
+            "4) Les renvois vers ces articles du CGI sont déjà extraits : ne produis PAS de relation "
+            f"REFERENCE vers eux : {json.dumps(known_refs, ensure_ascii=False)}\n"
+        )
+
     prompt = f"""
 Chunk:
 - id: {chunk_id}
@@ -80,11 +89,11 @@ Tâche:
    - "tail": label entité cible
    - "evidence": courte citation/fragment (<= 25 mots) prouvant la relation
    - "confidence": 0..1
-
+{refs_rule}
 Réponds EXACTEMENT avec ce JSON:
 {{
-  "chunk_id": {chunk_id},
-  "source": "cgi-2025",
+  "chunk_id": {json.dumps(chunk_id)},
+  "source": {json.dumps(entities_obj.get("source") or "cgi-2025", ensure_ascii=False)},
   "title": {json.dumps(title, ensure_ascii=False)},
   "article": {json.dumps(article, ensure_ascii=False)},
   "relations": [
@@ -111,13 +120,19 @@ def main():
     ensure_dirs()
     chunks_by_id = load_chunks()
 
+    # Chunks supprimés / modifiés depuis le dernier build : leurs lignes sont purgées,
+    # la reprise ci-dessous les retraite.
+    purged = apply_manifest_to_jsonl(OUT_PATH)
+    if purged:
+        print(f"🧾 Manifest: {purged} lignes obsolètes purgées.")
+
     done = set()
     if OUT_PATH.exists():
         with open(OUT_PATH, "r", encoding="utf-8") as f:
             for line in f:
                 try:
                     obj = json.loads(line)
-                    done.add(obj.get("chunk_id"))
+                    done.add(str(obj.get("chunk_id")))
                 except Exception:
                     pass
         print(f"↩️ Reprise: {len(done)} chunks déjà traités.")
@@ -125,7 +140,7 @@ def main():
     count = 0
     with open(OUT_PATH, "a", encoding="utf-8") as out:
         for ent in iter_entities():
-            cid = int(ent["chunk_id"])
+            cid = str(ent["chunk_id"])
             if cid in done:
                 continue
 
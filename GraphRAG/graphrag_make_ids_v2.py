@@ -1,16 +1,16 @@
 # src/graphrag_make_ids_v2.py
-import json
 import re
 import hashlib
-from pathlib import Path
 
-ROOT = Path(__file__).resolve().parents[1]
+from article_refs import load_refs
+from graph_artifacts import read_records, write_records
 
-NODES_IN = ROOT / "data" / "graph" / "graph_nodes.json"
-EDGES_IN = ROOT / "data" / "graph" / "graph_edges.json"
+# artefacts data/graph/ (Parquet ou JSON, voir graph_artifacts.py)
+NODES_IN = "graph_nodes"
+EDGES_IN = "graph_edges"
 
-NODES_OUT = ROOT / "data" / "graph" / "graph_nodes_v2.json"
-EDGES_OUT = ROOT / "data" / "graph" / "graph_edges_v2.json"
+NODES_OUT = "graph_nodes_v2"
+EDGES_OUT = "graph_edges_v2"
 
 
 def _norm_label(s: str) -> str:
@@ -49,8 +49,8 @@ def _relation_str(rel):
 
 
 def main():
-    nodes_raw = json.load(open(NODES_IN, "r", encoding="utf-8"))
-    edges_raw = json.load(open(EDGES_IN, "r", encoding="utf-8"))
+    nodes_raw = read_records(NODES_IN)
+    edges_raw = read_records(EDGES_IN)
 
     # 1) nodes -> ajout id
     label_to_id = {}
@@ -97,17 +97,46 @@ def main():
             "tail_id": tail_id,
             "relation": _relation_str(e.get("relation")),
             "confidence": float(e.get("confidence") or 0.0),
-            "chunk_id": e.get("chunk_id"),
+            "chunk_id": None if e.get("chunk_id") is None else str(e.get("chunk_id")),
             "evidence": e.get("evidence") or ""
         })
 
-    json.dump(nodes_v2, open(NODES_OUT, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
-    json.dump(edges_v2, open(EDGES_OUT, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
+    # 3) renvois entre articles extraits sans LLM (article_refs.py) → arêtes REFERENCE
+    refs = load_refs()
+    n_refs = 0
+    if refs:
+        known = {(e["head_id"], e["tail_id"], e["relation"]) for e in edges_v2}
+        for r in refs["edges"]:
+            ids = []
+            for article in (r["src"], r["dst"]):
+                label = article.capitalize()  # "ARTICLE 9 BIS" -> "Article 9 bis"
+                nid = label_to_id.get(_norm_label(label))
+                if not nid:
+                    nid = _make_id(label, "DOCUMENT")
+                    label_to_id[_norm_label(label)] = nid
+                    nodes_v2.append({"id": nid, "label": label, "type": "DOCUMENT", "aliases": []})
+                ids.append(nid)
+            if (ids[0], ids[1], "REFERENCE") in known:
+                continue
+            known.add((ids[0], ids[1], "REFERENCE"))
+            edges_v2.append({
+                "head_id": ids[0],
+                "tail_id": ids[1],
+                "relation": "REFERENCE",
+                "confidence": 1.0,
+                "chunk_id": str(r["chunk_id"]),
+                "evidence": r["evidence"],
+            })
+            n_refs += 1
+
+    nodes_paths = write_records(NODES_OUT, nodes_v2)
+    edges_paths = write_records(EDGES_OUT, edges_v2)
 
     print("✅ V2 export ok")
-    print(f"- Nodes in:  {len(nodes_raw)}   -> Nodes v2: {len(nodes_v2)}  ({NODES_OUT})")
-    print(f"- Edges in:  {len(edges_raw)}   -> Edges v2: {len(edges_v2)}  ({EDGES_OUT})")
+    print(f"- Nodes in:  {len(nodes_raw)}   -> Nodes v2: {len(nodes_v2)}  ({', '.join(map(str, nodes_paths))})")
+    print(f"- Edges in:  {len(edges_raw)}   -> Edges v2: {len(edges_v2)}  ({', '.join(map(str, edges_paths))})")
     print(f"- Skipped edges (missing endpoints): {skipped_missing}")
+    print(f"- REFERENCE edges from article_refs: {n_refs}")
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 import json
+import hashlib
 import time
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
@@ -14,6 +15,8 @@ from typing import Any, Dict, List, Tuple
 from dotenv import load_dotenv
 from pathlib import Path
 
+from graph_artifacts import exists, read_mapping, read_records
+
 ROOT = Path(__file__).resolve().parents[1]
 load_dotenv(ROOT / ".env")
 
@@ -22,7 +25,7 @@ def _get_openai_client():
     return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 ROOT = Path(__file__).resolve().parents[1]
-COMM_PATH = ROOT / "data" / "graph" / "communities" / "communities.json"
+COMM_PATH = "communities/communities"   # artefact data/graph (Parquet ou JSON)
 
 OUT_PROFILES = ROOT / "data" / "graph" / "communities" / "communities_profiles.json"
 OUT_SELECTION = ROOT / "data" / "graph" / "communities" / "communities_selection.json"
@@ -38,8 +41,8 @@ LLM_MODEL = os.getenv("OPENAI_LLM_MODEL", "gpt-4o-mini")
 KW_MIN = 6
 KW_MAX = 12
 
-def load_communities(path: Path) -> Dict[str, Any]:
-    data = json.load(open(path, "r", encoding="utf-8"))
+def load_communities(name: str) -> Dict[str, Any]:
+    data = read_mapping(name)
     if not isinstance(data, dict):
         raise ValueError("communities.json doit être un dict {community_id: ...}")
     return data
@@ -99,19 +102,24 @@ def choose_topN(comm_map: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[st
     }
     return selected, stats
 
+def members_hash(members: List[str]) -> str:
+    """
+    Empreinte de l'ensemble des membres (indépendante de l'ordre).
+    """
+    h = hashlib.sha256("\n".join(sorted(str(m) for m in members)).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
 def load_nodes_labels() -> Dict[str, str]:
     """
     Optionnel mais utile:
     - si on a graph_nodes_v2.json: {id,label,type,...}
     - sinon on fait sans (on résume quand même).
     """
-    candidates = [
-        ROOT / "data" / "graph" / "graph_nodes_v2.json",
-        ROOT / "data" / "graph" / "graph_nodes.json",
-    ]
+    candidates = ["graph_nodes_v2", "graph_nodes"]
     for p in candidates:
-        if p.exists():
-            data = json.load(open(p, "r", encoding="utf-8"))
+        if exists(p):
+            data = read_records(p, columns=["id", "label"])
             if isinstance(data, list):
                 out = {}
                 for n in data:
@@ -190,15 +198,28 @@ def main():
         if not isinstance(profiles, dict):
             profiles = {}
 
+    # profils existants indexés par empreinte des membres : une communauté inchangée
+    # (même ensemble de noeuds, même si son id a changé) n'est pas re-résumée
+    by_hash = {
+        p.get("members_hash"): p for p in profiles.values()
+        if isinstance(p, dict) and p.get("members_hash") and p.get("title")
+    }
+
     client = _get_openai_client()
 
     # run
     for i, item in enumerate(selected, start=1):
         cid = item["community_id"]
-        if cid in profiles and all(k in profiles[cid] for k in ["title", "summary", "keywords"]):
+        members = extract_member_ids(comm_map[cid])
+        mhash = members_hash(members)
+
+        prev = profiles.get(cid)
+        if prev and prev.get("members_hash") == mhash and all(k in prev for k in ["title", "summary", "keywords"]):
             continue  # déjà fait
+        if mhash in by_hash:
+            profiles[cid] = dict(by_hash[mhash], community_id=cid, nb_members=item["nb_members"])
+            continue  # même communauté, renumérotée
 
-        members = extract_member_ids(comm_map[cid])
         labels = []
         for mid in members:
             # si on a le mapping id->label (v2)
@@ -214,6 +235,7 @@ def main():
                 prof = openai_generate_profile(client, cid, labels)
                 prof["community_id"] = cid
                 prof["nb_members"] = item["nb_members"]
+                prof["members_hash"] = mhash
                 profiles[cid] = prof
 
                 # save incremental (important)
@@ -235,6 +257,10 @@ def main():
         if i % 20 == 0:
             print(f"[{i}/{len(selected)}] communautés traitées...")
 
+    # profils réutilisés (communautés renumérotées) compris
+    OUT_PROFILES.parent.mkdir(parents=True, exist_ok=True)
+    json.dump(profiles, open(OUT_PROFILES, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
+
     # selection file
     OUT_SELECTION.parent.mkdir(parents=True, exist_ok=True)
     json.dump({"stats": stats, "selected": selected}, open(OUT_SELECTION, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
@@ -1,9 +1,11 @@
 # src/neo4j_load_communities_v2.py
-import os, json
+import os
 from pathlib import Path
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
 
+from graph_artifacts import read_communities
+
 ROOT = Path(__file__).resolve().parents[1]
 ENV_PATH = ROOT / ".env"
 load_dotenv(ENV_PATH)
@@ -12,7 +14,6 @@ NEO4J_URI = os.getenv("NEO4J_URI", "bolt://127.0.0.1:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
-COMM_PATH = ROOT / "data" / "graph" / "communities" / "communities.json"
 
 def iter_communities(comm_data):
     """
@@ -38,7 +39,7 @@ def iter_communities(comm_data):
         raise TypeError(f"Unsupported communities format: {type(comm_data)}")
 
 def main():
-    comm_data = json.load(open(COMM_PATH, "r", encoding="utf-8"))
+    comm_data = read_communities()
 
     driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
     with driver.session() as session:
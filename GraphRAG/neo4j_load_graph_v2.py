@@ -1,18 +1,18 @@
 # src/neo4j_load_graph_v2.py
 import os
-import json
 import hashlib
 from pathlib import Path
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
 
-from pathlib import Path
+from graph_artifacts import read_records
 
 ROOT = Path(__file__).resolve().parents[1]
 ENV_PATH = ROOT / ".env"
 
-NODES_PATH = ROOT / "data" / "graph" / "graph_nodes_v2.json"
-EDGES_PATH = ROOT / "data" / "graph" / "graph_edges_v2.json"
+# artefacts data/graph/ (Parquet ou JSON, voir graph_artifacts.py)
+NODES_PATH = "graph_nodes_v2"
+EDGES_PATH = "graph_edges_v2"
 
 BATCH = 500
 
@@ -37,8 +37,8 @@ def main():
     print("NEO4J_USER =", user)
     print("NEO4J_PASSWORD is set ?", bool(pwd))
 
-    nodes = json.load(open(NODES_PATH, "r", encoding="utf-8"))
-    edges = json.load(open(EDGES_PATH, "r", encoding="utf-8"))
+    nodes = read_records(NODES_PATH, columns=["id", "label", "type", "aliases"])
+    edges = read_records(EDGES_PATH)
 
     # Prepare edges with rid
     for e in edges:
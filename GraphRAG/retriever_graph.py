@@ -1,19 +1,24 @@
 # src/retriever_graph.py
 import os
 import json
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Any
 
 import numpy as np
-import faiss
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from ann_index import load_index, load_meta
+from embed_batches import embed_request
+from embedding_cache import embed_cached
+from graph_artifacts import exists, read_records
+
 
 ROOT = Path(__file__).resolve().parents[1]
 
 GRAPH_INDEX_PATH = ROOT / "data" / "graph" / "communities.faiss"
-GRAPH_META_PATH = ROOT / "data" / "graph" / "communities_meta.json"
+GRAPH_META_PATH = "communities_meta"   # artefact data/graph (Parquet ou JSON)
 COMM_PROFILES_PATH = ROOT / "data" / "graph" / "communities" / "communities_profiles.json"
 
 ENV_PATH = ROOT / ".env"
@@ -29,19 +34,27 @@ if not OPENAI_API_KEY:
 client = OpenAI(api_key=OPENAI_API_KEY)
 
 
-def _embed(text: str) -> np.ndarray:
+def _embed(text: str, dim: int, dims: int | None = None) -> np.ndarray:
+    """
+    `dim` : dimension de l'index ; `dims` : dimension demandée à l'API (None = native),
+    lue dans la méta de l'index.
+    """
     text = (text or "").strip()
     if not text:
-        return np.zeros((1536,), dtype=np.float32)
-    resp = client.embeddings.create(model=OPENAI_EMBED_MODEL, input=text)
-    return np.array(resp.data[0].embedding, dtype=np.float32)
+        return np.zeros((dim,), dtype=np.float32)
+    # cache partagé : une question répétée ne repart pas à l'API
+    vec = embed_cached([text], lambda t: embed_request(client, OPENAI_EMBED_MODEL, t, dims=dims),
+                       OPENAI_EMBED_MODEL, dims=dims)[0]
+    if vec.shape[0] != dim:
+        raise ValueError(f"Question embeddée en dim={vec.shape[0]}, index en dim={dim} : "
+                         "relancer build_graph_index.py")
+    return vec
 
 
 def _load_meta_items() -> List[Dict[str, Any]]:
     # 1) meta alignée FAISS
-    if GRAPH_META_PATH.exists():
-        meta = json.load(open(GRAPH_META_PATH, "r", encoding="utf-8"))
-        items = meta.get("items")
+    if exists(GRAPH_META_PATH):
+        items = read_records(GRAPH_META_PATH)
         if isinstance(items, list) and items:
             return items
 
@@ -71,6 +84,16 @@ def _load_meta_items() -> List[Dict[str, Any]]:
     )
 
 
+@lru_cache(maxsize=1)
+def _open_index(path: str, mtime: float):
+    """
+    Index (mmap, ouvert une seule fois par processus) + meta alignée + dimension
+    d'embedding du build. Clé = mtime du fichier : un rebuild de l'index est pris en
+    compte à la requête suivante.
+    """
+    return load_index(Path(path)), _load_meta_items(), load_meta(Path(path)).get("dims")
+
+
 def search_communities(query: str, k_candidates: int = 10) -> List[Dict[str, Any]]:
     """
     IMPORTANT: format attendu par engine_graph.py:
@@ -79,10 +102,10 @@ def search_communities(query: str, k_candidates: int = 10) -> List[Dict[str, Any
     if not GRAPH_INDEX_PATH.exists():
         raise FileNotFoundError(f"Index FAISS introuvable: {GRAPH_INDEX_PATH}")
 
-    index = faiss.read_index(str(GRAPH_INDEX_PATH))
-    meta_items = _load_meta_items()
+    # nprobe / efSearch lus dans communities.faiss.meta.json
+    index, meta_items, dims = _open_index(str(GRAPH_INDEX_PATH), GRAPH_INDEX_PATH.stat().st_mtime)
 
-    q = _embed(query).astype(np.float32).reshape(1, -1)
+    q = _embed(query, index.d, dims).astype(np.float32).reshape(1, -1)
     D, I = index.search(q, k_candidates)
 
     out: List[Dict[str, Any]] = []
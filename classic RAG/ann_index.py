@@ -0,0 +1,425 @@
+# src/ann_index.py
+"""
+Types d'index FAISS interchangeables (exact ou approché) pour les index de chunks,
+de passages et de communautés.
+
+    spec    = flat | sqfp16 | sq8 | ivf | ivfsq8 | ivfpq | hnsw | opq
+              (ou chaîne index_factory FAISS brute)
+    méta    = <index>.meta.json : spec, chaîne factory, métrique, dim, nprobe / efSearch
+
+- les builders construisent d'abord l'index exact (Flat, ajout en flux), puis le
+  convertissent vers la spec demandée : entraînement sur un échantillon, ajout de
+  tous les vecteurs ;
+- `ann_report` compare l'index approché au Flat : recall@k, latence p50/p99,
+  temps de build, taille ;
+- les retrievers ouvrent l'index avec `load_index`, qui applique nprobe / efSearch
+  lus dans la méta ; l'index est mappé en mémoire (ANN_MMAP) : pas de lecture complète
+  au démarrage, une seule copie en page cache partagée entre les processus workers.
+  Avec sqfp16 / sq8 (codes 2 / 1 octet par dimension) le fichier est 2 / 4 fois plus petit ;
+- avec `ids`, les vecteurs sont indexés par identifiant stable au lieu du numéro de
+  ligne (IndexIDMap2, ou ids natifs + table de hachage pour les IVF) : ajout /
+  suppression / remplacement en place (voir chunk_index.py), méta "id_map": true.
+
+    python ann_index.py report data/index/cgi-2025_faiss.index --spec ivfpq
+"""
+import argparse
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from config_cgi import ANN_EF_SEARCH, ANN_MMAP, ANN_NPROBE, ANN_REPORT_QUERIES, ANN_TRAIN_SAMPLE
+
+# Specs nommées → chaîne index_factory (nlist / m / nbits calculés sur le corpus)
+SPECS = {
+    "flat": "Flat",
+    "sqfp16": "SQfp16",
+    "sq8": "SQ8",
+    "ivf": "IVF{nlist},Flat",
+    "ivfsq8": "IVF{nlist},SQ8",
+    "ivfpq": "IVF{nlist},PQ{m}x{nbits}",
+    "hnsw": "HNSW32,Flat",
+    "opq": "OPQ{m},IVF{nlist},PQ{m}x{nbits}",
+}
+
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+
+
+# =========================
+# 1) Spec → chaîne index_factory
+# =========================
+
+def _meta_path(index_path: Path) -> Path:
+    index_path = Path(index_path)
+    return index_path.with_name(index_path.name + ".meta.json")
+
+
+def factory_string(spec: str, n: int, d: int) -> str:
+    """
+    Chaîne index_factory pour `n` vecteurs de dimension `d`.
+    nlist ≈ 4·√n (au moins 39 points d'entraînement par centroïde),
+    m = sous-vecteurs de ~16 dimensions, nbits ≤ 8 selon la taille du corpus.
+    """
+    template = SPECS.get(spec.lower(), spec)
+    nlist = max(1, min(int(4 * math.sqrt(n)), n // 39))
+    m = next(c for c in (d // 16, d // 12, d // 8, d // 4, d // 2, d, 1) if c and d % c == 0)
+    nbits = max(1, min(8, int(math.log2(max(2, n // 39)))))
+    return template.format(nlist=nlist, m=m, nbits=nbits)
+
+
+def is_exact(index: faiss.Index) -> bool:
+    """
+    True si `reconstruct` rend les vecteurs d'origine (pas de compression).
+    Prépare au passage la table id → liste des index IVF.
+    """
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        return False
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if not isinstance(faiss.downcast_index(ivf), faiss.IndexIVFFlat):
+            return False
+        if ivf.direct_map.no():  # index à ids stables : table de hachage déjà en place
+            ivf.make_direct_map()
+        return True
+    return isinstance(index, (faiss.IndexFlat, faiss.IndexHNSWFlat))
+
+
+# =========================
+# 2) Construction
+# =========================
+
+def _ivf_with_ids(index: faiss.Index):
+    # IVF rempli par `add_with_ids` : ids arbitraires, table de hachage id → position
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.Hashtable:
+        return ivf
+    return None
+
+
+def index_ids(index: faiss.Index) -> np.ndarray:
+    """
+    Identifiants des vecteurs, dans l'ordre de `all_vectors` (lignes 0..n-1 sans ids).
+    """
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map).astype("int64")
+    ivf = _ivf_with_ids(index)
+    if ivf is not None:
+        lists = ivf.invlists
+        parts = [faiss.rev_swig_ptr(lists.get_ids(i), lists.list_size(i)).copy()
+                 for i in range(ivf.nlist) if lists.list_size(i)]
+        return np.concatenate(parts).astype("int64") if parts else np.zeros(0, dtype="int64")
+    return np.arange(index.ntotal, dtype="int64")
+
+
+def all_vectors(index: faiss.Index) -> np.ndarray:
+    """
+    Vecteurs [n, d] de l'index (dans l'ordre de `index_ids`).
+    """
+    if not index.ntotal:
+        return np.zeros((0, index.d), dtype="float32")
+    if isinstance(index, faiss.IndexIDMap):
+        return all_vectors(faiss.downcast_index(index.index))
+    if _ivf_with_ids(index) is not None:
+        return index.reconstruct_batch(index_ids(index))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def reconstruct_ids(index: faiss.Index, ids: np.ndarray) -> np.ndarray:
+    """
+    Vecteurs [n, d] des `ids` (numéros de ligne, ou ids stables d'un index "id_map"),
+    approchés pour un index compressé. Prépare la table id → liste des IVF au premier appel.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.no():
+        ivf.make_direct_map()
+    return index.reconstruct_batch(np.ascontiguousarray(ids, dtype="int64"))
+
+
+def add_with_ids(index: faiss.Index, vectors: np.ndarray, ids: np.ndarray) -> faiss.Index:
+    """
+    Remplit un index vide (entraîné) avec des ids stables. Les IVF gardent les ids
+    dans leurs listes (table de hachage id → position pour reconstruct / remove) ;
+    les autres sont enveloppés dans un IndexIDMap2.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        faiss.downcast_index(ivf).set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        index = faiss.IndexIDMap2(index)
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.ascontiguousarray(ids, dtype="int64"))
+    return index
+
+
+def convert_index(
+    flat: faiss.Index,
+    spec: str,
+    metric: str = "l2",
+    train_sample: int = ANN_TRAIN_SAMPLE,
+    seed: int = 0,
+    ids: Optional[np.ndarray] = None,
+) -> Tuple[faiss.Index, str]:
+    """
+    Index `spec` construit à partir des vecteurs d'un index exact.
+    Retourne (index, chaîne factory). Flat sans `ids` → l'index d'entrée tel quel.
+    `ids` : identifiants stables des lignes de `flat` (voir `add_with_ids`).
+    """
+    xb = all_vectors(flat)
+    factory = factory_string(spec, len(xb), flat.d)
+    if factory == "Flat" and ids is None:
+        return flat, factory
+
+    index = faiss.index_factory(flat.d, factory, METRICS[metric])
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = xb if len(xb) <= train_sample else xb[rng.choice(len(xb), train_sample, replace=False)]
+        index.train(sample)
+    if ids is not None:
+        return add_with_ids(index, xb, ids), factory
+    index.add(xb)
+    return index, factory
+
+
+def apply_search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None) -> None:
+    """
+    nprobe (IVF) / efSearch (HNSW), y compris derrière une transformation (OPQ).
+    """
+    ps = faiss.ParameterSpace()
+    if nprobe and faiss.try_extract_index_ivf(index) is not None:
+        ps.set_index_parameter(index, "nprobe", int(nprobe))
+    if ef_search and "HNSW" in _describe(index):
+        ps.set_index_parameter(index, "efSearch", int(ef_search))
+
+
+def search_parameters(index: faiss.Index, sel: faiss.IDSelector) -> faiss.SearchParameters:
+    """
+    Paramètres de `index.search(..., params=)` portant le filtre `sel`.
+    Des paramètres explicites remplacent ceux de l'index : nprobe / efSearch
+    courants recopiés (sinon valeurs par défaut de FAISS : nprobe=1, efSearch=16).
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=sel, nprobe=ivf.nprobe)
+    elif "HNSW" in _describe(index):
+        inner = index.index if isinstance(index, faiss.IndexIDMap) else index
+        params = faiss.SearchParametersHNSW(sel=sel, efSearch=faiss.downcast_index(inner).hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=sel)
+    params.referenced_objects = [sel]  # SWIG ne garde pas de référence sur `sel`
+    return params
+
+
+def _describe(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return type(faiss.downcast_index(index)).__name__
+
+
+def save_index(index: faiss.Index, index_path: Path, spec: str = "flat", factory: str = "Flat",
+               metric: str = "l2", nprobe: int = ANN_NPROBE, ef_search: int = ANN_EF_SEARCH,
+               **extra: Any) -> None:
+    """
+    Écrit l'index et sa méta (lue par `load_index` côté retriever).
+    """
+    index_path = Path(index_path)
+    # écriture atomique : un processus qui a l'ancien fichier en mmap garde une vue valide
+    tmp = index_path.with_name(index_path.name + ".tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, index_path)
+    meta = {
+        "spec": spec,
+        "factory": factory,
+        "metric": metric,
+        "dim": index.d,
+        "ntotal": index.ntotal,
+        "nprobe": nprobe,
+        "efSearch": ef_search,
+        **extra,
+    }
+    _meta_path(index_path).write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def load_meta(index_path: Path) -> Dict[str, Any]:
+    path = _meta_path(index_path)
+    if not path.exists():
+        return {"spec": "flat", "factory": "Flat"}  # index antérieur à la méta : Flat
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _mmap_flags() -> int:
+    # IO_FLAG_MMAP_IFC : codes (Flat / SQ / listes IVF) lus en place dans le fichier,
+    # zéro copie. Les anciennes versions de FAISS n'ont que IO_FLAG_MMAP (IVF seulement).
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def load_index(index_path: Path, mmap: bool = ANN_MMAP) -> faiss.Index:
+    """
+    Ouvre un index (mappé en mémoire, lecture seule si `mmap`) et règle
+    nprobe / efSearch d'après sa méta.
+    """
+    index = faiss.read_index(str(index_path), _mmap_flags() if mmap else 0)
+    meta = load_meta(index_path)
+    apply_search_params(index, meta.get("nprobe"), meta.get("efSearch"))
+    return index
+
+
+# =========================
+# 3) Rapport recall / latence vs Flat
+# =========================
+
+def _latencies_ms(index: faiss.Index, xq: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Une requête à la fois (comme le retriever) : (résultats [nq, k], latences en ms).
+    """
+    ids = np.empty((len(xq), k), dtype="int64")
+    times = np.empty(len(xq))
+    for i in range(len(xq)):
+        t0 = time.perf_counter()
+        _, ids[i] = index.search(xq[i:i + 1], k)
+        times[i] = (time.perf_counter() - t0) * 1e3
+    return ids, times
+
+
+def _size_mb(index: faiss.Index) -> float:
+    return faiss.serialize_index(index).nbytes / 1024 / 1024
+
+
+def ann_report(
+    flat: faiss.Index,
+    index: faiss.Index,
+    k: int = 20,
+    n_queries: int = ANN_REPORT_QUERIES,
+    build_s: Optional[float] = None,
+    queries: Optional[np.ndarray] = None,
+    seed: int = 0,
+    ids: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Recall@k de `index` par rapport au Flat (vérité terrain), latences p50 / p99,
+    taille sérialisée. Requêtes : `queries` ou des vecteurs du corpus tirés au hasard.
+    `ids` : index à ids stables, ids[ligne du Flat] = id renvoyé par `index`.
+    """
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(flat.ntotal, min(n_queries, flat.ntotal), replace=False)
+        queries = np.vstack([flat.reconstruct(int(r)) for r in rows])
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    k = min(k, flat.ntotal)
+
+    truth, t_flat = _latencies_ms(flat, queries, k)
+    found, t_ann = _latencies_ms(index, queries, k)
+    if ids is not None:
+        truth = np.where(truth >= 0, np.asarray(ids, dtype="int64")[truth], -1)
+    hits = sum(len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found))
+
+    return {
+        "k": k,
+        "queries": len(queries),
+        f"recall@{k}": hits / max(1, (truth >= 0).sum()),
+        "flat_p50_ms": float(np.percentile(t_flat, 50)),
+        "flat_p99_ms": float(np.percentile(t_flat, 99)),
+        "p50_ms": float(np.percentile(t_ann, 50)),
+        "p99_ms": float(np.percentile(t_ann, 99)),
+        "build_s": build_s,
+        "flat_size_mb": _size_mb(flat),
+        "size_mb": _size_mb(index),
+    }
+
+
+def format_report(name: str, report: Dict[str, Any]) -> str:
+    k = report["k"]
+    build = f", build {report['build_s']:.2f} s" if report.get("build_s") is not None else ""
+    return (f"{name} : recall@{k} {report[f'recall@{k}']:.3f} | "
+            f"p50 {report['p50_ms']:.3f} ms / p99 {report['p99_ms']:.3f} ms "
+            f"(Flat {report['flat_p50_ms']:.3f} / {report['flat_p99_ms']:.3f}) | "
+            f"{report['size_mb']:.1f} Mo (Flat {report['flat_size_mb']:.1f}){build}")
+
+
+def build_from_flat(
+    flat: faiss.Index,
+    index_path: Path,
+    spec: str,
+    metric: str = "l2",
+    report: bool = True,
+    ids: Optional[np.ndarray] = None,
+    **extra: Any,
+) -> faiss.Index:
+    """
+    Étape finale des builders : conversion Flat → spec, rapport, sauvegarde (index + méta).
+    `ids` : un id stable par ligne de `flat` (index modifiable en place, méta "id_map").
+    """
+    t0 = time.perf_counter()
+    index, factory = convert_index(flat, spec, metric, ids=ids)
+    build_s = time.perf_counter() - t0
+    apply_search_params(index, ANN_NPROBE, ANN_EF_SEARCH)
+
+    info: Dict[str, Any] = {}
+    if factory != "Flat":
+        print(f"🧭 Index {spec} ({factory}) entraîné et rempli en {build_s:.2f} s")
+        if report:
+            info = ann_report(flat, index, build_s=build_s, ids=ids)
+            print(f"📏 {format_report(spec, info)}")
+    if ids is not None:
+        extra["id_map"] = True
+    save_index(index, index_path, spec=spec, factory=factory, metric=metric, report=info or None, **extra)
+    return index
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Types d'index FAISS : conversion et rapport recall / latence")
+    parser.add_argument("cmd", choices=["report", "convert"])
+    parser.add_argument("index", type=str, help="Index existant (Flat ou reconstructible)")
+    parser.add_argument("--spec", action="append", default=None,
+                        help="flat | ivf | ivfpq | hnsw | opq | chaîne index_factory (répétable pour report)")
+    parser.add_argument("--metric", choices=sorted(METRICS), default=None)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=ANN_REPORT_QUERIES)
+    parser.add_argument("--nprobe", type=int, default=ANN_NPROBE)
+    parser.add_argument("--ef-search", type=int, default=ANN_EF_SEARCH)
+    args = parser.parse_args()
+
+    path = Path(args.index)
+    src = faiss.read_index(str(path))
+    meta = load_meta(path)
+    metric = args.metric or meta.get("metric", "l2")
+    flat = faiss.IndexFlat(src.d, METRICS[metric])
+    flat.add(all_vectors(src))
+    ids = index_ids(src) if meta.get("id_map") else None
+
+    specs = args.spec or list(SPECS)
+    if args.cmd == "convert":
+        spec = specs[0]
+        index, factory = convert_index(flat, spec, metric, ids=ids)
+        # méta propre au builder conservée (modèle, dims, id_map...)
+        kept = {k: v for k, v in meta.items()
+                if k not in ("spec", "factory", "metric", "dim", "ntotal", "nprobe", "efSearch", "report")}
+        save_index(index, path, spec=spec, factory=factory, metric=metric,
+                   nprobe=args.nprobe, ef_search=args.ef_search, **kept)
+        print(f"💾 {path} : {spec} ({factory}), {index.ntotal} vecteurs")
+        return
+
+    print(f"📦 {path} : {flat.ntotal} vecteurs, dim={flat.d}, métrique {metric}")
+    for spec in specs:
+        t0 = time.perf_counter()
+        index, factory = convert_index(flat, spec, metric, ids=ids)
+        build_s = time.perf_counter() - t0
+        apply_search_params(index, args.nprobe, args.ef_search)
+        rep = ann_report(flat, index, k=args.k, n_queries=args.queries, build_s=build_s, ids=ids)
+        print(f"📏 {format_report(f'{spec} ({factory})', rep)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+# src/article_refs.py
+"""
+Graphe des renvois entre articles du CGI, extrait sans LLM.
+
+Hors ligne : une passe sur tous les chunks repère les citations textuelles
+("prévu à l'article 247", "visées au I de l'article 6", "articles 6 (I-D-2°) et
+165-III ci-dessus", "articles 156 à 160 ter"...) avec une petite grammaire
+(liste d'articles, suffixes bis / ter..., subdivisions, plages), écarte les renvois
+vers d'autres textes ("article 5 de la loi de finances n° 43-06", "du dahir"...)
+et écrit un index d'adjacence précalculé :
+
+    out         : article -> articles cités
+    in          : article -> articles qui le citent
+    chunks      : article -> ids des chunks qui le contiennent
+    chunk_cites : chunk_id -> articles cités dans ce chunk
+    edges       : renvois détaillés (src, dst, subdivision, chunk_id, evidence)
+
+En ligne : `cited_chunk_ids(chunk_ids)` donne directement les chunks des articles
+cités par des chunks déjà retrouvés (aucune recherche supplémentaire).
+Côté GraphRAG, ces renvois deviennent des arêtes REFERENCE et ne sont plus
+demandés au LLM d'extraction des relations.
+
+    python article_refs.py build
+    python article_refs.py query "ARTICLE 6"
+"""
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from cgi_structure import ARTICLE_SUFFIX, code_article, iter_with_paths, normalize_article
+from chunks_io import default_chunks_path, iter_chunks
+from config_cgi import ARTICLE_REFS_PATH
+
+# numéro d'article : "premier", "6", "160 ter", "42 bis" ("42 bis252" : renvoi de note collé)
+_NUM = rf"(premier|\d+(?:\s*{ARTICLE_SUFFIX})?)"
+# subdivisions collées au numéro : "-I", "-II-A-1°", " (I-D-2° et II-C1° -a))"
+_SUBDIV = r"((?:\s*-\s*(?:[IVXLC]+|[A-Z]|\d+\s*°|[a-z]\))(?![A-Za-z]))+|\s*\((?:[a-z]\)|[^()]|\([^()]*\)){0,80}\))?"
+_ITEM_RE = re.compile(rf"{_NUM}{_SUBDIV}", re.IGNORECASE)
+_SEP_RE = re.compile(r"\s*(,|\bet\b|\bou\b|\bà\b)\s*(?:l['’]\s*|les\s+)?(?:articles?\s+)?", re.IGNORECASE)
+_ARTICLE_WORD_RE = re.compile(r"\barticles?\s+", re.IGNORECASE)
+
+# subdivision placée avant : "au I de l'article 6", "visées aux II-A et III de l'article 73"
+_PREFIX_SUBDIV_RE = re.compile(
+    r"\b(?:au|aux|du|des|le|la|les)\s+((?:[IVXLC]+|[A-Z]|\d+°)(?:\s*-\s*[A-Za-z0-9°]+)*)\s+de\s+l['’]\s*$",
+    re.IGNORECASE,
+)
+
+# renvoi vers un autre texte que le CGI
+_EXTERNAL_RE = re.compile(
+    r"^\W*(?:de\s+la\s+loi|des\s+lois|de\s+ladite\s+loi|de\s+la\s+m[êe]me\s+loi|du\s+dahir|du\s+d[ée]cret|"
+    r"du\s+pr[ée]sent\s+d[ée]cret|de\s+l['’]arr[êe]t[ée]|de\s+la\s+convention|de\s+l['’]accord|"
+    r"du\s+code\s+(?!g[ée]n[ée]ral\s+des\s+imp[ôo]ts)|pr[ée]cit[ée]e?s?\b|formant\s+code)",
+    re.IGNORECASE,
+)
+# intitulé d'article en début de ligne ("Article 6.- Exonérations", "Article 2 :") : pas un renvoi
+_HEADING_TAIL_RE = re.compile(r"\s*(?:\.?\s*-|:|–|\.\s*\d)")
+
+MAX_RANGE = 30  # "articles 156 à 160" : plage développée si raisonnable
+
+
+def _article_key(raw: str) -> str:
+    num = re.sub(r"\s+", " ", raw.strip())
+    return f"ARTICLE {normalize_article(num)}"
+
+
+def normalize_article_key(article: str) -> str:
+    """
+    Clé d'article commune aux index (renvois, dictionnaire des articles) :
+    "ARTICLE 9  bis" / "Article 9 bis" -> "ARTICLE 9 BIS".
+    """
+    return _article_key(re.sub(r"(?i)^article\s+", "", article.strip()))
+
+
+def _base_number(key: str) -> Optional[int]:
+    m = re.match(r"ARTICLE (\d+)", key)
+    return int(m.group(1)) if m else None
+
+
+# =========================
+# 1) Extraction des citations
+# =========================
+
+def extract_refs(text: str, skip_headings: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Citations d'articles du CGI dans un texte : {dst, subdivision, evidence, start, end}.
+    `skip_headings` : ignore les intitulés d'article en début de ligne ("Article 6.- ...").
+    """
+    text = text or ""
+    for m in _ARTICLE_WORD_RE.finditer(text):
+        pos = m.end()
+        items = []  # (clé article, subdivision, séparateur précédent)
+        sep = None
+        while True:
+            it = _ITEM_RE.match(text, pos)
+            if not it:
+                break
+            items.append((_article_key(it.group(1)), (it.group(2) or "").strip(" -()"), sep))
+            pos = it.end()
+            s = _SEP_RE.match(text, pos)
+            if not s or not _ITEM_RE.match(text, s.end()):
+                break
+            sep = s.group(1).lower()
+            pos = s.end()
+        if not items:
+            continue
+
+        line_start = text.rfind("\n", 0, m.start()) + 1
+        at_line_start = not text[line_start:m.start()].strip(" #")
+        if skip_headings and at_line_start and _HEADING_TAIL_RE.match(text, pos):
+            continue
+        if _EXTERNAL_RE.match(text[pos:pos + 80]):
+            continue
+
+        prefix = _PREFIX_SUBDIV_RE.search(text[max(0, m.start() - 40):m.start()])
+        evidence = text[max(line_start, m.start() - 60):min(len(text), pos + 40)]
+        evidence = re.sub(r"\s+", " ", evidence).strip()
+
+        prev_key = None
+        for key, subdiv, sep in items:
+            if sep == "à" and prev_key:
+                a, b = _base_number(prev_key), _base_number(key)
+                if a is not None and b is not None and 0 < b - a <= MAX_RANGE:
+                    # "156 à 160 ter" couvre aussi l'article 160
+                    last = b + 1 if key != f"ARTICLE {b}" else b
+                    for n in range(a + 1, last):
+                        yield {"dst": f"ARTICLE {n}", "subdivision": "", "evidence": evidence,
+                               "start": m.start(), "end": pos}
+            if not subdiv and prefix and len(items) == 1:
+                subdiv = prefix.group(1)
+            yield {"dst": key, "subdivision": subdiv, "evidence": evidence, "start": m.start(), "end": pos}
+            prev_key = key
+
+
+def question_articles(question: str) -> List[str]:
+    """
+    Articles du CGI nommés dans une question ("que prévoit l'article 247 ?",
+    "articles 6 et 7"), dans l'ordre, sans doublon.
+    """
+    out: List[str] = []
+    for ref in extract_refs(question, skip_headings=False):
+        if ref["dst"] not in out:
+            out.append(ref["dst"])
+    return out
+
+
+def build_refs(chunks: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Une passe sur les chunks (ordre du document) → index d'adjacence.
+    Les renvois vers des articles absents du corpus et les auto-renvois sont écartés.
+    """
+    raw_edges = []
+    article_chunks: Dict[str, List[Any]] = defaultdict(list)
+    for c, path, _ in iter_with_paths(chunks):
+        src = code_article(c, path)
+        if src:
+            src = normalize_article_key(src)
+            article_chunks[src].append(c["id"])
+        for ref in extract_refs(c.get("text") or ""):
+            raw_edges.append(dict(ref, src=src, chunk_id=c["id"]))
+
+    edges = []
+    dropped = Counter()
+    seen = set()
+    for e in raw_edges:
+        if e["dst"] not in article_chunks:
+            dropped["article_inconnu"] += 1
+            continue
+        if e["src"] == e["dst"]:
+            dropped["auto_renvoi"] += 1
+            continue
+        key = (e["src"], e["dst"], e["subdivision"], str(e["chunk_id"]))
+        if key in seen:
+            continue
+        seen.add(key)
+        edges.append({k: e[k] for k in ("src", "dst", "subdivision", "chunk_id", "evidence")})
+
+    out: Dict[str, List[str]] = defaultdict(list)
+    inc: Dict[str, List[str]] = defaultdict(list)
+    chunk_cites: Dict[str, List[str]] = defaultdict(list)
+    for e in edges:
+        if e["src"] and e["dst"] not in out[e["src"]]:
+            out[e["src"]].append(e["dst"])
+            inc[e["dst"]].append(e["src"])
+        cites = chunk_cites[str(e["chunk_id"])]
+        if e["dst"] not in cites:
+            cites.append(e["dst"])
+
+    return {
+        "version": 1,
+        "out": dict(out),
+        "in": dict(inc),
+        "chunks": dict(article_chunks),
+        "chunk_cites": dict(chunk_cites),
+        "edges": edges,
+        "dropped": dict(dropped),
+    }
+
+
+def save_refs(refs: Dict[str, Any], path: Path = ARTICLE_REFS_PATH) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(refs, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+    load_refs.cache_clear()
+
+
+# =========================
+# 2) Index d'adjacence (lecture)
+# =========================
+
+@lru_cache(maxsize=1)
+def load_refs(path: Path = ARTICLE_REFS_PATH) -> Optional[Dict[str, Any]]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def cited_articles(article: str, depth: int = 1, path: Path = ARTICLE_REFS_PATH) -> List[str]:
+    """
+    Articles cités par `article` (jusqu'à `depth` sauts), dans l'ordre de découverte.
+    """
+    refs = load_refs(path)
+    if refs is None:
+        return []
+    seen = {article}
+    frontier = [article]
+    out: List[str] = []
+    for _ in range(depth):
+        nxt = []
+        for a in frontier:
+            for b in refs["out"].get(a, []):
+                if b not in seen:
+                    seen.add(b)
+                    out.append(b)
+                    nxt.append(b)
+        frontier = nxt
+    return out
+
+
+def citing_articles(article: str, path: Path = ARTICLE_REFS_PATH) -> List[str]:
+    refs = load_refs(path)
+    return list(refs["in"].get(article, [])) if refs else []
+
+
+def cited_chunk_ids(chunk_ids: Sequence[Any], limit: int = 2, path: Path = ARTICLE_REFS_PATH) -> List[Dict[str, Any]]:
+    """
+    Chunks des articles cités par les chunks `chunk_ids` (déjà retrouvés), hors ceux-ci.
+    Les articles les plus cités passent en premier ; un chunk par article (le premier).
+    Retourne [{"chunk_id", "article", "cited_by": [chunk ids]}].
+    """
+    refs = load_refs(path)
+    if refs is None:
+        return []
+    present = {str(cid) for cid in chunk_ids}
+    votes: Counter = Counter()
+    cited_by: Dict[str, List[Any]] = defaultdict(list)
+    for rank, cid in enumerate(chunk_ids):
+        for a in refs["chunk_cites"].get(str(cid), []):
+            votes[a] += 1.0 / (rank + 1)  # les renvois des meilleurs chunks d'abord
+            cited_by[a].append(cid)
+
+    out = []
+    for a, _ in votes.most_common():
+        targets = [t for t in refs["chunks"].get(a, []) if str(t) not in present]
+        if not targets or len(targets) < len(refs["chunks"].get(a, [])):
+            continue  # article absent, ou déjà présent dans les résultats
+        out.append({"chunk_id": targets[0], "article": a, "cited_by": cited_by[a]})
+        if len(out) >= limit:
+            break
+    return out
+
+
+def chunk_refs(chunk_id: Any, path: Path = ARTICLE_REFS_PATH) -> List[str]:
+    """
+    Articles cités dans un chunk (déjà extraits : inutile de les redemander au LLM).
+    """
+    refs = load_refs(path)
+    return list(refs["chunk_cites"].get(str(chunk_id), [])) if refs else []
+
+
+# =========================
+# 3) CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Graphe des renvois entre articles (sans LLM)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Extrait les renvois et écrit l'index d'adjacence")
+    p_build.add_argument("--chunks", type=str, default=None)
+    p_build.add_argument("--output", type=str, default=str(ARTICLE_REFS_PATH))
+    p_query = sub.add_parser("query", help="Renvois d'un article")
+    p_query.add_argument("article", type=str, help='ex: "ARTICLE 6" ou "6"')
+    p_query.add_argument("--depth", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        chunks_path = Path(args.chunks) if args.chunks else default_chunks_path()
+        t0 = time.perf_counter()
+        refs = build_refs(iter_chunks(chunks_path))
+        dt = time.perf_counter() - t0
+        save_refs(refs, Path(args.output))
+        n_src = len(refs["out"])
+        print(f"✅ {len(refs['edges'])} renvois entre articles ({n_src} articles citants, "
+              f"{len(refs['in'])} cités) en {dt * 1e3:.0f} ms")
+        if refs["dropped"]:
+            print(f"   écartés : {refs['dropped']}")
+        print(f"💾 Index : {args.output}")
+        return
+
+    article = normalize_article_key(args.article)
+    print(f"→ {article} cite : {', '.join(cited_articles(article, args.depth)) or '-'}")
+    print(f"← cité par : {', '.join(citing_articles(article)) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
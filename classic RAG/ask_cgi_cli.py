@@ -46,6 +46,8 @@ def main():
         print("\n--- Chunks utilisés (debug) ---")
         chunk_ids = result.get("chunks_ids", [])
         print(chunk_ids if chunk_ids else "[]")
+        if result.get("nodes_ids"):
+            print(f"Nœuds de l'arbre : {result['nodes_ids']}")
 
         # --- JSON final pour le front (clean) ---
         print("\n--- JSON complet (pour le front) ---")
@@ -0,0 +1,98 @@
+# src/bench_chunk_store.py
+"""
+Mesure chargement + mémoire : liste de dict (JSON / JSONL) vs store compact mmap.
+
+Chaque variante tourne dans un processus neuf (RSS non pollué par l'autre) :
+  - load  : temps d'ouverture (parse complet vs mmap des tables)
+  - rss   : mémoire résidente après chargement (delta par rapport au processus vide)
+  - query : 20 accès aléatoires par id avec lecture du texte (≈ une requête)
+
+    python bench_chunk_store.py [--chunks data/json/cgi-2025_chunks.json] [--repeat 5]
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chunk_store import ChunkStore, build_chunk_store
+from chunks_io import default_chunks_path, iter_chunks
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_one(mode: str, path: Path, ids_json: str) -> dict:
+    ids = json.loads(ids_json)
+    base = _rss_mb()
+
+    t0 = time.perf_counter()
+    if mode == "json":
+        chunks = list(iter_chunks(path))
+        by_id = {str(c["id"]): c for c in chunks}
+    else:
+        chunks = ChunkStore(path)
+        by_id = chunks
+    t_load = time.perf_counter() - t0
+    rss = _rss_mb() - base
+
+    t0 = time.perf_counter()
+    n_chars = 0
+    for cid in ids:
+        n_chars += len(by_id.get(cid)["text"])
+    t_query = time.perf_counter() - t0
+
+    return {"load_ms": t_load * 1e3, "rss_mb": rss, "query_ms": t_query * 1e3, "chars": n_chars}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bench : chunks JSON en RAM vs store mmap")
+    parser.add_argument("--chunks", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-compress", action="store_true")
+    parser.add_argument("--_child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._child:
+        mode, path, ids_json = args._child
+        print(json.dumps(_run_one(mode, Path(path), ids_json)))
+        return
+
+    chunks_path = Path(args.chunks) if args.chunks else default_chunks_path()
+    all_ids = [str(c["id"]) for c in iter_chunks(chunks_path)]
+    ids = random.Random(0).sample(all_ids, min(20, len(all_ids)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = Path(tmp) / "chunks.store"
+        build_chunk_store(iter_chunks(chunks_path), store_path, compress=not args.no_compress)
+
+        print(f"📦 {len(all_ids)} chunks | {chunks_path.name}: {chunks_path.stat().st_size / 1e6:.2f} Mo"
+              f" | store: {store_path.stat().st_size / 1e6:.2f} Mo")
+
+        for mode, path in (("json", chunks_path), ("store", store_path)):
+            runs = []
+            for _ in range(args.repeat):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--_child", mode, str(path), json.dumps(ids)],
+                    capture_output=True, text=True, check=True,
+                )
+                runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            med = {k: sorted(r[k] for r in runs)[len(runs) // 2] for k in ("load_ms", "rss_mb", "query_ms")}
+            print(f"{mode:6s} load={med['load_ms']:8.2f} ms  rss=+{med['rss_mb']:6.1f} Mo  "
+                  f"query(20)={med['query_ms']:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# src/bench_embed_dims.py
+"""
+Bench dimension des embeddings : 256 / 512 / 1024 / 1536 contre le Flat-1536.
+
+Les modèles text-embedding-3-* entraînés en Matryoshka renvoient pour `dimensions=d`
+les d premières composantes renormalisées : on obtient donc chaque variante en
+tronquant + renormalisant les vecteurs de l'index 1536 existant (aucun ré-embedding
+du corpus). Les questions de all_questions.csv sont embeddées une fois en 1536.
+
+Pour chaque dimension :
+  - recall@k : recouvrement du top-k avec celui du Flat-1536
+  - latence  : p50 / p99 d'une recherche top-k (une question à la fois)
+  - taille   : index sérialisé
+
+    python bench_embed_dims.py [--index data/index/cgi-2025_faiss.index] [--k 20]
+"""
+import argparse
+import csv
+import time
+from pathlib import Path
+from typing import List
+
+import faiss
+import numpy as np
+
+from ann_index import all_vectors, load_meta
+from config_cgi import ENV_PATH, FAISS_INDEX_PATH, OPENAI_EMBED_MODEL, PROJECT_ROOT
+from embedding_cache import embed_cached
+
+DIMS = [256, 512, 1024, 1536]
+
+
+def _truncate(x: np.ndarray, d: int) -> np.ndarray:
+    x = np.ascontiguousarray(x[:, :d], dtype="float32")
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms == 0, 1.0, norms)
+
+
+def _questions(path: Path) -> List[str]:
+    with path.open(encoding="utf-8") as f:
+        return [row["question"] for row in csv.DictReader(f, delimiter=";") if row.get("question")]
+
+
+def _embed_questions(questions: List[str]) -> np.ndarray:
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    from embed_batches import embed_request
+
+    load_dotenv(ENV_PATH)
+    client = OpenAI()
+    return embed_cached(questions, lambda t: embed_request(client, OPENAI_EMBED_MODEL, t), OPENAI_EMBED_MODEL)
+
+
+def _search_ms(index: faiss.Index, xq: np.ndarray, k: int):
+    ids, times = [], []
+    for q in xq:
+        t0 = time.perf_counter()
+        _, I = index.search(q.reshape(1, -1), k)
+        times.append((time.perf_counter() - t0) * 1e3)
+        ids.append(I[0])
+    return ids, np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bench : dimension des embeddings vs Flat-1536")
+    parser.add_argument("--index", type=str, default=None, help="Index 1536 (défaut : index des chunks)")
+    parser.add_argument("--questions", type=str, default=str(PROJECT_ROOT / "all_questions.csv"))
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    path = Path(args.index) if args.index else Path(FAISS_INDEX_PATH)
+    if load_meta(path).get("dims"):
+        raise SystemExit(f"{path} construit en dims={load_meta(path)['dims']} : il faut l'index natif (1536)")
+    src = faiss.read_index(str(path))
+    xb = all_vectors(src)
+    questions = _questions(Path(args.questions))
+    xq = _embed_questions(questions)
+    print(f"📦 {path.name} : {len(xb)} vecteurs dim={xb.shape[1]} | {len(questions)} questions")
+
+    k = min(args.k, len(xb))
+    truth = None
+    for d in sorted(DIMS, reverse=True):
+        if d > xb.shape[1]:
+            continue
+        index = faiss.IndexFlatL2(d)
+        index.add(_truncate(xb, d))
+        found, t = _search_ms(index, _truncate(xq, d), k)
+        if truth is None:
+            truth = found  # Flat-1536 = référence
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(truth, found)])
+        size = faiss.serialize_index(index).nbytes / 1e6
+        print(f"dim {d:5d} : recall@{k} {recall:.3f}  p50 {np.percentile(t, 50):6.3f} ms  "
+              f"p99 {np.percentile(t, 99):6.3f} ms  index {size:7.2f} Mo")
+
+
+if __name__ == "__main__":
+    main()
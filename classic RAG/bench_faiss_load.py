@@ -0,0 +1,123 @@
+# src/bench_faiss_load.py
+"""
+Mesure ouverture + mémoire des index FAISS : codec (flat / sqfp16 / sq8) × lecture
+complète (faiss.read_index) vs mmap (load_index, IO_FLAG_MMAP_IFC).
+
+Chaque variante tourne dans un processus neuf :
+  - load   : temps d'ouverture de l'index
+  - anon   : mémoire privée du processus (RssAnon) après chargement + 20 requêtes
+  - file   : pages du fichier mappées (RssFile) : page cache, partagé entre workers
+  - query  : latence médiane d'une recherche top-20
+  - recall : recall@20 du codec par rapport au Flat (mêmes requêtes)
+
+    python bench_faiss_load.py [--index data/index/cgi-2025_faiss.index] [--synthetic 50000]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from ann_index import all_vectors, ann_report, convert_index, load_index, save_index
+from config_cgi import FAISS_INDEX_PATH
+
+SPECS = ["flat", "sqfp16", "sq8"]
+
+
+def _rss_mb() -> dict:
+    out = {"RssAnon": 0.0, "RssFile": 0.0}
+    with open("/proc/self/status", encoding="utf-8") as f:
+        for line in f:
+            key = line.split(":")[0]
+            if key in out:
+                out[key] = int(line.split()[1]) / 1024
+    return out
+
+
+def _run_one(path: Path, mmap: bool, seed: int) -> dict:
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    index = load_index(path, mmap=mmap)
+    t_load = time.perf_counter() - t0
+
+    rng = np.random.default_rng(seed)
+    xq = rng.normal(size=(20, index.d)).astype("float32")
+    times = []
+    for q in xq:
+        t0 = time.perf_counter()
+        index.search(q.reshape(1, -1), 20)
+        times.append((time.perf_counter() - t0) * 1e3)
+    rss = _rss_mb()
+    return {
+        "load_ms": t_load * 1e3,
+        "anon_mb": rss["RssAnon"] - base["RssAnon"],
+        "file_mb": rss["RssFile"] - base["RssFile"],
+        "query_ms": float(np.median(times)),
+    }
+
+
+def _synthetic(n: int, d: int = 1536, seed: int = 0) -> faiss.Index:
+    # vecteurs normalisés groupés autour de centres (proche d'embeddings de texte)
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 100), d)).astype("float32")
+    x = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.normal(size=(n, d)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    flat = faiss.IndexFlatL2(d)
+    flat.add(x)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bench : codec FAISS × read_index vs mmap")
+    parser.add_argument("--index", type=str, default=None)
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="N vecteurs aléatoires 1536-d au lieu d'un index existant")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--_child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._child:
+        path, mmap = args._child
+        print(json.dumps(_run_one(Path(path), mmap == "1", seed=0)))
+        return
+
+    if args.synthetic:
+        flat = _synthetic(args.synthetic)
+        print(f"📦 {flat.ntotal} vecteurs synthétiques, dim={flat.d}")
+    else:
+        path = Path(args.index) if args.index else Path(FAISS_INDEX_PATH)
+        src = faiss.read_index(str(path))
+        flat = faiss.IndexFlatL2(src.d)
+        flat.add(all_vectors(src))
+        print(f"📦 {path} : {flat.ntotal} vecteurs, dim={flat.d}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for spec in SPECS:
+            index, factory = convert_index(flat, spec)
+            path = Path(tmp) / f"{spec}.index"
+            save_index(index, path, spec=spec, factory=factory)
+            recall = ann_report(flat, index, k=20)["recall@20"]
+            size = path.stat().st_size / 1e6
+
+            for mmap in (False, True):
+                runs = []
+                for _ in range(args.repeat):
+                    out = subprocess.run(
+                        [sys.executable, __file__, "--_child", str(path), "1" if mmap else "0"],
+                        capture_output=True, text=True, check=True,
+                    )
+                    runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+                med = {k: sorted(r[k] for r in runs)[len(runs) // 2] for k in runs[0]}
+                print(f"{spec:7s} {'mmap' if mmap else 'read':4s} fichier={size:7.1f} Mo  "
+                      f"load={med['load_ms']:8.2f} ms  anon=+{med['anon_mb']:6.1f} Mo  "
+                      f"file=+{med['file_mb']:6.1f} Mo  query={med['query_ms']:6.2f} ms  "
+                      f"recall@20={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
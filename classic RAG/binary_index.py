@@ -0,0 +1,189 @@
+# src/binary_index.py
+"""
+Recherche en deux temps sur l'index des chunks :
+
+  1) scan Hamming sur les embeddings quantifiés à 1 bit (signe de chaque dimension,
+     d/8 octets par vecteur : 32x plus petit que le float32) → `rescore_k` candidats ;
+  2) rescoring exact (distance L2, comme IndexFlatL2) des candidats avec les vecteurs
+     float32 lus à la demande dans un fichier .npy mappé en mémoire.
+
+Seul le premier étage réside en mémoire : 1536 dims → 192 octets par chunk, des milliers
+de passages de plusieurs codes tiennent dans le cache L2. Le top-20 envoyé au
+cross-encoder est le même que celui du Flat dès que `rescore_k` est assez large
+(voir `python binary_index.py bench`).
+
+Fichiers (écrits par build_faiss_index.py, lignes alignées sur l'index FAISS) :
+  - BINARY_INDEX_PATH   : IndexBinaryFlat
+  - BINARY_VECTORS_PATH : vecteurs float32 [n, d] (.npy)
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+from ann_index import all_vectors, load_meta
+from config_cgi import BINARY_INDEX_PATH, BINARY_RESCORE_K, BINARY_VECTORS_PATH, FAISS_INDEX_PATH
+
+
+# =========================
+# 1) Construction
+# =========================
+
+def binarize(x: np.ndarray) -> np.ndarray:
+    """
+    [n, d] float → [n, d/8] uint8 : un bit par dimension (1 si > 0).
+    """
+    return np.packbits(np.asarray(x) > 0, axis=1)
+
+
+def build_binary_index(
+    vectors: np.ndarray,
+    index_path: Path = BINARY_INDEX_PATH,
+    vectors_path: Path = BINARY_VECTORS_PATH,
+) -> None:
+    """
+    Écrit l'index binaire et les vecteurs float32 de rescoring (écriture atomique).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, d = vectors.shape
+    if d % 8:
+        raise ValueError(f"dimension {d} non multiple de 8 : quantification binaire impossible")
+
+    index = faiss.IndexBinaryFlat(d)
+    index.add(binarize(vectors))
+
+    index_path, vectors_path = Path(index_path), Path(vectors_path)
+    tmp = index_path.with_name(index_path.name + ".tmp")
+    faiss.write_index_binary(index, str(tmp))
+    os.replace(tmp, index_path)
+
+    tmp = vectors_path.with_name(vectors_path.name + ".tmp.npy")
+    np.save(tmp, vectors)
+    os.replace(tmp, vectors_path)
+    print(f"💾 Index binaire : {index_path} ({n} × {d // 8} octets) + vecteurs {vectors_path}")
+
+
+# =========================
+# 2) Recherche
+# =========================
+
+class BinaryIndex:
+    """
+    Index binaire (en mémoire) + vecteurs float32 (mmap) ; `search` a la même
+    signature et le même format de sortie que `faiss.IndexFlatL2.search`.
+    """
+
+    def __init__(self, index_path: Path = BINARY_INDEX_PATH, vectors_path: Path = BINARY_VECTORS_PATH,
+                 rescore_k: int = BINARY_RESCORE_K):
+        self.index = faiss.read_index_binary(str(index_path))
+        self.vectors = np.load(str(vectors_path), mmap_mode="r")
+        if self.vectors.shape[0] != self.index.ntotal:
+            raise ValueError(f"{vectors_path} ({self.vectors.shape[0]} lignes) non aligné sur "
+                             f"{index_path} ({self.index.ntotal})")
+        self.rescore_k = rescore_k
+        self.d = self.vectors.shape[1]
+        self.ntotal = self.index.ntotal
+
+    def search(self, xq: np.ndarray, k: int, rescore_k: Optional[int] = None,
+               sel: Optional[faiss.IDSelector] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        `sel` : filtre de lignes (chunk_filters.id_selector) appliqué au scan Hamming.
+        """
+        xq = np.ascontiguousarray(xq, dtype="float32").reshape(-1, self.d)
+        depth = min(max(k, rescore_k or self.rescore_k), self.ntotal)
+        params = faiss.SearchParameters(sel=sel) if sel is not None else None
+        _, cand = self.index.search(binarize(xq), depth, params=params)
+
+        D = np.full((len(xq), k), np.inf, dtype="float32")
+        I = np.full((len(xq), k), -1, dtype="int64")
+        for qi, rows in enumerate(cand):
+            rows = np.sort(rows[rows >= 0])  # lecture du mmap dans l'ordre du fichier
+            diff = self.vectors[rows] - xq[qi]
+            dist = np.einsum("ij,ij->i", diff, diff)
+            top = np.argsort(dist)[:k]
+            D[qi, :len(top)] = dist[top]
+            I[qi, :len(top)] = rows[top]
+        return D, I
+
+
+def binary_index_available() -> bool:
+    return Path(BINARY_INDEX_PATH).exists() and Path(BINARY_VECTORS_PATH).exists()
+
+
+# =========================
+# CLI : bench recall / latence vs IndexFlatL2
+# =========================
+
+def _bench(flat: faiss.Index, depths, k: int, n_queries: int) -> None:
+    import tempfile
+
+    xb = flat.reconstruct_n(0, flat.ntotal)
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(xb), min(n_queries, len(xb)), replace=False)
+    # requêtes = vecteurs du corpus bruités (la requête exacte serait trivialement rang 1)
+    xq = xb[rows] + 0.3 * rng.normal(size=(len(rows), xb.shape[1])).astype("float32") / np.sqrt(xb.shape[1])
+
+    def _timed(search):
+        ids, times = [], []
+        for q in xq:
+            t0 = time.perf_counter()
+            _, I = search(q.reshape(1, -1))
+            times.append((time.perf_counter() - t0) * 1e3)
+            ids.append(I[0])
+        return ids, np.array(times)
+
+    truth, t_flat = _timed(lambda q: flat.search(q, k))
+    print(f"Flat          : p50 {np.percentile(t_flat, 50):6.3f} ms  p99 {np.percentile(t_flat, 99):6.3f} ms  "
+          f"{xb.nbytes / 1e6:.1f} Mo en RAM")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_path, vec_path = Path(tmp) / "b.index", Path(tmp) / "v.npy"
+        build_binary_index(xb, bin_path, vec_path)
+        bidx = BinaryIndex(bin_path, vec_path)
+        ram = bidx.index.ntotal * bidx.index.code_size / 1e6
+        for depth in depths:
+            found, t = _timed(lambda q: bidx.search(q, k, rescore_k=depth))
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(truth, found)])
+            print(f"binaire → {depth:5d} : p50 {np.percentile(t, 50):6.3f} ms  p99 {np.percentile(t, 99):6.3f} ms  "
+                  f"recall@{k} {recall:.3f}  {ram:.2f} Mo en RAM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index binaire 1 bit + rescoring float (bench vs Flat)")
+    parser.add_argument("cmd", choices=["build", "bench"])
+    parser.add_argument("--index", type=str, default=None, help="Index FAISS source (défaut : index des chunks)")
+    parser.add_argument("--synthetic", type=int, default=0, help="(bench) N vecteurs 1536-d synthétiques")
+    parser.add_argument("--depth", type=int, nargs="+", default=[50, 100, 200, 500, 1000])
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from bench_faiss_load import _synthetic
+        flat = _synthetic(args.synthetic)
+    else:
+        src = faiss.read_index(str(args.index or FAISS_INDEX_PATH))
+        flat = faiss.IndexFlatL2(src.d)
+        flat.add(all_vectors(src))
+
+    if args.cmd == "build":
+        if not args.synthetic and load_meta(Path(args.index or FAISS_INDEX_PATH)).get("id_map"):
+            # index à ids stables : lignes remises dans l'ordre du fichier de chunks
+            from chunk_index import ChunkIndex
+            from chunks_io import default_chunks_path, iter_chunks
+
+            order = [c["id"] for c in iter_chunks(default_chunks_path())]
+            build_binary_index(ChunkIndex(args.index or FAISS_INDEX_PATH).vectors(order))
+        else:
+            build_binary_index(flat.reconstruct_n(0, flat.ntotal))
+        return
+    print(f"📦 {flat.ntotal} vecteurs, dim={flat.d}")
+    _bench(flat, args.depth, args.k, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pypdfium2 as pdfium
+from docling_core.types.doc import DocItemLabel, ListItem, TableItem, TextItem
+
+from cgi_structure import StructureTracker, article_from_title
+from chunk_manifest import build_manifest, chunk_hashes, print_manifest, save_manifest
+from chunks_io import chunk_key_base, content_hash, iter_chunks, make_chunk_id
+from config_cgi import MANIFEST_PATH
+from passages import count_tokens
+from extract_cgi import PAGES_PER_SHARD, build_docling_converter, shard_ranges
+
+# Éléments de mise en page à ignorer (en-têtes / pieds de page, numéros...)
+_SKIP_LABELS = {DocItemLabel.PAGE_HEADER, DocItemLabel.PAGE_FOOTER}
+_HEADING_LABELS = {DocItemLabel.SECTION_HEADER, DocItemLabel.TITLE}
+
+
+class _DoclingChunker:
+    """
+    Accumule les éléments de l'arbre Docling et produit un chunk à chaque titre,
+    avec la même découpe que build_chunks_from_markdown ("## " = nouveau chunk).
+    L'état (section courante, chemin structurel) survit d'un shard de pages à l'autre.
+    """
+
+    def __init__(self, source_id: str):
+        self.source_id = source_id
+        self.tracker = StructureTracker()
+        self.occurrences = Counter()
+        self.title: Optional[str] = None
+        self.path: Dict[str, Optional[str]] = {}
+        self.lines: List[str] = []
+        self.page_start: Optional[int] = None
+        self.page_end: Optional[int] = None
+
+    def _flush(self) -> Optional[Dict[str, Any]]:
+        if self.title is None or not self.lines:
+            return None
+
+        block_text = "\n\n".join(self.lines).rstrip()
+        chunk = None
+        if block_text.strip():
+            key_base = chunk_key_base(self.source_id, self.path.get("article"), self.title)
+            self.occurrences[key_base] += 1
+            chunk = {
+                "id": make_chunk_id(key_base, self.occurrences[key_base]),
+                "source": self.source_id,
+                "title": self.title,
+                "text": block_text,
+                "article": article_from_title(self.title),
+                "path": self.path,
+                "pages": [self.page_start, self.page_end],
+                "n_tokens": count_tokens(block_text),
+                "content_hash": content_hash(block_text),
+            }
+
+        self.title = None
+        self.lines = []
+        return chunk
+
+    def feed(self, doc, item) -> Optional[Dict[str, Any]]:
+        """
+        Ajoute un élément ; renvoie le chunk précédent s'il vient d'être clos.
+        """
+        label = getattr(item, "label", None)
+        if label in _SKIP_LABELS:
+            return None
+
+        page = item.prov[0].page_no if getattr(item, "prov", None) else None
+
+        if label in _HEADING_LABELS:
+            done = self._flush()
+            heading = (item.text or "").strip()
+            self.tracker.observe_heading(heading)
+            self.title = heading
+            self.path = self.tracker.snapshot()
+            self.lines = [f"## {heading}"]
+            self.page_start = self.page_end = page
+            return done
+
+        if isinstance(item, TableItem):
+            text = item.export_to_markdown(doc)
+        elif isinstance(item, ListItem):
+            text = f"- {item.text}"
+        elif isinstance(item, TextItem):
+            text = item.text or ""
+            self.tracker.observe_line(text)
+        else:
+            return None
+
+        # Avant le premier titre, on ignore (comme le chunker markdown)
+        if self.title is None or not text.strip():
+            return None
+
+        self.lines.append(text)
+        if page is not None:
+            self.page_end = page
+        return None
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        return self._flush()
+
+
+def iter_chunks_from_docling(doc, source_id: str = "cgi-2025",
+                             chunker: Optional[_DoclingChunker] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Parcourt un DoclingDocument déjà converti et produit les chunks au fil de l'eau.
+    Si `chunker` est fourni, il n'est pas clos (le document est une tranche d'un PDF plus grand).
+    """
+    own = chunker is None
+    chunker = chunker or _DoclingChunker(source_id)
+
+    for item, _level in doc.iterate_items():
+        chunk = chunker.feed(doc, item)
+        if chunk is not None:
+            yield chunk
+
+    if own:
+        last = chunker.close()
+        if last is not None:
+            yield last
+
+
+def iter_chunks_from_pdf(pdf_path: Path, source_id: str = "cgi-2025",
+                         pages_per_shard: int = PAGES_PER_SHARD) -> Iterator[Dict[str, Any]]:
+    """
+    Convertit le PDF shard par shard (plages de pages) et émet les chunks dès qu'un
+    shard est converti : le chunking commence avant la fin de la conversion complète,
+    sans passer par un export markdown intermédiaire.
+
+    Champs de chaque chunk : ceux de build_chunks_from_markdown, plus
+      - path  : {livre, titre, sous_titre, chapitre, section, article}
+      - pages : [page_début, page_fin]
+    """
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF introuvable : {pdf_path}")
+
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    n_pages = len(pdf)
+    pdf.close()
+
+    converter = build_docling_converter()
+    chunker = _DoclingChunker(source_id)
+
+    for start, end in shard_ranges(n_pages, pages_per_shard):
+        conv_result = converter.convert(pdf_path, page_range=(start, end))
+        yield from iter_chunks_from_docling(conv_result.document, chunker=chunker)
+
+    last = chunker.close()
+    if last is not None:
+        yield last
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF → chunks directement depuis l'arbre Docling")
+    parser.add_argument("pdf", type=str, help="Chemin du PDF (ex: data/pdf/cgi-2025.pdf)")
+    parser.add_argument("--source-id", type=str, default=None,
+                        help="Identifiant du document (défaut : nom du fichier)")
+    parser.add_argument("--pages-per-shard", type=int, default=PAGES_PER_SHARD)
+    parser.add_argument("--previous", type=str, default=None,
+                        help="Chunks du build précédent pour le manifest (défaut : le fichier de sortie, "
+                             "ex: data/json/cgi-2024_chunks.jsonl pour une nouvelle édition)")
+    args = parser.parse_args()
+
+    project_root = Path(__file__).resolve().parents[1]
+    pdf_path = Path(args.pdf)
+    source_id = args.source_id or pdf_path.stem
+
+    json_dir = project_root / "data" / "json"
+    json_dir.mkdir(parents=True, exist_ok=True)
+    output_path = json_dir / f"{source_id}_chunks.jsonl"
+
+    # ids + empreintes du build précédent (pour le manifest de changements)
+    previous = Path(args.previous) if args.previous else output_path
+    old_hashes = chunk_hashes(iter_chunks(previous)) if previous.exists() else {}
+    new_hashes = {}
+
+    n = 0
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        for chunk in iter_chunks_from_pdf(pdf_path, source_id=source_id,
+                                          pages_per_shard=args.pages_per_shard):
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            new_hashes[chunk["id"]] = chunk["content_hash"]
+            n += 1
+            if n % 100 == 0:
+                print(f"→ {n} chunks (page {chunk['pages'][1]})")
+    os.replace(tmp_path, output_path)
+
+    print(f"✅ {n} chunks sauvegardés dans : {output_path}")
+
+    manifest = build_manifest(old_hashes, new_hashes)
+    save_manifest(manifest, MANIFEST_PATH)
+    print_manifest(manifest)
+    print(f"💾 Manifest : {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
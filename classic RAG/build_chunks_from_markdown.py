@@ -1,109 +1,193 @@
+import argparse
 import json
-import re
+import os
+from collections import Counter
 from pathlib import Path
-
-
-def build_chunks_from_markdown(md_path: Path, source_id: str = "cgi-2025"):
+from typing import Any, Dict, Iterable, Iterator, List
+
+from article_refs import build_refs, save_refs
+from cgi_structure import StructureTracker, article_from_title
+from chunk_manifest import build_manifest, chunk_hashes, print_manifest, save_manifest
+from chunk_store import build_chunk_store
+from chunks_io import append_jsonl, chunk_key_base, content_hash, iter_chunks, make_chunk_id, source_family
+from config_cgi import (
+    ARTICLE_REFS_PATH,
+    CHUNK_STORE_PATH,
+    CHUNKS_JSONL_PATH,
+    FACTS_DB_PATH,
+    MANIFEST_PATH,
+)
+from passages import count_tokens
+from rate_tables import build_facts_db
+
+
+def iter_chunks_from_markdown(md_path: Path, source_id: str = "cgi-2025") -> Iterator[Dict[str, Any]]:
     """
-    Lit le fichier Markdown du CGI et construit des chunks.
+    Lit le fichier Markdown du CGI ligne à ligne et produit les chunks au fil de l'eau.
     -> Chaque chunk correspond à une section commençant par '## '
        (jusqu'à la prochaine '## ' ou la fin du fichier).
+    Seule la section en cours est gardée en mémoire.
 
     Champs de chaque chunk :
-      - id      : numéro du chunk
+      - id      : id stable dérivé de (famille du document, article, titre, rang
+                  d'occurrence), indépendant de la position et de l'édition :
+                  insérer un article ne renumérote rien
       - source  : identifiant du document (ex: 'cgi-2025')
       - title   : texte du titre (sans '##')
       - text    : markdown complet de la section (titre + contenu)
       - article : 'ARTICLE X' si détecté dans le titre, sinon None
+      - path    : chemin structurel {livre, titre, sous_titre, chapitre, section, article}
+      - n_tokens: nombre de tokens (tiktoken) du texte, pour le batching et le budget de contexte
+      - content_hash : empreinte du texte (détection des sections modifiées)
     """
     if not md_path.exists():
         raise FileNotFoundError(f"Fichier Markdown introuvable : {md_path}")
 
-    content = md_path.read_text(encoding="utf-8")
-    lines = content.splitlines()
-
-    chunks = []
+    tracker = StructureTracker()
+    occurrences = Counter()
     current_title = None
-    current_lines = []
-
-    # Regex pour détecter "Article 5", "ARTICLE 247A", etc.
-    article_re = re.compile(r"(?i)\barticle\s+(\d+[A-Za-z]*)")
-
-    def flush_current_section():
-        nonlocal current_title, current_lines, chunks
+    current_path = None
+    current_lines: List[str] = []
 
+    def make_chunk():
         if current_title is None or not current_lines:
-            return
+            return None
 
         block_text = "\n".join(current_lines).rstrip()
         if not block_text.strip():
-            return
-
-        # Détection de l'article à partir du titre
-        m = article_re.search(current_title)
-        article = f"ARTICLE {m.group(1)}" if m else None
-
-        chunk_id = len(chunks) + 1
-        chunks.append(
-            {
-                "id": chunk_id,
-                "source": source_id,
-                "title": current_title,
-                "text": block_text,
-                "article": article,
-            }
-        )
-
-        # Réinitialiser pour la prochaine section
-        current_title = None
-        current_lines = []
-
-    for line in lines:
-        stripped = line.strip()
+            return None
+
+        key_base = chunk_key_base(source_id, current_path.get("article"), current_title)
+        occurrences[key_base] += 1
+
+        return {
+            "id": make_chunk_id(key_base, occurrences[key_base]),
+            "source": source_id,
+            "title": current_title,
+            "text": block_text,
+            "article": article_from_title(current_title),
+            "path": current_path,
+            "n_tokens": count_tokens(block_text),
+            "content_hash": content_hash(block_text),
+        }
+
+    with md_path.open("r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.rstrip("\n")
+            stripped = line.strip()
+
+            # Nouveau bloc de niveau "## " (mais pas "### ")
+            if stripped.startswith("## ") and not stripped.startswith("### "):
+                # on clôt la section en cours si elle existe
+                chunk = make_chunk()
+                if chunk is not None:
+                    yield chunk
+
+                # nouveau titre : on enlève les "##"
+                current_title = stripped.lstrip("#").strip()
+                tracker.observe_heading(current_title)
+                current_path = tracker.snapshot()
+                current_lines = [line]  # on garde le markdown exact (avec "## ...")
+                continue
+
+            tracker.observe_line(stripped)
+
+            # Si on n'a pas encore rencontré de "##", on ignore les lignes
+            if current_title is None:
+                continue
+
+            # Sinon, on ajoute la ligne au bloc courant
+            current_lines.append(line)
 
-        # Nouveau bloc de niveau "## " (mais pas "### ")
-        if stripped.startswith("## ") and not stripped.startswith("### "):
-            # on clôt la section en cours si elle existe
-            flush_current_section()
-
-            # nouveau titre : on enlève les "##"
-            current_title = stripped.lstrip("#").strip()
-            current_lines = [line]  # on garde le markdown exact (avec "## ...")
-            continue
+    # Dernière section à la fin du fichier
+    chunk = make_chunk()
+    if chunk is not None:
+        yield chunk
 
-        # Si on n'a pas encore rencontré de "##", on ignore les lignes
-        if current_title is None:
-            continue
 
-        # Sinon, on ajoute la ligne au bloc courant
-        current_lines.append(line)
+def iter_corpus_chunks(md_paths: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+    """
+    Enchaîne plusieurs documents (un markdown par code et par année).
+    Le `source` de chaque chunk est le nom du fichier (ex: 'cgi-2025').
+    Une seule édition par famille : les ids ne contiennent pas l'année (l'édition
+    suivante remplace la précédente et garde ses ids), deux éditions d'un même code
+    (cgi-2024.md + cgi-2025.md) auraient les mêmes ids → ValueError.
+    """
+    md_paths = list(md_paths)
+    families = Counter(source_family(p.stem) for p in md_paths)
+    duplicated = sorted(f for f, n in families.items() if n > 1)
+    if duplicated:
+        raise ValueError(
+            f"Plusieurs éditions d'une même famille dans le corpus ({', '.join(duplicated)}) : "
+            "ne garder que l'édition courante."
+        )
+    for md_path in md_paths:
+        yield from iter_chunks_from_markdown(md_path, source_id=md_path.stem)
 
-    # Dernière section à la fin du fichier
-    flush_current_section()
 
-    return chunks
+def build_chunks_from_markdown(md_path: Path, source_id: str = "cgi-2025") -> List[Dict[str, Any]]:
+    """
+    Version liste (compatibilité) de iter_chunks_from_markdown.
+    """
+    return list(iter_chunks_from_markdown(md_path, source_id=source_id))
 
 
 def main():
     project_root = Path(__file__).resolve().parents[1]
-
-    md_path = project_root / "data" / "markdown" / "cgi-2025.md"
+    markdown_dir = project_root / "data" / "markdown"
     json_dir = project_root / "data" / "json"
-    json_dir.mkdir(parents=True, exist_ok=True)
-
-    chunks = build_chunks_from_markdown(md_path, source_id="cgi-2025")
-
-    output_path = json_dir / "cgi-2025_chunks.json"
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(chunks, f, ensure_ascii=False, indent=2)
-
-    print(f"✅ {len(chunks)} chunks sauvegardés dans : {output_path}")
 
-    if chunks:
+    parser = argparse.ArgumentParser(description="Markdown → chunks (JSONL, en flux)")
+    parser.add_argument("markdown", nargs="*", type=str,
+                        help="Fichiers markdown (défaut : tous ceux de data/markdown)")
+    parser.add_argument("--output", type=str, default=str(json_dir / "chunks.jsonl"),
+                        help="Fichier JSONL de sortie")
+    args = parser.parse_args()
+
+    md_paths = [Path(p) for p in args.markdown] or sorted(markdown_dir.glob("*.md"))
+    output_path = Path(args.output)
+
+    # ids + empreintes du build précédent (pour le manifest de changements)
+    old_hashes = chunk_hashes(iter_chunks(output_path)) if output_path.exists() else {}
+    new_hashes = {}
+
+    first = None
+
+    def _stream():
+        nonlocal first
+        for chunk in iter_corpus_chunks(md_paths):
+            if first is None:
+                first = chunk
+            new_hashes[chunk["id"]] = chunk["content_hash"]
+            yield chunk
+
+    # écriture en flux dans un fichier temporaire, puis remplacement atomique
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    n = append_jsonl(tmp_path, _stream())
+    os.replace(tmp_path, output_path)
+    print(f"✅ {n} chunks ({len(md_paths)} documents) sauvegardés dans : {output_path}")
+
+    manifest = build_manifest(old_hashes, new_hashes)
+    save_manifest(manifest, MANIFEST_PATH)
+    print_manifest(manifest)
+    print(f"💾 Manifest : {MANIFEST_PATH}")
+
+    # store compact lu par le retriever (uniquement pour le fichier corpus par défaut)
+    if output_path.resolve() == Path(CHUNKS_JSONL_PATH).resolve():
+        build_chunk_store(iter_chunks(output_path), CHUNK_STORE_PATH)
+        print(f"💾 Store mmap : {CHUNK_STORE_PATH}")
+        n_facts = build_facts_db(iter_chunks(output_path), FACTS_DB_PATH)
+        print(f"💾 Faits chiffrés : {n_facts} → {FACTS_DB_PATH}")
+        refs = build_refs(iter_chunks(output_path))
+        save_refs(refs, ARTICLE_REFS_PATH)
+        print(f"💾 Renvois entre articles : {len(refs['edges'])} → {ARTICLE_REFS_PATH}")
+
+    if first:
         print("\n🧩 Exemple de premier chunk :")
-        ex = chunks[0]
-        for k, v in ex.items():
-            print(f"- {k}: {repr(v) if isinstance(v, str) else v}")
+        for k, v in first.items():
+            print(f"- {k}: {repr(v) if isinstance(v, str) else json.dumps(v, ensure_ascii=False)}")
 
 
 if __name__ == "__main__":
@@ -1,12 +1,40 @@
+import argparse
 import json
 import os
 from pathlib import Path
+from typing import Optional
 
 import faiss
 import numpy as np
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from ann_index import build_from_flat, is_exact, load_meta
+from binary_index import binary_index_available, build_binary_index
+from chunk_index import ChunkIndex, chunk_faiss_ids, chunk_record
+from chunk_manifest import dirty_ids, load_manifest, print_manifest
+from chunks_io import content_hash, default_chunks_path, iter_chunks
+from config_cgi import (
+    ANN_INDEX_SPEC,
+    EMBED_CONCURRENCY,
+    EMBED_DIMENSIONS,
+    EMBED_MAX_INPUT_TOKENS,
+    EMBED_MAX_TOKENS_PER_REQUEST,
+    FAISS_INDEX_PATH,
+    PASSAGE_INDEX_PATH,
+    PASSAGES_PATH,
+    USE_BINARY_SEARCH,
+)
+from embed_batches import Throughput, embed_request, run_in_flight
+from embedding_cache import embed_cached, format_stats
+from passages import (
+    count_tokens,
+    iter_passages,
+    pack_by_tokens,
+    passage_embedding_text,
+    truncate_tokens,
+)
+
 
 # ========= 1) CONFIG OPENAI =========
 
@@ -21,69 +49,331 @@ if not API_KEY:
 client = OpenAI(api_key=API_KEY)
 
 
-# ========= 2) PIPELINE PRINCIPAL =========
+# ========= 2) HELPERS =========
 
-def main():
-    # chemins
-    project_root = Path(__file__).resolve().parents[1]
-    chunks_path = project_root / "data" / "json" / "cgi-2025_chunks.json"
-    index_dir = project_root / "data" / "index"
-    index_dir.mkdir(parents=True, exist_ok=True)
+def _embed_api(texts, dims=None):
+    # base64 → float32 directement, retry/backoff sur rate limit ;
+    # dims : embeddings tronqués (text-embedding-3-*), renormalisés par l'API
+    return embed_request(client, EMBED_MODEL, texts, dims=dims)
+
+
+def _embed_batch(texts, dims=None):
+    # cache partagé : seuls les textes jamais embeddés partent à l'API
+    return embed_cached(texts, lambda missing: _embed_api(missing, dims), EMBED_MODEL, dims=dims)
+
+
+def _add_to_index(index, vectors):
+    if index is None:
+        index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+def _load_previous(index_path: Path, rows, key: str, hash_key: str, dims=None):
+    """
+    Index du build précédent : (index, {clé -> (content_hash, ligne ou id FAISS)}).
+    Permet de réutiliser les vecteurs des sections inchangées (même id, même empreinte,
+    même dimension d'embedding).
+    """
+    if not index_path.exists() or not rows:
+        return None, {}
+    meta = load_meta(index_path)
+    if meta.get("dims") != dims:
+        return None, {}
+    index = faiss.read_index(str(index_path))
+    if index.ntotal != len(rows) or not is_exact(index):
+        # index compressé (PQ / OPQ) : vecteurs repris via le cache d'embeddings
+        return None, {}
+    # index à ids stables : reconstruct(id FAISS) ; sinon reconstruct(ligne)
+    pos = (lambda i, r: r["faiss_id"]) if meta.get("id_map") else (lambda i, r: i)
+    return index, {str(r[key]): (r.get(hash_key), pos(i, r)) for i, r in enumerate(rows) if r.get(hash_key)}
+
+
+def _embed_or_reuse(batch, prev_index, prev_rows, key_hash_text, dims=None):
+    """
+    Vecteurs d'un batch : réutilisés depuis l'index précédent si (clé, empreinte)
+    inchangées, sinon recalculés. Retourne (vecteurs, positions recalculées).
+    """
+    keyed = [key_hash_text(item) for item in batch]
+    kept = {}
+    todo = []
+    for i, (k, h, _) in enumerate(keyed):
+        prev = prev_rows.get(k)
+        if prev_index is not None and prev and prev[0] == h:
+            kept[i] = prev[1]
+        else:
+            todo.append(i)
 
-    # ---- Charger les chunks ----
-    with chunks_path.open("r", encoding="utf-8") as f:
-        chunks = json.load(f)
+    fresh = _embed_batch([keyed[i][2] for i in todo], dims) if todo else None
+    # un seul array par batch : vecteurs repris reconstruits en place, nouveaux copiés
+    out = np.empty((len(batch), fresh.shape[1] if fresh is not None else prev_index.d), dtype="float32")
+    for i, row in kept.items():
+        prev_index.reconstruct(row, out[i])
+    if todo:
+        out[todo] = fresh
+    return out, todo
 
-    print(f"📦 {len(chunks)} chunks chargés.")
 
-    texts = [c["text"] for c in chunks]
+# ========= 3) INDEX DES CHUNKS (sections entières) =========
 
-    # ---- Embeddings OpenAI (en batch) ----
-    batch_size = 16  # <<--- plus petit pour rester sous 8192 tokens
-    all_embeddings = []
+def build_chunk_index(chunks_path: Path, index_dir: Path, incremental: bool = True,
+                      spec: str = ANN_INDEX_SPEC, report: bool = True, binary: bool = USE_BINARY_SEARCH,
+                      dims: Optional[int] = EMBED_DIMENSIONS, stem: str = "cgi-2025"):
+    # ---- Lire les chunks en flux ----
+    # On ne garde en mémoire que le batch courant + les métadonnées (pas le texte).
+    print(f"📦 Lecture des chunks (en flux) : {chunks_path}")
 
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        print(f"→ Embedding batch {i}–{i + len(batch) - 1} ...")
+    # stem : préfixe des fichiers (un shard = un corpus, voir shard_manager.py)
+    index_path = index_dir / f"{stem}_faiss.index"
+    metadata_path = index_dir / f"{stem}_metadata.json"
 
-        resp = client.embeddings.create(
-            model=EMBED_MODEL,
-            input=batch,
-        )
+    prev_index, prev_rows = None, {}
+    if incremental and metadata_path.exists():
+        prev_meta = json.loads(metadata_path.read_text(encoding="utf-8"))
+        prev_index, prev_rows = _load_previous(index_path, prev_meta, "id", "content_hash", dims)
 
-        batch_embeddings = [d.embedding for d in resp.data]
-        all_embeddings.extend(batch_embeddings)
+    index = None
+    metadata = []
+    reused = 0
 
-    embeddings = np.array(all_embeddings, dtype="float32")
-    print(f"✅ Embeddings shape : {embeddings.shape}")
+    def _with_tokens():
+        for c in iter_chunks(chunks_path):
+            n = c.get("n_tokens") or count_tokens(c["text"])
+            if n > EMBED_MAX_INPUT_TOKENS:
+                print(f"⚠️ chunk {c['id']} : {n} tokens > {EMBED_MAX_INPUT_TOKENS}, tronqué "
+                      f"(utiliser l'index des passages)")
+                n = EMBED_MAX_INPUT_TOKENS
+            yield c, n
 
-    # ---- Construire l'index FAISS ----
-    n_vectors, dim = embeddings.shape
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    print(f"✅ Index FAISS contient {index.ntotal} vecteurs.")
+    def _key_hash_text(item):
+        c, n = item
+        text = c["text"]
+        if n == EMBED_MAX_INPUT_TOKENS:
+            text = truncate_tokens(text, EMBED_MAX_INPUT_TOKENS)
+        return str(c["id"]), c.get("content_hash") or content_hash(c["text"]), text
 
-    # ---- Sauvegarder l'index ----
-    index_path = index_dir / "cgi-2025_faiss.index"
-    faiss.write_index(index, str(index_path))
-    print(f"💾 Index sauvegardé : {index_path}")
+    # Batches packés sur le nombre de tokens stocké dans chaque chunk,
+    # EMBED_CONCURRENCY requêtes en vol, ajoutés à l'index dans l'ordre
+    stats = Throughput("chunks")
+
+    def _work(batch):
+        return _embed_or_reuse(batch, prev_index, prev_rows, _key_hash_text, dims)
+
+    def _consume(batch, result):
+        nonlocal index, reused
+        vectors, fresh = result
+        start = len(metadata)
+        print(f"→ Embedding batch {start}–{start + len(batch) - 1} "
+              f"({sum(n for _, n in batch)} tokens, {len(batch) - len(fresh)} repris) ...")
+
+        for c, n in batch:
+            metadata.append(chunk_record(c))
+
+        reused += len(batch) - len(fresh)
+        stats.add(len(fresh), sum(batch[i][1] for i in fresh))
+        index = _add_to_index(index, vectors)
+
+    run_in_flight(pack_by_tokens(_with_tokens(), lambda x: x[1], EMBED_MAX_TOKENS_PER_REQUEST),
+                  _work, _consume, EMBED_CONCURRENCY)
+
+    if index is None:
+        raise RuntimeError(f"Aucun chunk trouvé dans {chunks_path}")
+
+    print(f"✅ {len(metadata)} chunks ({reused} vecteurs réutilisés, "
+          f"{len(metadata) - reused} embeddés).")
+    print(f"✅ Index FAISS contient {index.ntotal} vecteurs (dim={index.d}).")
+    print(f"⚡ {stats.report()}")
+
+    # ---- Index binaire 1 bit + vecteurs float de rescoring (depuis l'index exact) ----
+    if binary:
+        build_binary_index(index.reconstruct_n(0, index.ntotal))
+
+    # ---- Convertir (spec ANN) + sauvegarder l'index et sa méta ----
+    # ids FAISS = ids stables des chunks : mises à jour ultérieures en place (--update)
+    build_from_flat(index, index_path, spec, metric="l2", report=report,
+                    ids=chunk_faiss_ids(m["id"] for m in metadata), embed_model=EMBED_MODEL, dims=dims)
+    print(f"💾 Index sauvegardé : {index_path} ({spec})")
 
     # ---- Sauvegarder les métadonnées ----
-    metadata = [
-        {
-            "id": c["id"],
-            "source": c.get("source"),
-            "title": c.get("title"),
-            "article": c.get("article"),
-        }
-        for c in chunks
-    ]
-
-    metadata_path = index_dir / "cgi-2025_metadata.json"
-    with metadata_path.open("w", encoding="utf-8") as f:
+    tmp = metadata_path.with_name(metadata_path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, metadata_path)
 
     print(f"💾 Métadonnées sauvegardées : {metadata_path}")
+
+
+def update_chunk_index(chunks_path: Path, index_dir: Path, manifest: Optional[dict] = None,
+                       dims: Optional[int] = EMBED_DIMENSIONS, stem: str = "cgi-2025"):
+    """
+    Met à jour l'index des chunks en place : seuls les chunks ajoutés / modifiés sont
+    embeddés, les supprimés sont retirés, les autres lignes ne bougent pas. Index et
+    métadonnées réécrits atomiquement.
+    Le diff est calculé entre les chunks et les empreintes (content_hash) stockées dans
+    les métadonnées de l'index, comme le build incrémental : plusieurs passes du chunker
+    entre deux mises à jour ne perdent rien. Le manifest (dernière passe seulement)
+    n'est qu'indicatif.
+    `stem` : préfixe des fichiers, comme `build_chunk_index` (corpus, shard, édition).
+    """
+    index_path = index_dir / f"{stem}_faiss.index"
+    ci = ChunkIndex(index_path, index_dir / f"{stem}_metadata.json")
+    if load_meta(index_path).get("dims") != dims:
+        raise ValueError(f"{index_path} construit en dims={load_meta(index_path).get('dims')} "
+                         f"(demandé : {dims}) : relancer sans --update")
+
+    indexed = {cid: r.get("content_hash") for cid, r in ci.records.items()}
+    seen = set()
+    chunks = []
+    for c in iter_chunks(chunks_path):
+        cid = str(c["id"])
+        seen.add(cid)
+        if indexed.get(cid) != (c.get("content_hash") or content_hash(c["text"])):
+            chunks.append(c)
+    stale = [cid for cid in indexed if cid not in seen]
+    if manifest:
+        hinted = len(dirty_ids(manifest)) + len(manifest.get("removed", []))
+        if hinted != len(chunks) + len(stale):
+            print(f"ℹ️ manifest : {hinted} chunks touchés, diff avec l'index : {len(chunks) + len(stale)} "
+                  "(plusieurs passes du chunker depuis la dernière mise à jour ?)")
+    texts = [truncate_tokens(c["text"], EMBED_MAX_INPUT_TOKENS) for c in chunks]
+
+    removed = ci.remove(stale)
+    if chunks:
+        ci.replace(chunks, _embed_batch(texts, dims))
+    ci.save()
+    print(f"✅ Index des chunks mis à jour : {len(chunks)} embeddés / remplacés, {removed} retirés, "
+          f"{len(ci)} au total.")
+
+    # l'index binaire est aligné sur les lignes du fichier de chunks de l'index principal :
+    # reconstruit depuis l'index
+    if index_path == Path(FAISS_INDEX_PATH) and binary_index_available():
+        order = [c["id"] for c in iter_chunks(chunks_path)]
+        build_binary_index(ci.vectors(order))
+
+
+# ========= 4) INDEX DES PASSAGES (small-to-big) =========
+
+def build_passage_index(chunks_path: Path, incremental: bool = True,
+                        spec: str = ANN_INDEX_SPEC, report: bool = True,
+                        dims: Optional[int] = EMBED_DIMENSIONS):
+    """
+    Découpe chaque chunk en passages bornés en tokens, les embedde et écrit :
+      - PASSAGE_INDEX_PATH : index FAISS (1 ligne = 1 passage)
+      - PASSAGES_PATH      : JSONL aligné (passage_id, chunk_id, start, end, n_tokens, chunk_hash)
+    Les passages d'un chunk inchangé (même chunk_hash) reprennent leur vecteur précédent.
+    """
+    print(f"📦 Découpe en passages (en flux) : {chunks_path}")
+
+    prev_index, prev_rows = None, {}
+    if incremental and PASSAGES_PATH.exists():
+        prev_passages = list(iter_chunks(PASSAGES_PATH))
+        prev_index, prev_rows = _load_previous(PASSAGE_INDEX_PATH, prev_passages,
+                                               "passage_id", "chunk_hash", dims)
+
+    def _key_hash_text(cp):
+        c, p = cp
+        return p["passage_id"], p["chunk_hash"], passage_embedding_text(c, p)
+
+    def _with_hash():
+        for c, p in iter_passages(iter_chunks(chunks_path)):
+            p["chunk_hash"] = c.get("content_hash") or content_hash(c["text"])
+            yield c, p
+
+    index = None
+    n_passages = 0
+    reused = 0
+    PASSAGES_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = PASSAGES_PATH.with_name(PASSAGES_PATH.name + ".tmp")
+
+    stats = Throughput("passages")
+
+    def _work(batch):
+        return _embed_or_reuse(batch, prev_index, prev_rows, _key_hash_text, dims)
+
+    with tmp_path.open("w", encoding="utf-8") as meta_out:
+
+        def _consume(batch, result):
+            nonlocal index, n_passages, reused
+            vectors, fresh = result
+            print(f"→ Embedding passages {n_passages}–{n_passages + len(batch) - 1} "
+                  f"({len(batch) - len(fresh)} repris) ...")
+            reused += len(batch) - len(fresh)
+            stats.add(len(fresh), sum(batch[i][1]["n_tokens"] for i in fresh))
+            index = _add_to_index(index, vectors)
+
+            for _, p in batch:
+                meta_out.write(json.dumps(p, ensure_ascii=False) + "\n")
+            n_passages += len(batch)
+
+        # titre répété en tête des passages → petite marge sur le compte stocké
+        packed = pack_by_tokens(_with_hash(),
+                                lambda cp: cp[1]["n_tokens"] + 32,
+                                EMBED_MAX_TOKENS_PER_REQUEST)
+        run_in_flight(packed, _work, _consume, EMBED_CONCURRENCY)
+
+    if index is None:
+        raise RuntimeError(f"Aucun passage produit depuis {chunks_path}")
+
+    build_from_flat(index, PASSAGE_INDEX_PATH, spec, metric="l2", report=report,
+                    embed_model=EMBED_MODEL, dims=dims)
+    os.replace(tmp_path, PASSAGES_PATH)
+    print(f"✅ {n_passages} passages indexés (dim={index.d}, {reused} vecteurs réutilisés).")
+    print(f"⚡ {stats.report()}")
+    print(f"💾 Index passages : {PASSAGE_INDEX_PATH} ({spec})")
+    print(f"💾 Passages       : {PASSAGES_PATH}")
+
+
+# ========= 5) PIPELINE PRINCIPAL =========
+
+def main():
+    parser = argparse.ArgumentParser(description="Construction des index FAISS (chunks / passages)")
+    parser.add_argument("--level", choices=["chunk", "passage", "both"], default="both",
+                        help="Index à construire (défaut : les deux)")
+    parser.add_argument("--full", action="store_true",
+                        help="Ré-embedde tout (ignore les vecteurs du build précédent)")
+    parser.add_argument("--index-spec", default=ANN_INDEX_SPEC,
+                        help="flat | ivf | ivfpq | hnsw | opq | chaîne index_factory (défaut : config)")
+    parser.add_argument("--dims", type=int, choices=[256, 512, 1024, 1536], default=EMBED_DIMENSIONS,
+                        help="Dimension des embeddings (défaut : config, dimension native du modèle)")
+    parser.add_argument("--binary", action="store_true", default=USE_BINARY_SEARCH,
+                        help="Écrit aussi l'index binaire (1 bit) + vecteurs de rescoring des chunks")
+    parser.add_argument("--no-report", action="store_true",
+                        help="Pas de rapport recall / latence vs Flat après conversion")
+    parser.add_argument("--update", action="store_true",
+                        help="Index des chunks : mise à jour en place (chunks modifiés depuis l'index seulement)")
+    parser.add_argument("--stem", type=str, default="cgi-2025",
+                        help="Préfixe des fichiers de l'index des chunks (<stem>_faiss.index / _metadata.json)")
+    parser.add_argument("--chunks", type=str, default=None,
+                        help="Fichier de chunks (défaut : celui du corpus courant)")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    if manifest:
+        print_manifest(manifest)
+
+    # chemins
+    project_root = Path(__file__).resolve().parents[1]
+    chunks_path = Path(args.chunks) if args.chunks else default_chunks_path()
+    index_dir = project_root / "data" / "index"
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    # autre stem (corpus, édition) : ni index binaire ni manifest, propres à l'index principal
+    chunk_index_path = index_dir / f"{args.stem}_faiss.index"
+    main_index = chunk_index_path == Path(FAISS_INDEX_PATH)
+    if args.level in {"chunk", "both"} and args.update and chunk_index_path.exists():
+        update_chunk_index(chunks_path, index_dir, manifest if main_index else None, dims=args.dims,
+                           stem=args.stem)
+    elif args.level in {"chunk", "both"}:
+        if args.update:
+            print("⚠️ --update sans index des chunks : construction complète")
+        build_chunk_index(chunks_path, index_dir, incremental=not args.full,
+                          spec=args.index_spec, report=not args.no_report,
+                          binary=args.binary and main_index, dims=args.dims, stem=args.stem)
+    if args.level in {"passage", "both"}:
+        build_passage_index(chunks_path, incremental=not args.full,
+                            spec=args.index_spec, report=not args.no_report, dims=args.dims)
+
+    print(f"📊 {format_stats()}")
     print("🎉 Construction de l'index FAISS terminée.")
 
 
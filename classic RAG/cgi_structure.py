@@ -0,0 +1,174 @@
+# src/cgi_structure.py
+"""
+Repérage de la structure du CGI (Livre / Titre / Sous-titre / Chapitre / Section / Article)
+à partir des titres rencontrés pendant le parcours du document.
+
+Utilisé par les chunkers (markdown ou arbre Docling) pour attacher à chaque chunk
+son chemin structurel.
+"""
+import re
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+# Niveaux du plus général au plus fin
+LEVELS = ["livre", "titre", "sous_titre", "chapitre", "section", "article"]
+
+_ORDINAL = r"(PREMIER|PREMIERE|[IVXLC]+)\b"
+
+# LIVRE peut apparaître en milieu de ligne ("CODE GENERAL DES IMPOTS LIVRE PREMIER ...")
+_LIVRE_RE = re.compile(r"\bLIVRE\s+" + _ORDINAL)
+_SOUS_TITRE_RE = re.compile(r"^SOUS[\s-]+TITRE\s+" + _ORDINAL)
+_TITRE_RE = re.compile(r"^TITRE\s+" + _ORDINAL)
+_CHAPITRE_RE = re.compile(r"^CHAPITRE\s+" + _ORDINAL)
+_SECTION_RE = re.compile(r"(?i)^section\s+([IVXLC]+)\b")
+# suffixe d'article, éventuellement collé à un renvoi de note ("Article 247 bis1747")
+ARTICLE_SUFFIX = r"(?:bis|ter|quater|quinquies|sexies|septies|octies|nonies|decies)(?=\d|\b)"
+_ARTICLE_HEAD_RE = re.compile(rf"(?i)^article\s+(premier|\d+(?:\s*{ARTICLE_SUFFIX})?)")
+
+# Annexes reproduites après le code (lois de finances, décrets, arrêtés) : leurs "Article N"
+# ne sont pas des articles du CGI. Fin de l'annexe : un LIVRE en tête de titre.
+_ANNEX_RE = re.compile(
+    r"(?i)^(?:annexes?\s+au\s+code\s+g[ée]n[ée]ral\s+des\s+imp[ôo]ts"
+    r"|article\s+\S+\s+(?:de\s+la\s+loi|du\s+d[ée]cret))"
+)
+_LIVRE_HEAD_RE = re.compile(r"^(?:CODE\s+G[EÉ]N[EÉ]RAL\s+DES\s+IMP[OÔ]TS\s+)?LIVRE\s+" + _ORDINAL)
+
+# Regex historique des chunkers : "Article 5", "ARTICLE 247A", etc. (n'importe où dans le titre)
+ARTICLE_RE = re.compile(r"(?i)\barticle\s+(\d+[A-Za-z]*)")
+
+
+def article_from_title(title: str) -> Optional[str]:
+    """
+    Champ `article` d'un chunk : 'ARTICLE X' si détecté dans le titre, sinon None.
+    """
+    m = ARTICLE_RE.search(title or "")
+    return f"ARTICLE {m.group(1)}" if m else None
+
+
+def normalize_article(raw: str) -> str:
+    """
+    'premier' -> '1', '9  bis' -> '9 BIS'.
+    """
+    raw = re.sub(r"\s+", " ", raw.strip()).upper()
+    return "1" if raw == "PREMIER" else raw
+
+
+def code_article(chunk: Dict[str, Any], path: Dict[str, Optional[str]]) -> Optional[str]:
+    """
+    Article du CGI qui contient le chunk (chemin structurel, sinon champ `article`) ;
+    None hors du corps du code (annexes : lois de finances, décrets...).
+    """
+    if path.get("annexe"):
+        return None
+    return path.get("article") or chunk.get("article")
+
+
+def article_number(article: Optional[str]) -> Optional[int]:
+    """
+    Partie numérique d'un article ('ARTICLE 9 BIS' -> 9), utile pour les filtres par plage.
+    """
+    if not article:
+        return None
+    m = re.search(r"\d+", article)
+    return int(m.group(0)) if m else None
+
+
+class StructureTracker:
+    """
+    Maintient le chemin structurel courant.
+    Quand un niveau change, tous les niveaux plus fins sont remis à zéro.
+    Dans une annexe (`annexe` = intitulé qui l'ouvre), tous les niveaux sont vides :
+    ses titres et "Article N" ne sont pas ceux du code.
+    """
+
+    def __init__(self):
+        self.path: Dict[str, Optional[str]] = {lvl: None for lvl in LEVELS}
+        # intitulé complet qui a ouvert chaque niveau ("TITRE II L'IMPOT SUR LE REVENU")
+        self.labels: Dict[str, Optional[str]] = {lvl: None for lvl in LEVELS}
+        self.annex: Optional[str] = None
+
+    def _set(self, level: str, value: str, label: Optional[str] = None) -> None:
+        self.path[level] = value
+        self.labels[level] = label or value
+        for lower in LEVELS[LEVELS.index(level) + 1:]:
+            self.path[lower] = None
+            self.labels[lower] = None
+
+    def observe_heading(self, heading: str) -> None:
+        """
+        À appeler sur chaque titre de section (ligne '## ...' ou SectionHeaderItem).
+        """
+        text = (heading or "").strip()
+        if not text:
+            return
+
+        if self.annex is not None:
+            if not _LIVRE_HEAD_RE.match(text):
+                return
+            self.annex = None  # retour au corps du code
+
+        if _ANNEX_RE.match(text):
+            for lvl in LEVELS:
+                self.path[lvl] = None
+                self.labels[lvl] = None
+            self.annex = text
+            return
+
+        m = _LIVRE_RE.search(text)
+        if m:
+            self._set("livre", f"LIVRE {m.group(1)}", text[m.start():])
+            # "CODE ... LIVRE PREMIER ..." ne porte pas d'autre niveau
+            return
+
+        self.observe_line(text)
+
+        m = _SECTION_RE.match(text)
+        if m:
+            self._set("section", f"SECTION {m.group(1).upper()}", text)
+            return
+
+        m = _ARTICLE_HEAD_RE.match(text)
+        if m:
+            self._set("article", f"ARTICLE {normalize_article(m.group(1))}", text)
+
+    def observe_line(self, line: str) -> None:
+        """
+        À appeler sur les lignes de texte : certains intitulés (ex. 'TITRE PREMIER ...')
+        sont extraits comme paragraphes et non comme titres.
+        Seules les formes en majuscules ancrées en début de ligne sont retenues.
+        """
+        text = (line or "").strip()
+        if not text or len(text) > 200 or self.annex is not None:
+            return
+
+        m = _SOUS_TITRE_RE.match(text)
+        if m:
+            self._set("sous_titre", f"SOUS TITRE {m.group(1)}", text)
+            return
+
+        m = _TITRE_RE.match(text)
+        if m:
+            self._set("titre", f"TITRE {m.group(1)}", text)
+            return
+
+        m = _CHAPITRE_RE.match(text)
+        if m:
+            self._set("chapitre", f"CHAPITRE {m.group(1)}", text)
+
+    def snapshot(self) -> Dict[str, Optional[str]]:
+        return dict(self.path, annexe=self.annex)
+
+
+def iter_with_paths(
+    chunks: Iterable[Dict[str, Any]],
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, Optional[str]], Dict[str, Optional[str]]]]:
+    """
+    (chunk, path, labels) pour un flux de chunks dans l'ordre du document.
+    Le `path` stocké dans le chunk est utilisé s'il existe ; sinon (anciens fichiers
+    sans `path`) il est recalculé en rejouant titres et lignes comme les chunkers.
+    """
+    tracker = StructureTracker()
+    for c in chunks:
+        tracker.observe_heading(c.get("title") or "")
+        yield c, c.get("path") or tracker.snapshot(), dict(tracker.labels, annexe=tracker.annex)
+        for line in (c.get("text") or "").splitlines()[1:]:
+            tracker.observe_line(line.strip())
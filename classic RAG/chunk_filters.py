@@ -0,0 +1,222 @@
+# src/chunk_filters.py
+"""
+Filtres de métadonnées appliqués pendant la recherche FAISS (et non après) :
+
+    search_chunks(q, filters={"livre": "LIVRE PREMIER", "articles": (87, 125)})
+    search_chunks(q, filters={"source": "cgi-2025", "titre": ["TITRE II", "TITRE III"]})
+
+Prédicats (combinés en ET ; une liste de valeurs = OU) :
+  - "articles"  : numéro d'article du code (partie numérique) : 247, (87, 125), (None, 30) ;
+                  les "Article N" des annexes (lois de finances, décrets) n'y répondent pas ;
+  - "source"    : champ `source` des chunks ("cgi-2025") ;
+  - niveaux du chemin structurel : "livre", "titre", "sous_titre", "chapitre", "section"
+    ("Livre I", "LIVRE PREMIER" et "livre premier" sont équivalents).
+
+Pour chaque valeur de source / niveau, un bitset des lignes (1 bit par chunk) est
+précalculé une fois ; un filtre = ET / OU de bitsets + comparaison vectorisée des
+numéros d'article. Le bitset final est passé à FAISS comme IDSelector : les lignes
+exclues ne sont pas scorées, le top-k ne contient que des chunks admissibles et une
+recherche filtrée coûte moins cher qu'une recherche complète (HNSW excepté : le
+graphe est parcouru, seuls les résultats sont filtrés).
+
+    python chunk_filters.py --livre "LIVRE PREMIER" --articles 87 125
+"""
+import argparse
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from cgi_structure import LEVELS, article_number, code_article, iter_with_paths
+
+# niveaux filtrables (l'article se filtre par numéro : "articles")
+PATH_LEVELS = [lvl for lvl in LEVELS if lvl != "article"]
+FILTER_KEYS = ("articles", "source", *PATH_LEVELS)
+
+
+def _level_value(value: Any) -> str:
+    """
+    'Livre premier' / 'LIVRE I' -> 'LIVRE I' ; 'Sous-titre II' -> 'SOUS TITRE II'.
+    """
+    text = re.sub(r"[\s\-]+", " ", str(value).strip().upper())
+    return re.sub(r"\bPREMIERE?\b", "I", text)
+
+
+def normalize_value(name: str, value: Any) -> str:
+    # source : identifiant tel quel (casse ignorée) ; niveaux : forme normalisée
+    return str(value).strip().lower() if name == "source" else _level_value(value)
+
+
+def _values(name: str, value: Any) -> List[str]:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sorted({normalize_value(name, v) for v in value})
+    return [normalize_value(name, value)]
+
+
+def _article_range(value: Any) -> Tuple[Optional[int], Optional[int]]:
+    if isinstance(value, (list, tuple)):
+        if len(value) != 2:
+            raise ValueError(f"filtre articles : (début, fin) attendu, reçu {value!r}")
+        lo, hi = value
+        return (None if lo is None else int(lo), None if hi is None else int(hi))
+    return int(value), int(value)
+
+
+def filter_key(filters: Optional[Dict[str, Any]]) -> Optional[Tuple]:
+    """
+    Forme canonique (hashable) d'un filtre, pour le cache des bitsets / sélecteurs.
+    None si aucun prédicat.
+    """
+    if not filters:
+        return None
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"filtres inconnus : {sorted(unknown)} (disponibles : {', '.join(FILTER_KEYS)})")
+    key = []
+    for name in FILTER_KEYS:
+        value = filters.get(name)
+        if value is None:
+            continue
+        key.append((name, _article_range(value) if name == "articles" else tuple(_values(name, value))))
+    return tuple(key) or None
+
+
+class ChunkAttributes:
+    """
+    Attributs filtrables des chunks, une entrée par ligne FAISS (ordre de `chunks`).
+    """
+
+    def __init__(self, chunks: Iterable[Dict[str, Any]]):
+        numbers: List[int] = []
+        rows: Dict[str, Dict[str, List[int]]] = {name: defaultdict(list) for name in ("source", *PATH_LEVELS)}
+        for i, (c, path, _) in enumerate(iter_with_paths(chunks)):
+            numbers.append(article_number(code_article(c, path)) or -1)
+            if c.get("source"):
+                rows["source"][normalize_value("source", c["source"])].append(i)
+            for lvl in PATH_LEVELS:
+                if path.get(lvl):
+                    rows[lvl][_level_value(path[lvl])].append(i)
+
+        self.n = len(numbers)
+        self.article_number = np.asarray(numbers, dtype="int32")  # -1 : hors article du code (annexes comprises)
+        # bitsets précalculés : (nom, valeur) → 1 bit par ligne (ordre "little", celui d'IDSelectorBitmap)
+        self.bitsets: Dict[str, Dict[str, np.ndarray]] = {}
+        for name, by_value in rows.items():
+            self.bitsets[name] = {}
+            for value, value_rows in by_value.items():
+                mask = np.zeros(self.n, dtype=bool)
+                mask[value_rows] = True
+                self.bitsets[name][value] = np.packbits(mask, bitorder="little")
+
+    def values(self, name: str) -> List[str]:
+        return sorted(self.bitsets.get(name, {}))
+
+    def bitmap(self, key: Optional[Tuple]) -> np.ndarray:
+        """
+        Bitset des lignes admissibles pour un filtre canonique (`filter_key`).
+        """
+        out = np.full((self.n + 7) // 8, 0xFF, dtype="uint8")
+        for name, value in key or ():
+            if name == "articles":
+                lo, hi = value
+                ok = self.article_number >= (0 if lo is None else lo)
+                if hi is not None:
+                    ok &= self.article_number <= hi
+                out &= np.packbits(ok, bitorder="little")
+                continue
+            any_of = np.zeros_like(out)
+            for v in value:
+                bits = self.bitsets[name].get(v)
+                if bits is not None:
+                    any_of |= bits
+            out &= any_of
+        return out
+
+    def mask(self, key: Optional[Tuple]) -> np.ndarray:
+        """
+        `bitmap` déplié : bool[n].
+        """
+        return np.unpackbits(self.bitmap(key), count=self.n, bitorder="little").astype(bool)
+
+
+def id_selector(bitmap: np.ndarray, n: int, ids: Optional[np.ndarray] = None) -> faiss.IDSelector:
+    """
+    IDSelector FAISS des lignes admissibles :
+      - index indexé par ligne : IDSelectorBitmap sur le bitset (aucune copie) ;
+      - index à ids stables (chunk_index.py) : FAISS passe l'id au sélecteur →
+        IDSelectorBatch des ids des lignes admissibles (`ids` : id de chaque ligne).
+    """
+    if ids is not None:
+        mask = np.unpackbits(bitmap, count=n, bitorder="little").astype(bool)
+        return faiss.IDSelectorBatch(np.ascontiguousarray(ids[mask], dtype="int64"))
+    bitmap = np.ascontiguousarray(bitmap, dtype="uint8")
+    sel = faiss.IDSelectorBitmap(n, faiss.swig_ptr(bitmap))
+    sel.referenced_objects = [bitmap]  # le sélecteur pointe dans le tableau numpy
+    return sel
+
+
+def rows_mask(chunk_mask: np.ndarray, chunk_rows: Sequence[int]) -> np.ndarray:
+    """
+    Masque d'un index dont chaque ligne pointe vers un chunk (ex. passages → chunk parent) ;
+    `chunk_rows[i]` = ligne du chunk de la ligne i (-1 : chunk inconnu, exclu).
+    """
+    chunk_rows = np.asarray(chunk_rows, dtype="int64")
+    return (chunk_rows >= 0) & chunk_mask[np.clip(chunk_rows, 0, None)]
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    from ann_index import load_index, load_meta, search_parameters
+    from chunks_io import default_chunks_path, iter_chunks
+    from config_cgi import FAISS_INDEX_PATH
+
+    parser = argparse.ArgumentParser(description="Filtre de métadonnées : lignes retenues et coût de recherche")
+    parser.add_argument("--articles", type=int, nargs=2, metavar=("DEBUT", "FIN"))
+    parser.add_argument("--source", type=str)
+    for lvl in PATH_LEVELS:
+        parser.add_argument(f"--{lvl.replace('_', '-')}", dest=lvl, type=str)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    chunks = list(iter_chunks(default_chunks_path()))
+    t0 = time.perf_counter()
+    attrs = ChunkAttributes(chunks)
+    print(f"📦 {attrs.n} chunks, bitsets précalculés en {(time.perf_counter() - t0) * 1e3:.0f} ms")
+    for lvl in ("source", "livre"):
+        print(f"   {lvl} : {', '.join(attrs.values(lvl))}")
+
+    key = filter_key({name: getattr(args, name) for name in FILTER_KEYS})
+    t0 = time.perf_counter()
+    bitmap = attrs.bitmap(key)
+    kept = int(attrs.mask(key).sum())
+    print(f"🔎 filtre {key} : {kept} / {attrs.n} chunks ({(time.perf_counter() - t0) * 1e3:.2f} ms)")
+
+    # Coût FAISS : index réel s'il existe, sinon Flat synthétique 1536-d de même taille
+    if FAISS_INDEX_PATH.exists():
+        index = load_index(FAISS_INDEX_PATH)
+        ids = None
+        if load_meta(FAISS_INDEX_PATH).get("id_map"):
+            from chunk_index import chunk_faiss_ids
+            ids = chunk_faiss_ids(c["id"] for c in chunks)
+    else:
+        index = faiss.IndexFlatL2(1536)
+        index.add(np.random.default_rng(0).standard_normal((attrs.n, 1536)).astype("float32"))
+        ids = None
+    xq = np.random.default_rng(1).standard_normal((args.queries, index.d)).astype("float32")
+    params = search_parameters(index, id_selector(bitmap, attrs.n, ids))
+    for name, kw in (("complet", {}), ("filtré", {"params": params})):
+        t0 = time.perf_counter()
+        for q in xq:
+            index.search(q[None], args.k, **kw)
+        print(f"⏱️ {name:8s} {(time.perf_counter() - t0) * 1e3 / len(xq):.3f} ms / requête")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# src/chunk_index.py
+"""
+Index FAISS des chunks indexé par id de chunk (et non par numéro de ligne).
+
+Chaque chunk reçoit un id FAISS stable (`chunk_faiss_id` : empreinte 63 bits de son
+id), si bien qu'ajouter, retirer ou modifier un article ne touche que ses lignes :
+
+    ci = ChunkIndex()                       # index + métadonnées, chargés en RAM (pas de mmap)
+    ci.remove(["ARTICLE-12-0"])
+    ci.replace(chunks, vectors)             # = remove des ids connus + add
+    ci.save()                               # écriture atomique (tmp + os.replace)
+
+Fichiers :
+  - FAISS_INDEX_PATH (+ .meta.json, "id_map": true) : IndexIDMap2, ou IVF à ids natifs
+  - CHUNK_METADATA_PATH : [{id, source, title, article, n_tokens, content_hash, faiss_id}]
+
+Un index construit avant les ids stables (ligne i = chunk i) est converti au
+chargement, à partir de l'ordre des métadonnées.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence
+
+import faiss
+import numpy as np
+
+from ann_index import (
+    METRICS,
+    _describe,
+    all_vectors,
+    convert_index,
+    is_exact,
+    load_index,
+    load_meta,
+    save_index,
+)
+from chunks_io import content_hash
+from config_cgi import ANN_EF_SEARCH, ANN_NPROBE, CHUNK_METADATA_PATH, FAISS_INDEX_PATH
+
+_ID_MASK = (1 << 63) - 1  # ids FAISS : int64 positifs (-1 = pas de résultat)
+_SAVE_ARGS = ("spec", "factory", "metric", "nprobe", "efSearch", "dim", "ntotal", "report")
+
+
+def chunk_faiss_id(chunk_id: Any) -> int:
+    """
+    Id FAISS stable d'un chunk (même valeur d'un build à l'autre, quel que soit
+    l'ordre du corpus).
+    """
+    digest = hashlib.blake2b(str(chunk_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & _ID_MASK
+
+
+def chunk_faiss_ids(chunk_ids: Iterable[Any]) -> np.ndarray:
+    return np.fromiter((chunk_faiss_id(c) for c in chunk_ids), dtype="int64")
+
+
+def chunk_record(c: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ligne de CHUNK_METADATA_PATH pour un chunk.
+    """
+    return {
+        "id": c["id"],
+        "source": c.get("source"),
+        "title": c.get("title"),
+        "article": c.get("article"),
+        "n_tokens": c.get("n_tokens"),
+        "content_hash": c.get("content_hash") or content_hash(c["text"]),
+        "faiss_id": chunk_faiss_id(c["id"]),
+    }
+
+
+class FaissRowMap:
+    """
+    id FAISS → ligne de la liste de chunks du retriever (CHUNKS / ChunkStore),
+    vectorisé (recherche dichotomique sur les ids triés).
+    """
+
+    def __init__(self, chunk_ids: Iterable[Any]):
+        self.ids = chunk_faiss_ids(chunk_ids)  # id FAISS de chaque ligne
+        self._order = np.argsort(self.ids, kind="stable")
+        self._sorted = self.ids[self._order]
+
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Même forme que `ids` ; -1 pour les ids absents (chunk retiré depuis le build).
+        """
+        ids = np.asarray(ids, dtype="int64")
+        if not len(self._sorted):
+            return np.full(ids.shape, -1, dtype="int64")
+        pos = np.clip(np.searchsorted(self._sorted, ids), 0, len(self._sorted) - 1)
+        found = (self._sorted[pos] == ids) & (ids >= 0)
+        return np.where(found, self._order[pos], -1)
+
+
+class ChunkIndex:
+    """
+    Index des chunks + métadonnées, modifiables par id de chunk.
+    """
+
+    def __init__(self, index_path: Path = FAISS_INDEX_PATH, metadata_path: Path = CHUNK_METADATA_PATH):
+        self.index_path = Path(index_path)
+        self.metadata_path = Path(metadata_path)
+        self.meta = load_meta(self.index_path)
+        records = json.loads(self.metadata_path.read_text(encoding="utf-8"))
+
+        # mutation : index lu en RAM (un index mappé est en lecture seule)
+        index = load_index(self.index_path, mmap=False)
+        if not self.meta.get("id_map"):
+            index = self._to_id_map(index, records)
+        self.index = index
+
+        self.records: Dict[str, Dict[str, Any]] = {}
+        for r in records:
+            r.setdefault("faiss_id", chunk_faiss_id(r["id"]))
+            self.records[str(r["id"])] = r
+        if len({r["faiss_id"] for r in self.records.values()}) != len(self.records):
+            raise ValueError(f"{self.metadata_path} : collision d'ids FAISS (ou id de chunk en double)")
+        if self.index.ntotal != len(self.records):
+            raise ValueError(f"{self.index_path} ({self.index.ntotal} vecteurs) non aligné sur "
+                             f"{self.metadata_path} ({len(self.records)} chunks)")
+
+    def _to_id_map(self, index: faiss.Index, records: List[Dict[str, Any]]) -> faiss.Index:
+        # ancien index : ligne i = records[i] → mêmes codes, réindexés par id stable
+        if index.ntotal != len(records):
+            raise ValueError(f"{self.index_path} ({index.ntotal}) non aligné sur {self.metadata_path} "
+                             f"({len(records)}) : relancer build_faiss_index.py --full")
+        if not is_exact(index):
+            print(f"⚠️ {self.index_path} compressé : vecteurs reconstruits approchés pour la conversion")
+        metric = self.meta.get("metric", "l2")
+        flat = faiss.IndexFlat(index.d, METRICS[metric])
+        flat.add(all_vectors(index))
+        index, _ = convert_index(flat, self.meta.get("spec", "flat"), metric,
+                                 ids=chunk_faiss_ids(r["id"] for r in records))
+        self.meta["id_map"] = True
+        print(f"🔁 {self.index_path.name} converti en index à ids stables ({index.ntotal} vecteurs)")
+        return index
+
+    # --- lecture ---
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, chunk_id: Any) -> bool:
+        return str(chunk_id) in self.records
+
+    def ids(self) -> List[Any]:
+        return [r["id"] for r in self.records.values()]
+
+    def vectors(self, chunk_ids: Sequence[Any]) -> np.ndarray:
+        """
+        Vecteurs [n, d] des chunks demandés, dans l'ordre demandé.
+        """
+        missing = [c for c in chunk_ids if c not in self]
+        if missing:
+            raise KeyError(f"chunks absents de l'index : {missing[:5]}")
+        if not len(chunk_ids):
+            return np.zeros((0, self.index.d), dtype="float32")
+        return self.index.reconstruct_batch(chunk_faiss_ids(chunk_ids))
+
+    # --- mutation ---
+
+    def add(self, chunks: Sequence[Dict[str, Any]], vectors: np.ndarray) -> None:
+        """
+        Ajoute des chunks absents de l'index (KeyError sinon : utiliser `replace`).
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="float32").reshape(len(chunks), -1)
+        if vectors.shape[1] != self.index.d:
+            raise ValueError(f"vecteurs en dim={vectors.shape[1]}, index en dim={self.index.d}")
+        present = [c["id"] for c in chunks if c["id"] in self]
+        if present:
+            raise KeyError(f"chunks déjà indexés : {present[:5]} (utiliser replace)")
+        records = [chunk_record(c) for c in chunks]
+        if len({r["faiss_id"] for r in records}) != len(records):
+            raise ValueError("ids de chunks en double dans le lot ajouté")
+        self.index.add_with_ids(vectors, np.array([r["faiss_id"] for r in records], dtype="int64"))
+        for r in records:
+            self.records[str(r["id"])] = r
+
+    def remove(self, chunk_ids: Iterable[Any]) -> int:
+        """
+        Retire les chunks indiqués (ids inconnus ignorés). Retourne le nombre retiré.
+        """
+        known = [str(c) for c in chunk_ids if c in self]
+        if not known:
+            return 0
+        if "HNSW" in _describe(self.index):
+            raise ValueError(f"{self.index_path} : un index HNSW ne permet pas la suppression, "
+                             "reconstruire (build_faiss_index.py --full) ou choisir une autre spec")
+        fids = np.array([self.records[c]["faiss_id"] for c in known], dtype="int64")
+        removed = self.index.remove_ids(fids)
+        for c in known:
+            del self.records[c]
+        return int(removed)
+
+    def replace(self, chunks: Sequence[Dict[str, Any]], vectors: np.ndarray) -> None:
+        """
+        Ajoute ou remplace (chunk modifié : même id, nouveau vecteur et métadonnées).
+        """
+        self.remove(c["id"] for c in chunks)
+        self.add(chunks, vectors)
+
+    def save(self) -> None:
+        """
+        Index puis métadonnées, chacun écrit dans un fichier temporaire puis renommé :
+        un lecteur voit toujours un fichier complet, jamais un index à moitié écrit.
+        """
+        m = self.meta
+        # méta du builder conservée (modèle, dims...) ; le rapport ANN du build ne vaut plus
+        extra = {k: v for k, v in m.items() if k not in _SAVE_ARGS}
+        extra["id_map"] = True
+        save_index(self.index, self.index_path, spec=m.get("spec", "flat"), factory=m.get("factory", "Flat"),
+                   metric=m.get("metric", "l2"), nprobe=m.get("nprobe", ANN_NPROBE),
+                   ef_search=m.get("efSearch", ANN_EF_SEARCH), **extra)
+
+        tmp = self.metadata_path.with_name(self.metadata_path.name + ".tmp")
+        tmp.write_text(json.dumps(list(self.records.values()), ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.metadata_path)
+
+
+def is_id_mapped(index_path: Path = FAISS_INDEX_PATH) -> bool:
+    return bool(load_meta(index_path).get("id_map"))
@@ -0,0 +1,138 @@
+# src/chunk_manifest.py
+"""
+Manifest de changements entre deux builds de chunks (ids stables + content_hash).
+
+    {
+      "build_id": "...",            # empreinte du nouveau build
+      "created_at": "...",
+      "added":   [chunk_id, ...],   # nouvelles sections
+      "removed": [chunk_id, ...],   # sections disparues
+      "changed": [chunk_id, ...],   # même id, texte modifié
+      "unchanged": 1234
+    }
+
+Chaque étape aval (embeddings, entités, relations, graphe, communautés) ne retraite
+que `added + changed` et purge `removed + changed` de ses sorties.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set
+
+from chunks_io import content_hash, iter_chunks
+from config_cgi import MANIFEST_PATH
+
+
+def chunk_hashes(chunks: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    id -> content_hash (calculé si absent, ex: anciens fichiers).
+    """
+    return {
+        str(c["id"]): c.get("content_hash") or content_hash(c.get("text") or "")
+        for c in chunks
+    }
+
+
+def build_manifest(old: Dict[str, str], new: Dict[str, str]) -> Dict[str, Any]:
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    changed = sorted(cid for cid in set(new) & set(old) if new[cid] != old[cid])
+
+    h = hashlib.sha256()
+    for cid in sorted(new):
+        h.update(f"{cid}={new[cid]};".encode("utf-8"))
+
+    return {
+        "build_id": h.hexdigest()[:16],
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "unchanged": len(new) - len(added) - len(changed),
+    }
+
+
+def save_manifest(manifest: Dict[str, Any], path: Path = MANIFEST_PATH) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> Optional[Dict[str, Any]]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def dirty_ids(manifest: Dict[str, Any]) -> Set[str]:
+    """
+    Chunks à (re)traiter.
+    """
+    return set(manifest.get("added", [])) | set(manifest.get("changed", []))
+
+
+def stale_ids(manifest: Dict[str, Any]) -> Set[str]:
+    """
+    Chunks dont les sorties existantes sont obsolètes.
+    """
+    return set(manifest.get("removed", [])) | set(manifest.get("changed", []))
+
+
+def apply_manifest_to_jsonl(path: Path, key: str = "chunk_id",
+                            manifest: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Purge d'une sortie JSONL d'étape (entities.jsonl, relations.jsonl...) les lignes
+    des chunks supprimés / modifiés. La reprise habituelle (ids déjà traités) refait
+    ensuite uniquement ces chunks.
+
+    Appliqué une seule fois par build (marqueur `<path>.manifest`), donc relançable.
+    Retourne le nombre de lignes supprimées.
+    """
+    manifest = manifest if manifest is not None else load_manifest()
+    path = Path(path)
+    if not manifest or not path.exists():
+        return 0
+
+    marker = path.with_name(path.name + ".manifest")
+    if marker.exists() and marker.read_text(encoding="utf-8").strip() == manifest["build_id"]:
+        return 0
+
+    stale = stale_ids(manifest)
+    removed = 0
+    tmp = path.with_name(path.name + ".tmp")
+    with path.open("r", encoding="utf-8") as src, tmp.open("w", encoding="utf-8") as dst:
+        for line in src:
+            try:
+                obj = json.loads(line)
+            except Exception:
+                continue
+            if str(obj.get(key)) in stale:
+                removed += 1
+                continue
+            dst.write(line)
+    os.replace(tmp, path)
+    marker.write_text(manifest["build_id"], encoding="utf-8")
+    return removed
+
+
+def print_manifest(manifest: Dict[str, Any]) -> None:
+    print(
+        f"🧾 Manifest {manifest['build_id']} : "
+        f"+{len(manifest['added'])} ajoutés, "
+        f"~{len(manifest['changed'])} modifiés, "
+        f"-{len(manifest['removed'])} supprimés, "
+        f"={manifest['unchanged']} inchangés"
+    )
+
+
+def manifest_from_files(old_path: Path, new_path: Path) -> Dict[str, Any]:
+    """
+    Manifest entre deux fichiers de chunks existants.
+    """
+    old = chunk_hashes(iter_chunks(old_path)) if Path(old_path).exists() else {}
+    return build_manifest(old, chunk_hashes(iter_chunks(new_path)))
@@ -0,0 +1,354 @@
+# src/chunk_store.py
+"""
+Store de chunks compact sur disque, ouvert en mmap (remplace la liste CHUNKS en RAM).
+
+Un seul fichier :
+
+    [magic 8o][taille en-tête u32][en-tête JSON]
+    records : (bloc u32, meta_off u32, meta_len u32, text_off u32, text_len u32) par chunk
+    blocks  : (offset u64, taille u64) par bloc dans le blob
+    ids     : ids des chunks en largeur fixe (S<n>), dans l'ordre des lignes FAISS
+    table   : table de hachage (adressage ouvert, int32) id -> ligne
+    blob    : blocs de ~16 Ko (métadonnées JSON + texte), compressés zstd si dispo
+
+- accès O(1) par ligne (aligné sur l'index FAISS) ou par id ;
+- seuls les blocs touchés sont lus / décompressés (petit cache LRU) ;
+- le texte n'est matérialisé qu'à la lecture de record["text"].
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # compression optionnelle
+    zstandard = None
+
+from chunks_io import default_chunks_path, iter_chunks
+from config_cgi import CHUNK_STORE_PATH
+
+MAGIC = b"CGICHNK1"
+BLOCK_BYTES = 16 * 1024
+BLOCK_CACHE_SIZE = 16
+
+_RECORD_DTYPE = np.dtype([
+    ("block", "<u4"),
+    ("meta_off", "<u4"),
+    ("meta_len", "<u4"),
+    ("text_off", "<u4"),
+    ("text_len", "<u4"),
+])
+_BLOCK_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u8")])
+
+
+def _id_hash(chunk_id: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(chunk_id, digest_size=8).digest(), "little")
+
+
+def _align(f, n: int = 8) -> None:
+    pad = (-f.tell()) % n
+    if pad:
+        f.write(b"\0" * pad)
+
+
+# =========================
+# 1) Construction
+# =========================
+
+def build_chunk_store(
+    chunks: Iterable[Dict[str, Any]],
+    out_path: Path = CHUNK_STORE_PATH,
+    compress: bool = True,
+    block_bytes: int = BLOCK_BYTES,
+) -> int:
+    """
+    Écrit le store à partir d'un flux de chunks (l'ordre est conservé : ligne i = chunk i).
+    Retourne le nombre de chunks.
+    """
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    compression = "zstd" if compress and zstandard is not None else "none"
+    cctx = zstandard.ZstdCompressor(level=9) if compression == "zstd" else None
+
+    records = []
+    blocks = []
+    ids = []
+    blob_path = out_path.with_name(out_path.name + ".blob.tmp")
+
+    with blob_path.open("wb") as blob:
+        buf = bytearray()
+
+        def flush():
+            if not buf:
+                return
+            data = cctx.compress(bytes(buf)) if cctx else bytes(buf)
+            blocks.append((blob.tell(), len(data)))
+            blob.write(data)
+            buf.clear()
+
+        for c in chunks:
+            text = (c.get("text") or "").encode("utf-8")
+            meta = json.dumps({k: v for k, v in c.items() if k != "text"},
+                              ensure_ascii=False).encode("utf-8")
+            if buf and len(buf) + len(meta) + len(text) > block_bytes:
+                flush()
+            meta_off = len(buf)
+            buf += meta
+            text_off = len(buf)
+            buf += text
+            records.append((len(blocks), meta_off, len(meta), text_off, len(text)))
+            ids.append(str(c["id"]).encode("utf-8"))
+        flush()
+
+    n = len(records)
+    id_width = max((len(i) for i in ids), default=1)
+    ids_arr = np.array(ids, dtype=f"S{id_width}")
+
+    # table de hachage : taille puissance de 2 >= 2n, sondage linéaire
+    size = 1
+    while size < 2 * max(n, 1):
+        size *= 2
+    table = np.full(size, -1, dtype="<i4")
+    mask = size - 1
+    for row, cid in enumerate(ids):
+        slot = _id_hash(cid) & mask
+        while table[slot] != -1:
+            if ids[table[slot]] == cid:
+                raise ValueError(f"id de chunk en double : {cid.decode('utf-8')}")
+            slot = (slot + 1) & mask
+        table[slot] = row
+
+    sections = {}
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with tmp_path.open("wb") as f:
+        header = {"version": 1, "n": n, "compression": compression, "id_width": id_width}
+        # en-tête de taille fixe réservée, réécrit à la fin avec les offsets des sections
+        f.write(MAGIC + struct.pack("<I", 4096) + b"\0" * 4096)
+        for name, arr in (
+            ("records", np.array(records, dtype=_RECORD_DTYPE)),
+            ("blocks", np.array(blocks, dtype=_BLOCK_DTYPE)),
+            ("ids", ids_arr),
+            ("table", table),
+        ):
+            _align(f)
+            sections[name] = [f.tell(), len(arr)]
+            f.write(arr.tobytes())
+
+        _align(f)
+        sections["blob"] = [f.tell(), blob_path.stat().st_size]
+        with blob_path.open("rb") as blob:
+            while True:
+                data = blob.read(1 << 20)
+                if not data:
+                    break
+                f.write(data)
+
+        header["sections"] = sections
+        raw = json.dumps(header).encode("utf-8")
+        if len(raw) > 4096:
+            raise ValueError("en-tête du store trop grand")
+        f.seek(len(MAGIC) + 4)
+        f.write(raw)
+
+    blob_path.unlink()
+    os.replace(tmp_path, out_path)
+    return n
+
+
+# =========================
+# 2) Lecture
+# =========================
+
+class ChunkRecord(Mapping):
+    """
+    Chunk paresseux : se lit comme un dict (get, [], dict(record)...) mais ne décode
+    les métadonnées / le texte qu'au premier accès.
+    """
+    __slots__ = ("_store", "_row", "_meta", "_text")
+
+    def __init__(self, store: "ChunkStore", row: int):
+        self._store = store
+        self._row = row
+        self._meta = None
+        self._text = None
+
+    def _load_meta(self) -> Dict[str, Any]:
+        if self._meta is None:
+            self._meta = self._store.meta(self._row)
+        return self._meta
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "text":
+            if self._text is None:
+                self._text = self._store.text(self._row)
+            return self._text
+        return self._load_meta()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._load_meta()
+        yield "text"
+
+    def __len__(self) -> int:
+        return len(self._load_meta()) + 1
+
+    def __repr__(self) -> str:
+        return f"ChunkRecord(row={self._row}, id={self._store.id_at(self._row)!r})"
+
+
+class ChunkStore:
+    """
+    Lecture du store en mmap. Même interface que la liste CHUNKS (store[i], len, iter)
+    et que CHUNKS_BY_ID (store.get(chunk_id)).
+    """
+
+    def __init__(self, path: Path = CHUNK_STORE_PATH):
+        self.path = Path(path)
+        self._file = self.path.open("rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"Fichier de store invalide : {self.path}")
+        (hlen,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        raw = self._mm[len(MAGIC) + 4 : len(MAGIC) + 4 + hlen].rstrip(b"\0")
+        self.header = json.loads(raw)
+
+        s = self.header["sections"]
+        self._n = self.header["n"]
+        self._records = np.frombuffer(self._mm, _RECORD_DTYPE, s["records"][1], s["records"][0])
+        self._blocks = np.frombuffer(self._mm, _BLOCK_DTYPE, s["blocks"][1], s["blocks"][0])
+        self._ids = np.frombuffer(self._mm, f"S{self.header['id_width']}", s["ids"][1], s["ids"][0])
+        self._table = np.frombuffer(self._mm, "<i4", s["table"][1], s["table"][0])
+        self._blob_off = s["blob"][0]
+
+        self._dctx = None
+        if self.header["compression"] == "zstd":
+            if zstandard is None:
+                raise ImportError("Store compressé en zstd : installer 'zstandard'.")
+            self._dctx = zstandard.ZstdDecompressor()
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+
+    # --- accès bas niveau ---
+
+    def _block(self, b: int) -> memoryview | bytes:
+        off, size = self._blocks[b]
+        start = self._blob_off + int(off)
+        if self._dctx is None:
+            return memoryview(self._mm)[start : start + int(size)]
+
+        data = self._cache.get(b)
+        if data is None:
+            data = self._dctx.decompress(self._mm[start : start + int(size)])
+            self._cache[b] = data
+            if len(self._cache) > BLOCK_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(b)
+        return data
+
+    def meta(self, row: int) -> Dict[str, Any]:
+        r = self._records[row]
+        data = self._block(int(r["block"]))
+        return json.loads(bytes(data[int(r["meta_off"]) : int(r["meta_off"]) + int(r["meta_len"])]))
+
+    def text(self, row: int) -> str:
+        r = self._records[row]
+        data = self._block(int(r["block"]))
+        return bytes(data[int(r["text_off"]) : int(r["text_off"]) + int(r["text_len"])]).decode("utf-8")
+
+    def id_at(self, row: int) -> str:
+        return self._ids[row].decode("utf-8")
+
+    def row_of(self, chunk_id: Any) -> Optional[int]:
+        """
+        Ligne d'un chunk à partir de son id (O(1) : table de hachage en mmap).
+        """
+        key = str(chunk_id).encode("utf-8")
+        mask = len(self._table) - 1
+        slot = _id_hash(key) & mask
+        while True:
+            row = int(self._table[slot])
+            if row < 0:
+                return None
+            if self._ids[row] == key:
+                return row
+            slot = (slot + 1) & mask
+
+    # --- interface "liste / dict de chunks" ---
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, row: int) -> ChunkRecord:
+        row = int(row)
+        if row < 0:
+            row += self._n
+        if not 0 <= row < self._n:
+            raise IndexError(row)
+        return ChunkRecord(self, row)
+
+    def __iter__(self) -> Iterator[ChunkRecord]:
+        for row in range(self._n):
+            yield ChunkRecord(self, row)
+
+    def get(self, chunk_id: Any, default: Any = None) -> Any:
+        row = self.row_of(chunk_id)
+        return default if row is None else ChunkRecord(self, row)
+
+    def close(self) -> None:
+        self._records = self._blocks = self._ids = self._table = None
+        self._cache.clear()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_stale(store_path: Path, chunks_path: Path) -> bool:
+    """
+    True si le fichier de chunks est plus récent que le store (store à reconstruire).
+    """
+    store_path, chunks_path = Path(store_path), Path(chunks_path)
+    return not store_path.exists() or (
+        chunks_path.exists() and chunks_path.stat().st_mtime > store_path.stat().st_mtime
+    )
+
+
+# =========================
+# 3) CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunks (JSONL / JSON) → store compact mmap")
+    parser.add_argument("--chunks", type=str, default=None,
+                        help="Fichier de chunks (défaut : chunks.jsonl, sinon l'ancien JSON)")
+    parser.add_argument("--output", type=str, default=str(CHUNK_STORE_PATH),
+                        help="Fichier store de sortie")
+    parser.add_argument("--no-compress", action="store_true",
+                        help="Blocs non compressés (lecture la plus rapide)")
+    args = parser.parse_args()
+
+    chunks_path = Path(args.chunks) if args.chunks else default_chunks_path()
+    out_path = Path(args.output)
+    n = build_chunk_store(iter_chunks(chunks_path), out_path, compress=not args.no_compress)
+
+    with ChunkStore(out_path) as store:
+        print(f"✅ {n} chunks → {out_path} "
+              f"({out_path.stat().st_size / 1e6:.2f} Mo, compression={store.header['compression']}, "
+              f"{len(store._blocks)} blocs)")
+
+
+if __name__ == "__main__":
+    main()
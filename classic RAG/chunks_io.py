@@ -0,0 +1,95 @@
+# src/chunks_io.py
+"""
+Lecture / écriture des chunks en flux.
+
+Format principal : JSONL (un chunk par ligne), lu ligne à ligne pour garder une
+mémoire bornée quelle que soit la taille du corpus.
+L'ancien format (un tableau JSON indenté) reste lisible.
+"""
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from config_cgi import CHUNKS_JSONL_PATH, CHUNKS_PATH
+
+
+def default_chunks_path() -> Path:
+    """
+    Fichier de chunks à utiliser : le JSONL du corpus s'il existe, sinon l'ancien JSON.
+    """
+    return CHUNKS_JSONL_PATH if Path(CHUNKS_JSONL_PATH).exists() else Path(CHUNKS_PATH)
+
+
+def source_family(source_id: str) -> str:
+    """
+    'cgi-2025' -> 'cgi' : l'édition (année) ne fait pas partie de l'identité d'une section,
+    pour qu'un même article garde le même id d'une année sur l'autre.
+    """
+    return re.sub(r"[-_]?\d{4}$", "", source_id or "") or (source_id or "")
+
+
+def _norm_title(title: str) -> str:
+    t = (title or "").casefold()
+    t = re.sub(r"\s*\d+\s*$", "", t)     # renvois de notes de bas de page ("...PERMANENTES17")
+    t = re.sub(r"[\s\.\-–'’:]+", " ", t)
+    return t.strip()
+
+
+def chunk_key_base(source_id: str, article: Optional[str], title: str) -> str:
+    """
+    Clé structurelle d'une section (sans le rang d'occurrence) : famille du document,
+    article englobant et titre normalisé. L'édition n'y entre jamais : l'édition
+    suivante garde les mêmes ids, et un corpus ne contient qu'une édition par famille
+    (voir build_chunks_from_markdown.iter_corpus_chunks).
+    """
+    return f"{source_family(source_id)}|{article or ''}|{_norm_title(title)}"
+
+
+def make_chunk_id(key_base: str, occurrence: int) -> str:
+    """
+    Id stable dérivé du contenu structurel (et non de la position dans le fichier) :
+    insérer un article ne renumérote pas les suivants.
+    `occurrence` = rang de la section parmi celles qui ont la même clé.
+    """
+    h = hashlib.sha1(f"{key_base}#{occurrence}".encode("utf-8")).hexdigest()[:12]
+    return f"c_{h}"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def iter_chunks(path: Path | None = None) -> Iterator[Dict[str, Any]]:
+    """
+    Itère sur les chunks d'un fichier .jsonl (en flux) ou .json (tableau, chargé en entier).
+    """
+    path = Path(path or default_chunks_path())
+    if not path.exists():
+        raise FileNotFoundError(f"Fichier de chunks introuvable : {path}")
+
+    if path.suffix == ".jsonl":
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+
+    with path.open("r", encoding="utf-8") as f:
+        yield from json.load(f)
+
+
+def append_jsonl(path: Path, items: Iterable[Dict[str, Any]]) -> int:
+    """
+    Ajoute des objets en fin de fichier JSONL (un par ligne). Retourne le nombre écrit.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with path.open("a", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            n += 1
+    return n
@@ -12,8 +12,24 @@ JSON_DIR = DATA_DIR / "json"
 INDEX_DIR = DATA_DIR / "index"
 
 # Fichiers utilisés par le RAG
-CHUNKS_PATH = JSON_DIR / "cgi-2025_chunks.json"
+CHUNKS_PATH = JSON_DIR / "cgi-2025_chunks.json"          # ancien format (tableau JSON)
+CHUNKS_JSONL_PATH = JSON_DIR / "chunks.jsonl"            # corpus multi-documents (JSONL)
+MANIFEST_PATH = JSON_DIR / "chunks_manifest.json"        # changements depuis le build précédent
+CHUNK_STORE_PATH = JSON_DIR / "chunks.store"             # store compact mmap (lu par le retriever)
 FAISS_INDEX_PATH = INDEX_DIR / "cgi-2025_faiss.index"
+CHUNK_METADATA_PATH = INDEX_DIR / "cgi-2025_metadata.json"  # métadonnées des vecteurs (id, hash, faiss_id)
+# Éditions successives du CGI (versioned_index.py) : une ligne par version d'un chunk,
+# avec son intervalle de validité ; seuls les chunks modifiés d'une édition sont embeddés.
+VERSIONED_INDEX_PATH = INDEX_DIR / "cgi_versions.index"
+VERSIONED_CHUNKS_PATH = INDEX_DIR / "cgi_versions.jsonl"
+
+# Index des passages (small-to-big) : fenêtres bornées en tokens → chunk parent
+PASSAGES_PATH = INDEX_DIR / "cgi-2025_passages.jsonl"
+PASSAGE_INDEX_PATH = INDEX_DIR / "cgi-2025_passages.index"
+
+# Faits chiffrés (taux / seuils / délais) extraits des chunks : consultation directe sans LLM
+FACTS_DB_PATH = INDEX_DIR / "cgi-2025_facts.sqlite"
+USE_FACT_LOOKUP = True
 
 # Fichier .env à la racine
 ENV_PATH = PROJECT_ROOT / ".env"
@@ -22,7 +38,108 @@ ENV_PATH = PROJECT_ROOT / ".env"
 OPENAI_EMBED_MODEL = "text-embedding-3-small"
 OPENAI_CHAT_MODEL = "gpt-4.1-mini"   # 
 
+# Limites embeddings (OpenAI : 8192 tokens par entrée, 300k tokens par requête)
+EMBED_MAX_INPUT_TOKENS = 8191
+EMBED_MAX_TOKENS_PER_REQUEST = 250_000
+
+# Passages
+PASSAGE_MAX_TOKENS = 256       # taille max d'un passage
+PASSAGE_OVERLAP_TOKENS = 48    # recouvrement entre passages consécutifs
+USE_PASSAGES = True            # recherche sur les passages si l'index existe
+PASSAGE_WINDOW_ONLY = False    # True : on renvoie la fenêtre du passage au lieu de la section
+
 # Paramètres de recherche
 FAISS_K = 20    # nombre de voisins récupérés dans FAISS
+RERANK_BATCH_SIZE = 128  # paires (question, candidat) par lot du cross-encoder
 TOP_K = 3       # nombre de chunks envoyés au LLM
 SOURCE_NAME = "CGI 2025"
+
+# Arbre de résumés hiérarchiques (Livre / Titre / Chapitre / Section / Article)
+SUMMARY_TREE_PATH = INDEX_DIR / "cgi-2025_summary_tree.json"
+SUMMARY_TREE_INDEX_PATH = INDEX_DIR / "cgi-2025_summary_tree.index"
+SUMMARY_MAX_TOKENS = 200       # taille max d'un résumé de nœud
+SUMMARY_INPUT_TOKENS = 6000    # budget d'entrée par appel de résumé
+SUMMARY_WORKERS = 8            # appels de résumé en parallèle (nœuds d'une même profondeur)
+USE_SUMMARY_TREE = True        # questions larges servies par les nœuds de l'arbre
+TREE_TOP_K = 4                 # nombre de nœuds envoyés au LLM
+
+# Renvois entre articles (extraits sans LLM) : chunks des articles cités ajoutés au contexte
+ARTICLE_REFS_PATH = INDEX_DIR / "cgi-2025_article_refs.json"
+USE_ARTICLE_REFS = True
+REF_EXPAND_K = 2               # nombre max de chunks d'articles cités ajoutés
+
+# Cache d'embeddings partagé (SQLite + LRU mémoire), clé = (modèle, dimensions, sha256 du texte)
+EMBED_CACHE_PATH = INDEX_DIR / "embeddings_cache.sqlite"
+EMBED_CACHE_MAX_MB = 1024      # taille max sur disque (éviction LRU au-delà)
+EMBED_CACHE_LRU_SIZE = 4096    # vecteurs gardés en mémoire dans le processus
+USE_EMBED_CACHE = True
+
+# Builds d'index : requêtes embeddings en parallèle (batches packés sur les tokens)
+EMBED_CONCURRENCY = 4          # requêtes en vol
+EMBED_MAX_RETRIES = 5          # retry avec backoff exponentiel (rate limit, erreurs réseau)
+
+# Type d'index FAISS (chunks / passages) : flat (exact) | sqfp16 | sq8 | ivf | ivfsq8 | ivfpq | hnsw | opq
+# ou chaîne index_factory ; paramètres de recherche enregistrés dans <index>.meta.json
+ANN_INDEX_SPEC = "flat"
+ANN_TRAIN_SAMPLE = 50_000      # vecteurs tirés pour l'entraînement (IVF / PQ / OPQ)
+ANN_NPROBE = 16                # listes IVF visitées par requête
+ANN_EF_SEARCH = 64             # largeur de recherche HNSW
+ANN_REPORT_QUERIES = 200       # requêtes du rapport recall / latence vs Flat
+ANN_MMAP = True                # index ouverts en mmap (page cache partagé entre processus)
+
+# Recherche en deux temps sur les chunks : scan Hamming (1 bit / dimension) puis
+# rescoring float32 (mmap) des BINARY_RESCORE_K meilleurs candidats
+BINARY_INDEX_PATH = INDEX_DIR / "cgi-2025_binary.index"
+BINARY_VECTORS_PATH = INDEX_DIR / "cgi-2025_vectors.npy"
+USE_BINARY_SEARCH = False      # True : search_chunks passe par l'index binaire s'il existe
+BINARY_RESCORE_K = 200         # profondeur de rescoring (candidats Hamming rescorés en float)
+
+# Dimension des embeddings (text-embedding-3-* : vecteurs tronqués et renormalisés par l'API)
+# None : dimension native (1536) ; 256 / 512 / 1024 : index plus petits et plus rapides.
+# La valeur utilisée au build est enregistrée dans <index>.meta.json et imposée aux requêtes.
+EMBED_DIMENSIONS = None
+
+# Recherche hybride : BM25 (lexical, en mémoire) fusionné aux candidats FAISS par
+# reciprocal rank fusion, avant le rerank. Les questions qui nomment un article
+# connu ("que prévoit l'article 247 ?") sont servies directement par le
+# dictionnaire article → chunks, sans embedding ni rerank.
+USE_HYBRID = True
+USE_ARTICLE_FAST_PATH = True
+BM25_TOP_K = 50                # candidats BM25 fusionnés avec ceux de FAISS
+RRF_K = 60                     # constante de la fusion RRF : 1 / (RRF_K + rang)
+
+# Cross-encoder (rerank). Bundle local dans data/models (rerank_onnx.py export) :
+# ONNX quantifié int8 + tokenizer, et le modèle PyTorch d'origine pour le repli.
+# "auto" : ONNX si le bundle et onnxruntime sont là, sinon sentence-transformers.
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+MODELS_DIR = DATA_DIR / "models"
+RERANK_ONNX_DIR = MODELS_DIR / "ms-marco-MiniLM-L-6-v2-onnx-int8"
+RERANK_TORCH_DIR = MODELS_DIR / "ms-marco-MiniLM-L-6-v2"
+RERANK_BACKEND = "auto"        # "auto" | "onnx" | "torch"
+RERANK_THREADS = None          # threads intra-op onnxruntime (None : tous les cœurs)
+RERANK_MAX_LENGTH = 512        # tokens (question + candidat), troncature "longest_first"
+
+# Rerank en cascade (rerank_cascade.py) : pas de rerank si l'écart FAISS rang 1 / rang k
+# est décisif, sinon rerank des RERANK_CASCADE_FIRST premiers, étendu aux suivants
+# seulement si leurs scores sont plats. Seuils calibrés dans RERANK_CASCADE_PATH.
+USE_RERANK_CASCADE = True
+RERANK_CASCADE_FIRST = 8
+RERANK_CASCADE_PATH = INDEX_DIR / "rerank_cascade.json"
+RERANK_CASCADE_LOG_EVERY = 100  # résumé des chemins dans les logs toutes les N questions
+
+# Diversification MMR (mmr.py) après le rerank : parmi les MMR_FETCH_K premiers candidats,
+# sélection gloutonne pertinence / redondance (vecteurs relus dans l'index, sans
+# embedding supplémentaire). Évite d'envoyer au LLM deux sections quasi identiques :
+# activée, le moteur envoie MMR_TOP_K chunks au lieu de TOP_K (prompt plus court).
+# Désactivée par défaut (opt-in) : MMR_LAMBDA et MMR_TOP_K ne sont pas encore calibrés
+# sur les vrais embeddings ; activer quand `python mmr.py` montre, sur all_questions.csv,
+# autant d'articles distincts avec MMR_TOP_K chunks qu'avec TOP_K sans MMR.
+USE_MMR = False
+MMR_LAMBDA = 0.5               # 1 : pertinence seule, 0 : diversité seule
+MMR_FETCH_K = 10
+MMR_TOP_K = 2                  # chunks envoyés au LLM quand USE_MMR
+
+# Index répartis par corpus / version (shard_manager.py) : un dossier par shard dans
+# SHARDS_DIR (shard.json + index FAISS + chunks), interrogés en parallèle.
+SHARDS_DIR = INDEX_DIR / "shards"
+SHARD_WORKERS = 4              # threads de recherche (FAISS relâche le GIL)
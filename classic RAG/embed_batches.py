@@ -0,0 +1,152 @@
+# src/embed_batches.py
+"""
+Embedding en masse pour les builds d'index :
+  - batches packés sur le nombre de tokens (tiktoken) jusqu'à la limite par requête ;
+  - plusieurs requêtes en vol (EMBED_CONCURRENCY), avec retry + backoff exponentiel ;
+  - réponses demandées en base64 et décodées directement en float32 (pas de listes
+    de floats Python), écrites dans un array préalloué ou ajoutées à l'index FAISS ;
+  - débit affiché en tokens/s.
+
+Les résultats sont consommés dans l'ordre des batches : la mémoire reste bornée
+à EMBED_CONCURRENCY batches et l'ordre des lignes FAISS est conservé.
+"""
+import base64
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from config_cgi import EMBED_CONCURRENCY, EMBED_MAX_RETRIES, EMBED_MAX_TOKENS_PER_REQUEST
+from passages import count_tokens, pack_by_tokens
+
+
+# =========================
+# 1) Requête unitaire
+# =========================
+
+def embed_request(client, model: str, texts: List[str], dims: Optional[int] = None,
+                  max_retries: int = EMBED_MAX_RETRIES, sleep_base: float = 1.0) -> np.ndarray:
+    """
+    Un appel embeddings (retry avec backoff exponentiel + jitter sur erreur / rate limit).
+    Retourne un array [n, d] float32 décodé depuis le base64 de la réponse.
+    """
+    kwargs = {"model": model, "input": texts, "encoding_format": "base64"}
+    if dims:
+        kwargs["dimensions"] = dims
+
+    attempt = 0
+    while True:
+        try:
+            resp = client.embeddings.create(**kwargs)
+            break
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            wait = sleep_base * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+            print(f"[embed] erreur : {e} -> retry {attempt}/{max_retries} dans {wait:.1f}s")
+            time.sleep(wait)
+
+    data = sorted(resp.data, key=lambda d: d.index)
+    first = _decode(data[0].embedding)
+    out = np.empty((len(data), first.shape[0]), dtype="float32")
+    out[0] = first
+    for i, d in enumerate(data[1:], start=1):
+        out[i] = _decode(d.embedding)
+    return out
+
+
+def _decode(embedding: Any) -> np.ndarray:
+    if isinstance(embedding, str):
+        return np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+    return np.asarray(embedding, dtype="float32")  # serveur qui ignore encoding_format
+
+
+# =========================
+# 2) Requêtes en vol, consommées dans l'ordre
+# =========================
+
+class Throughput:
+    """
+    Compteur tokens / textes / secondes d'un build.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.tokens = 0
+        self.texts = 0
+        self.batches = 0
+        self.t0 = time.perf_counter()
+
+    def add(self, n_texts: int, n_tokens: int) -> None:
+        self.texts += n_texts
+        self.tokens += n_tokens
+        self.batches += 1
+
+    def report(self) -> str:
+        dt = max(time.perf_counter() - self.t0, 1e-9)
+        return (f"{self.label} : {self.texts} textes, {self.tokens} tokens, {self.batches} requêtes "
+                f"en {dt:.1f} s → {self.tokens / dt:,.0f} tokens/s")
+
+
+def run_in_flight(
+    batches: Iterable[Any],
+    work: Callable[[Any], Any],
+    consume: Callable[[Any, Any], None],
+    max_in_flight: int = EMBED_CONCURRENCY,
+) -> None:
+    """
+    Exécute `work(batch)` avec au plus `max_in_flight` batches en cours, et appelle
+    `consume(batch, résultat)` dans l'ordre des batches (dès que le plus ancien est prêt).
+    """
+    max_in_flight = max(1, max_in_flight)
+    pending: deque = deque()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for batch in batches:
+            if len(pending) >= max_in_flight:
+                b, fut = pending.popleft()
+                consume(b, fut.result())
+            pending.append((batch, pool.submit(work, batch)))
+        while pending:
+            b, fut = pending.popleft()
+            consume(b, fut.result())
+
+
+# =========================
+# 3) Textes → array préalloué
+# =========================
+
+def embed_to_array(
+    texts: Sequence[str],
+    embed_fn: Callable[[List[str]], np.ndarray],
+    n_tokens: Optional[Sequence[int]] = None,
+    max_tokens: int = EMBED_MAX_TOKENS_PER_REQUEST,
+    max_in_flight: int = EMBED_CONCURRENCY,
+    label: str = "embeddings",
+) -> np.ndarray:
+    """
+    Embeddings [n, d] de `texts`, batches packés sur les tokens et envoyés en parallèle.
+    Chaque réponse est copiée à sa place dans l'array (alloué à la première réponse).
+    """
+    if n_tokens is None:
+        n_tokens = [count_tokens(t) for t in texts]
+    out: Optional[np.ndarray] = None
+    stats = Throughput(label)
+
+    def _work(batch):
+        return embed_fn([texts[i] for i in batch])
+
+    def _consume(batch, vecs):
+        nonlocal out
+        if out is None:
+            out = np.empty((len(texts), vecs.shape[1]), dtype="float32")
+        out[batch[0]:batch[-1] + 1] = vecs
+        stats.add(len(batch), sum(n_tokens[i] for i in batch))
+
+    run_in_flight(pack_by_tokens(range(len(texts)), lambda i: n_tokens[i], max_tokens),
+                  _work, _consume, max_in_flight)
+    print(f"⚡ {stats.report()}")
+    return out if out is not None else np.zeros((0, 0), dtype="float32")
@@ -0,0 +1,271 @@
+# src/embedding_cache.py
+"""
+Cache d'embeddings persistant, adressé par contenu, partagé par tous les embedders
+(index FAISS des chunks / passages, retriever, index et retriever des communautés).
+
+    clé   = sha256(modèle | dimensions | texte normalisé)
+    tiers = LRU en mémoire (processus)  →  SQLite sur disque (EMBED_CACHE_PATH)
+
+- un texte déjà embeddé (même modèle, mêmes dimensions) n'est jamais renvoyé à l'API :
+  rebuild d'un index après une petite modification, question répétée... ;
+- taille disque bornée (EMBED_CACHE_MAX_MB) : éviction des entrées les moins
+  récemment utilisées ;
+- compteurs hits (mémoire / disque) / misses par processus (`get_cache().stats()`,
+  affichés en fin de build) ; `python embedding_cache.py stats|clear` pour le fichier.
+
+Utilisation : `embed_cached(texts, embed_fn, model)` où `embed_fn(textes manquants)`
+retourne un array [n, d] (l'appel API réel).
+"""
+import argparse
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config_cgi import EMBED_CACHE_LRU_SIZE, EMBED_CACHE_MAX_MB, EMBED_CACHE_PATH, USE_EMBED_CACHE
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key       BLOB PRIMARY KEY,
+    model     TEXT NOT NULL,
+    dims      INTEGER NOT NULL,
+    vec       BLOB NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """
+    Forme normalisée utilisée pour la clé (NFC, espaces compactés).
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def cache_key(text: str, model: str, dims: Optional[int] = None) -> bytes:
+    raw = f"{model}|{dims or 0}|{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Cache à deux niveaux (LRU mémoire + SQLite). Utilisable depuis plusieurs threads.
+    """
+
+    def __init__(self, path: Path = EMBED_CACHE_PATH, max_mb: float = EMBED_CACHE_MAX_MB,
+                 lru_size: int = EMBED_CACHE_LRU_SIZE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lru_size = lru_size
+
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._con = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.executescript(_SCHEMA)
+        (self._bytes,) = self._con.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()
+
+        self.hits_mem = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    # --- tier mémoire ---
+
+    def _remember(self, key: bytes, vec: np.ndarray) -> None:
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    # --- lecture / écriture ---
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        out: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            missing: Dict[bytes, List[int]] = {}
+            for i, k in enumerate(keys):
+                vec = self._lru.get(k)
+                if vec is not None:
+                    self._lru.move_to_end(k)
+                    out[i] = vec
+                    self.hits_mem += 1
+                else:
+                    missing.setdefault(k, []).append(i)
+
+            found = set()
+            todo = list(missing)
+            for start in range(0, len(todo), 500):  # limite de variables SQLite
+                part = todo[start:start + 500]
+                rows = self._con.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for k, blob in rows:
+                    vec = np.frombuffer(blob, dtype="float32")
+                    self._remember(k, vec)
+                    for i in missing[k]:
+                        out[i] = vec
+                    self.hits_disk += len(missing[k])
+                    found.add(k)
+            if found:
+                now = time.time()
+                self._con.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                      [(now, k) for k in found])
+                self._con.commit()
+            self.misses += sum(len(missing[k]) for k in missing if k not in found)
+        return out
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray, model: str, dims: Optional[int] = None) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        now = time.time()
+        # une ligne par clé (la dernière gagne, comme INSERT OR REPLACE)
+        rows = list({k: (k, model, dims or 0, v.tobytes(), now) for k, v in zip(keys, vectors)}.values())
+        with self._lock:
+            for k, v in zip(keys, vectors):
+                self._remember(k, v)
+            # taille : seules les clés nouvelles s'ajoutent, une clé remplacée compte la différence
+            replaced = 0
+            for start in range(0, len(rows), 500):  # limite de variables SQLite
+                part = [r[0] for r in rows[start:start + 500]]
+                (n,) = self._con.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchone()
+                replaced += n
+            self._con.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._bytes += sum(len(r[3]) for r in rows) - replaced
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._con.commit()
+
+    def _evict(self) -> None:
+        """
+        Supprime les entrées les moins récemment utilisées jusqu'à 90 % de la taille max.
+        """
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target:
+            rows = self._con.execute(
+                "SELECT key, LENGTH(vec) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            dropped = []
+            for k, n in rows:
+                dropped.append((k,))
+                self._lru.pop(k, None)
+                self._bytes -= n
+                if self._bytes <= target:
+                    break
+            self._con.executemany("DELETE FROM embeddings WHERE key = ?", dropped)
+
+    # --- infos ---
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            (n,) = self._con.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        total = self.hits_mem + self.hits_disk + self.misses
+        return {
+            "entries": n,
+            "size_mb": self._bytes / 1024 / 1024,
+            "hits_mem": self.hits_mem,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": (self.hits_mem + self.hits_disk) / total if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._con.execute("DELETE FROM embeddings")
+            self._con.commit()
+            self._con.execute("VACUUM")
+            self._lru.clear()
+            self._bytes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
+
+
+@lru_cache(maxsize=1)
+def get_cache() -> EmbeddingCache:
+    """
+    Cache partagé du processus (ouvert au premier usage).
+    """
+    return EmbeddingCache()
+
+
+def format_stats(cache: Optional[EmbeddingCache] = None) -> str:
+    s = (cache or get_cache()).stats()
+    return (f"cache embeddings : {s['hits_mem'] + s['hits_disk']} hits "
+            f"({s['hits_mem']} mémoire, {s['hits_disk']} disque), {s['misses']} misses, "
+            f"{s['entries']} entrées / {s['size_mb']:.1f} Mo")
+
+
+def embed_cached(
+    texts: Sequence[str],
+    embed_fn: Callable[[List[str]], np.ndarray],
+    model: str,
+    dims: Optional[int] = None,
+    cache: Optional[EmbeddingCache] = None,
+) -> np.ndarray:
+    """
+    Embeddings [n, d] float32 de `texts` : lus dans le cache si possible, sinon calculés
+    par `embed_fn` (un seul appel pour tous les textes manquants, doublons compris une fois)
+    puis enregistrés.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, dims or 0), dtype="float32")
+    if not USE_EMBED_CACHE and cache is None:
+        return np.asarray(embed_fn(texts), dtype="float32")
+
+    cache = cache or get_cache()
+    keys = [cache_key(t, model, dims) for t in texts]
+    vecs = cache.get_many(keys)
+
+    todo: Dict[bytes, int] = {}
+    for i, v in enumerate(vecs):
+        if v is None and keys[i] not in todo:
+            todo[keys[i]] = i
+    if todo:
+        idx = list(todo.values())
+        fresh = np.asarray(embed_fn([texts[i] for i in idx]), dtype="float32")
+        cache.put_many([keys[i] for i in idx], fresh, model, dims)
+        by_key = {keys[i]: v for i, v in zip(idx, fresh)}
+        vecs = [v if v is not None else by_key[k] for v, k in zip(vecs, keys)]
+
+    return np.vstack(vecs).astype("float32", copy=False)
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache d'embeddings (SQLite + LRU)")
+    parser.add_argument("cmd", choices=["stats", "clear"])
+    args = parser.parse_args()
+
+    cache = get_cache()
+    if args.cmd == "clear":
+        cache.clear()
+        print(f"🧹 Cache vidé : {cache.path}")
+        return
+    s = cache.stats()
+    print(f"📦 {cache.path} : {s['entries']} embeddings, {s['size_mb']:.1f} Mo "
+          f"(max {EMBED_CACHE_MAX_MB} Mo)")
+
+
+if __name__ == "__main__":
+    main()
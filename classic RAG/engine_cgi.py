@@ -8,11 +8,20 @@ from openai import OpenAI
 
 from config_cgi import (
     ENV_PATH,
+    MMR_TOP_K,
     OPENAI_CHAT_MODEL,
+    REF_EXPAND_K,
     SOURCE_NAME,
     TOP_K,
+    TREE_TOP_K,
+    USE_ARTICLE_REFS,
+    USE_FACT_LOOKUP,
+    USE_MMR,
+    USE_SUMMARY_TREE,
 )
-from retriever_faiss import search_chunks
+from rate_tables import lookup as lookup_facts
+from retriever_faiss import expand_references, search_chunks
+from summary_tree import is_broad_question, node_articles, search_tree, tree_available
 
 # Init OpenAI
 load_dotenv(ENV_PATH)
@@ -60,12 +69,17 @@ def _safe_parse_json(text: str) -> Dict[str, Any]:
 def _build_context(question: str):
     """
     Récupère les chunks pertinents et construit le bloc de contexte.
+    Avec la MMR (USE_MMR), les chunks retenus sont diversifiés : MMR_TOP_K suffisent.
     """
-    results = search_chunks(question, k=TOP_K)
+    results = search_chunks(question, k=MMR_TOP_K if USE_MMR else TOP_K, mmr=USE_MMR)
 
     if not results:
         return "", [], []
 
+    # Articles cités par les chunks retrouvés (renvois précalculés, sans recherche)
+    if USE_ARTICLE_REFS:
+        results = results + expand_references(results, k=REF_EXPAND_K)
+
     blocks = []
     articles = []
     chunk_ids = []
@@ -80,8 +94,10 @@ def _build_context(question: str):
         chunk_ids.append(c.get("id"))
 
         # On “tag” chaque chunk avec son id => l'LLM peut citer [Data: Sources (id)]
-        block = (
-            f"source_id: {c.get('id')}\n"
+        block = f"source_id: {c.get('id')}\n"
+        if r.get("cited_by"):
+            block += f"renvoi: article cité par {', '.join(map(str, r['cited_by']))}\n"
+        block += (
             f"article: {article}\n"
             f"titre: {title}\n"
             f"texte:\n{text}"
@@ -92,13 +108,65 @@ def _build_context(question: str):
     return context_str, articles, chunk_ids
 
 
+def _build_tree_context(question: str):
+    """
+    Question large : contexte = résumés de quelques nœuds de l'arbre (titres, chapitres...)
+    au lieu de chunks bruts. Les source_id sont les ids des nœuds ("n_..."), renvoyés
+    à part (`nodes_ids`) : ce ne sont pas des ids de chunks.
+    """
+    results = search_tree(question, k=TREE_TOP_K)
+
+    if not results:
+        return "", [], []
+
+    blocks = []
+    articles = []
+    node_ids = []
+
+    for r in results:
+        n = r["node"]
+        covered = node_articles(n)
+        articles.append({"article": ", ".join(covered), "titre": n["label"]})
+        node_ids.append(n["id"])
+
+        block = (
+            f"source_id: {n['id']}\n"
+            f"niveau: {n['level']}\n"
+            f"titre: {n['label']}\n"
+            f"articles: {', '.join(covered)}\n"
+            f"résumé:\n{n['summary']}"
+        )
+        blocks.append(block)
+
+    context_str = "\n\n---\n\n".join(blocks)
+    return context_str, articles, node_ids
+
+
 # ---------- Moteur principal ----------
 
 def ask_cgi(question: str) -> Dict[str, Any]:
     """
     Pose une question au moteur RAG et renvoie un JSON structuré.
     """
-    context_str, articles, chunk_ids = _build_context(question)
+    # Consultation directe (taux / seuils / délais) : index des faits, sans embedding ni LLM
+    if USE_FACT_LOOKUP:
+        facts = lookup_facts(question)
+        if facts is not None:
+            return {
+                "type_reponse": "reglementaire",
+                "reponse_textuelle": facts["reponse_textuelle"],
+                "articles_cites": facts["articles_cites"],
+                "source_document": SOURCE_NAME,
+                "chunks_ids": facts["chunks_ids"],
+            }
+
+    # Questions larges : résumés hiérarchiques (peu de tokens), sinon chunks
+    node_ids = []
+    if USE_SUMMARY_TREE and tree_available() and is_broad_question(question):
+        context_str, articles, node_ids = _build_tree_context(question)
+        chunk_ids = []
+    else:
+        context_str, articles, chunk_ids = _build_context(question)
 
     # Si aucun contexte pertinent
     if not context_str:
@@ -168,7 +236,7 @@ Retournez un seul objet JSON EXACTEMENT sous cette forme :
     {{"article": "...", "titre": "..."}}
   ],
   "source_document": "{SOURCE_NAME}",
-  "chunks_ids": [1, 2, 3]
+  "chunks_ids": ["c_1a2b3c4d5e6f", "c_7a8b9c0d1e2f"]
 }}
 
 - "reponse_textuelle" : en français, riche, clair, structuré (markdown), et avec citations.
@@ -195,7 +263,11 @@ Retournez un seul objet JSON EXACTEMENT sous cette forme :
     if not payload.get("articles_cites"):
         payload["articles_cites"] = articles
 
-    if not payload.get("chunks_ids"):
+    if node_ids:
+        # le modèle recopie les source_id du contexte : ici des nœuds de l'arbre
+        payload["chunks_ids"] = []
+        payload["nodes_ids"] = node_ids
+    elif not payload.get("chunks_ids"):
         payload["chunks_ids"] = chunk_ids
 
     return payload
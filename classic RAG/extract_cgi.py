@@ -1,7 +1,15 @@
+import argparse
+import hashlib
+import json
 import logging
+import os
 import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import Dict, List, Tuple
 
+import pypdfium2 as pdfium
 from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
 from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
@@ -9,26 +17,28 @@ from docling.document_converter import DocumentConverter, PdfFormatOption
 
 _log = logging.getLogger(__name__)
 
+# Nombre de pages par shard : assez gros pour amortir le démarrage de la
+# pipeline, assez petit pour répartir un gros code sur tous les cœurs.
+PAGES_PER_SHARD = 40
 
-def process_pdfs_to_markdown(source_pdf_dir: Path, output_markdown_dir: Path):
-    """
-    Parcourt un dossier source, convertit tous les PDF en Markdown structuré
-    et les sauvegarde dans un dossier de sortie.
-    Utilise PyPdfium (Docling backend) sans OCR.
-    """
-    if not source_pdf_dir.exists():
-        print(f"❌ ERREUR: Le dossier source '{source_pdf_dir}' est introuvable.")
-        return
+# Cache des conversions (hash fichier / hash pages / markdown des shards)
+CACHE_DIRNAME = ".extract_cache"
+MANIFEST_NAME = "manifest.json"
+
+# Converter par process (initialisé une seule fois dans chaque worker)
+_WORKER_CONVERTER: DocumentConverter | None = None
 
-    output_markdown_dir.mkdir(parents=True, exist_ok=True)
 
-    # ⚙️ Configuration de la pipeline Docling (sans OCR)
+def build_docling_converter() -> DocumentConverter:
+    """
+    Configuration de la pipeline Docling (PyPdfium, sans OCR).
+    """
     pipeline_options = PdfPipelineOptions()
     pipeline_options.do_ocr = False                # Pas d'OCR
     pipeline_options.do_table_structure = True     # Garde structure de tables
     pipeline_options.table_structure_options.do_cell_matching = False
 
-    doc_converter = DocumentConverter(
+    return DocumentConverter(
         format_options={
             InputFormat.PDF: PdfFormatOption(
                 pipeline_options=pipeline_options,
@@ -37,37 +47,268 @@ def process_pdfs_to_markdown(source_pdf_dir: Path, output_markdown_dir: Path):
         }
     )
 
-    pdf_files = list(source_pdf_dir.rglob("*.pdf"))
+
+def _get_worker_converter() -> DocumentConverter:
+    global _WORKER_CONVERTER
+    if _WORKER_CONVERTER is None:
+        _WORKER_CONVERTER = build_docling_converter()
+    return _WORKER_CONVERTER
+
+
+# =========================
+# 1) Empreintes (fichier / pages)
+# =========================
+
+def _file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _page_hashes(pdf_path: Path) -> List[str]:
+    """
+    Empreinte de chaque page : texte extrait + dimensions.
+    Sans OCR, c'est exactement ce dont dépend le markdown produit.
+    """
+    hashes = []
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        for i in range(len(pdf)):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            width, height = page.get_size()
+            h = hashlib.sha256()
+            h.update(f"{width:.2f}x{height:.2f}\n".encode("utf-8"))
+            h.update(textpage.get_text_range().encode("utf-8"))
+            hashes.append(h.hexdigest())
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+    return hashes
+
+
+def shard_ranges(n_pages: int, pages_per_shard: int) -> List[Tuple[int, int]]:
+    """
+    Découpe [1, n_pages] en plages (début, fin) inclusives, 1-indexées (convention Docling).
+    """
+    return [
+        (start, min(start + pages_per_shard - 1, n_pages))
+        for start in range(1, n_pages + 1, pages_per_shard)
+    ]
+
+
+def content_shard_ranges(page_hashes: List[str], pages_per_shard: int) -> List[Tuple[int, int]]:
+    """
+    Plages (début, fin) inclusives, 1-indexées, aux frontières définies par le contenu :
+    un shard se termine après une page dont l'empreinte tombe sur un multiple
+    (probabilité 2 / pages_per_shard), entre pages_per_shard / 2 et 2 × pages_per_shard
+    pages. Insérer ou retirer une page ne change que le shard qui la contient ; avec des
+    plages fixes, toutes les clés des shards suivants changeaient.
+    """
+    lo, hi = max(1, pages_per_shard // 2), max(1, 2 * pages_per_shard)
+    ranges, start = [], 1
+    for i, ph in enumerate(page_hashes, start=1):
+        size = i - start + 1
+        if size >= hi or (size >= lo and int(ph[:8], 16) % pages_per_shard < 2):
+            ranges.append((start, i))
+            start = i + 1
+    if start <= len(page_hashes):
+        ranges.append((start, len(page_hashes)))
+    return ranges
+
+
+def _shard_key(page_hashes: List[str], start: int, end: int) -> str:
+    h = hashlib.sha256()
+    for ph in page_hashes[start - 1 : end]:
+        h.update(ph.encode("ascii"))
+    return h.hexdigest()
+
+
+def _load_manifest(cache_dir: Path) -> Dict[str, Dict]:
+    path = cache_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _save_manifest(cache_dir: Path, manifest: Dict[str, Dict]) -> None:
+    path = cache_dir / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# =========================
+# 2) Conversion d'un shard (exécuté dans un worker)
+# =========================
+
+def _convert_shard(pdf_path: str, start: int, end: int) -> Tuple[str, int, float, int]:
+    """
+    Convertit les pages [start, end] d'un PDF en markdown.
+    Retourne (markdown, nb_pages, durée, pid du worker).
+    """
+    converter = _get_worker_converter()
+    t0 = time.time()
+    conv_result = converter.convert(pdf_path, page_range=(start, end))
+    md_content = conv_result.document.export_to_markdown()
+    return md_content, end - start + 1, time.time() - t0, os.getpid()
+
+
+# =========================
+# 3) Pipeline principal
+# =========================
+
+def process_pdfs_to_markdown(
+    source_pdf_dir: Path,
+    output_markdown_dir: Path,
+    workers: int | None = None,
+    pages_per_shard: int = PAGES_PER_SHARD,
+    force: bool = False,
+):
+    """
+    Parcourt un dossier source, convertit tous les PDF en Markdown structuré
+    et les sauvegarde dans un dossier de sortie.
+    Utilise PyPdfium (Docling backend) sans OCR.
+
+    Les PDF sont découpés en shards d'environ `pages_per_shard` pages (frontières
+    définies par le contenu des pages : `content_shard_ranges`), convertis en
+    parallèle sur `workers` process (par défaut : tous les cœurs), puis le
+    markdown est recousu dans l'ordre des pages.
+
+    Le skip se fait sur le contenu, pas sur le mtime :
+      - hash du fichier identique et sortie présente → fichier ignoré ;
+      - sinon, seuls les shards dont les pages ont changé sont reconvertis,
+        les autres sont relus depuis le cache.
+    """
+    if not source_pdf_dir.exists():
+        print(f"❌ ERREUR: Le dossier source '{source_pdf_dir}' est introuvable.")
+        return
+
+    output_markdown_dir.mkdir(parents=True, exist_ok=True)
+    cache_dir = output_markdown_dir / CACHE_DIRNAME
+    shards_dir = cache_dir / "shards"
+    shards_dir.mkdir(parents=True, exist_ok=True)
+
+    pdf_files = sorted(source_pdf_dir.rglob("*.pdf"))
     if not pdf_files:
         print(f"⚠️ Aucun fichier PDF trouvé dans {source_pdf_dir}.")
         return
 
-    print(f"--- Début du traitement des PDF (backend: PyPdfium, sans OCR) ---")
+    workers = workers or os.cpu_count() or 1
+    manifest = _load_manifest(cache_dir)
+
+    print(f"--- Début du traitement des PDF (backend: PyPdfium, sans OCR, workers={workers}) ---")
+
+    # ---- 1) Planification : quels shards faut-il (re)convertir ? ----
+    plans = []          # (pdf_path, output_path, file_hash, page_hashes, shard_keys)
+    todo = {}           # shard_key -> (pdf_path, start, end)
 
     for pdf_path in pdf_files:
         relative_path = pdf_path.relative_to(source_pdf_dir)
         output_path = output_markdown_dir / relative_path.with_suffix(".md")
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # ⏩ Skip si déjà à jour
-        if output_path.exists() and pdf_path.stat().st_mtime < output_path.stat().st_mtime:
-            print(f"-> '{pdf_path.name}' déjà converti, ignoré.")
-            continue
-
-        print(f"-> Conversion de {pdf_path.name} ...")
+        # Un PDF illisible (corrompu, chiffré...) est signalé et ignoré, pas fatal au lot
         try:
-            start_time = time.time()
-            conv_result = doc_converter.convert(pdf_path)
-            elapsed = time.time() - start_time
+            file_hash = _file_sha256(pdf_path)
+            entry = manifest.get(str(relative_path), {})
 
-            md_content = conv_result.document.export_to_markdown()
-            with open(output_path, "w", encoding="utf-8") as fp:
-                fp.write(md_content)
+            # ⏩ Skip si contenu identique
+            if not force and output_path.exists() and entry.get("sha256") == file_hash:
+                print(f"-> '{pdf_path.name}' inchangé (hash), ignoré.")
+                continue
 
-            print(f"   ✅ Sauvegardé : {output_path} ({elapsed:.2f}s)")
+            page_hashes = _page_hashes(pdf_path)
         except Exception as e:
-            print(f"   ❌ ERREUR pour {pdf_path.name}: {e}")
+            print(f"   ❌ ERREUR à la lecture de {pdf_path.name}: {e}")
+            continue
+
+        shard_keys = []
+        reused = 0
+        for start, end in content_shard_ranges(page_hashes, pages_per_shard):
+            key = _shard_key(page_hashes, start, end)
+            shard_keys.append(key)
+            if not force and (shards_dir / f"{key}.md").exists():
+                reused += 1
+            else:
+                todo.setdefault(key, (pdf_path, start, end))
+
+        print(
+            f"-> {pdf_path.name}: {len(page_hashes)} pages, {len(shard_keys)} shards "
+            f"({reused} réutilisés depuis le cache)"
+        )
+        plans.append((pdf_path, output_path, file_hash, page_hashes, shard_keys))
+
+    # ---- 2) Conversion parallèle des shards manquants ----
+    per_worker = defaultdict(lambda: [0, 0.0])   # pid -> [pages, secondes]
+    failed = set()
+
+    if todo:
+        start_time = time.time()
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            futures = {
+                pool.submit(_convert_shard, str(pdf_path), start, end): (key, pdf_path, start, end)
+                for key, (pdf_path, start, end) in todo.items()
+            }
+            for fut in as_completed(futures):
+                key, pdf_path, start, end = futures[fut]
+                try:
+                    md_content, n_pages, elapsed, pid = fut.result()
+                except Exception as e:
+                    failed.add(key)
+                    print(f"   ❌ ERREUR pour {pdf_path.name} p.{start}-{end}: {e}")
+                    continue
+
+                (shards_dir / f"{key}.md").write_text(md_content, encoding="utf-8")
+                per_worker[pid][0] += n_pages
+                per_worker[pid][1] += elapsed
+                print(f"   ✅ {pdf_path.name} p.{start}-{end} ({elapsed:.2f}s, {n_pages / max(elapsed, 1e-9):.2f} pages/s)")
 
+        total_elapsed = time.time() - start_time
+        total_pages = sum(p for p, _ in per_worker.values())
+        print("\n--- Débit par worker ---")
+        for pid, (pages, secs) in sorted(per_worker.items()):
+            print(f"   worker {pid}: {pages} pages en {secs:.2f}s → {pages / max(secs, 1e-9):.2f} pages/s")
+        print(f"   global : {total_pages} pages en {total_elapsed:.2f}s → {total_pages / max(total_elapsed, 1e-9):.2f} pages/s")
+
+    # ---- 3) Recousage du markdown dans l'ordre des pages ----
+    for pdf_path, output_path, file_hash, page_hashes, shard_keys in plans:
+        if any(k in failed for k in shard_keys):
+            print(f"   ⚠️ {pdf_path.name}: shards en erreur, sortie non écrite.")
+            continue
+
+        parts = [(shards_dir / f"{k}.md").read_text(encoding="utf-8") for k in shard_keys]
+        with open(output_path, "w", encoding="utf-8") as fp:
+            fp.write("\n\n".join(p.strip("\n") for p in parts if p.strip()))
+
+        manifest[str(pdf_path.relative_to(source_pdf_dir))] = {
+            "sha256": file_hash,
+            "pages": page_hashes,
+            "pages_per_shard": pages_per_shard,
+            "shards": shard_keys,
+        }
+        print(f"   💾 Sauvegardé : {output_path}")
+
+    # ---- 4) Ménage : PDF disparus du dossier source, shards plus référencés ----
+    present = {str(p.relative_to(source_pdf_dir)) for p in pdf_files}
+    manifest = {rel: entry for rel, entry in manifest.items() if rel in present}
+    keep = {k for entry in manifest.values() for k in entry.get("shards", [])}
+    keep.update(k for plan in plans for k in plan[4])  # shards d'un PDF en erreur : réutilisés au prochain passage
+    removed = 0
+    for shard in shards_dir.glob("*.md"):
+        if shard.stem not in keep:
+            shard.unlink()
+            removed += 1
+    if removed:
+        print(f"🧹 {removed} shard(s) obsolète(s) supprimé(s) du cache")
+
+    _save_manifest(cache_dir, manifest)
     print("\n--- Conversion terminée ---")
 
 
@@ -75,11 +316,26 @@ def process_pdfs_to_markdown(source_pdf_dir: Path, output_markdown_dir: Path):
 def main():
     logging.basicConfig(level=logging.INFO)
 
+    parser = argparse.ArgumentParser(description="Conversion PDF → Markdown (Docling, parallèle)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Nombre de process (défaut : nombre de cœurs)")
+    parser.add_argument("--pages-per-shard", type=int, default=PAGES_PER_SHARD,
+                        help="Nombre de pages par shard")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore le cache et reconvertit tout")
+    args = parser.parse_args()
+
     project_root = Path(__file__).resolve().parents[1]
     source_pdf_dir = project_root / "data" / "pdf"
     output_markdown_dir = project_root / "data" / "markdown"
 
-    process_pdfs_to_markdown(source_pdf_dir, output_markdown_dir)
+    process_pdfs_to_markdown(
+        source_pdf_dir,
+        output_markdown_dir,
+        workers=args.workers,
+        pages_per_shard=args.pages_per_shard,
+        force=args.force,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+# src/lexical_index.py
+"""
+Index lexical en mémoire (BM25) + dictionnaire article → chunks.
+
+- tokenisation adaptée au français : minuscules, accents retirés, élisions
+  (l', d', qu'...) et mots vides écartés, pluriels simples ramenés au singulier ;
+  les nombres sont gardés (taux, seuils, numéros d'article) ;
+- listes inversées en tableaux numpy : un score BM25 = quelques additions
+  vectorisées par terme de la question ;
+- `article_rows` : lignes des chunks de chaque article ("ARTICLE 247" → [812, 813]),
+  pour servir "que prévoit l'article 247 ?" sans embedding ni rerank (corps du code
+  seulement, titre de l'article en tête : `rank_article_rows`) ;
+- `rrf` : fusion par rangs réciproques des candidats BM25 et FAISS.
+
+Construit à la demande par le retriever (quelques centaines de ms pour le CGI).
+
+    python lexical_index.py "taux de l'IS des établissements de crédit"
+"""
+import argparse
+import math
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from article_refs import normalize_article_key
+from cgi_structure import code_article, iter_with_paths
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# mots vides (sans accents, après élision)
+STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette dans de des du elle en est et etre eux il ils je la le les leur leurs lui
+ma mais me meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sont sur ta te
+tes toi ton tu un une vos votre vous y l d j m n s t c quel quelle quels quelles quoi dont ou sont
+lorsque lorsqu si sous entre aussi cas ainsi tout tous toute toutes autre autres
+""".split())
+
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+
+
+def _stem(token: str) -> str:
+    # pluriels simples : "impots" -> "impot", "taux" reste "taux", "societes" -> "societe"
+    if len(token) > 4 and token[-1] == "s" and token[-2] != "s":
+        return token[:-1]
+    if len(token) > 4 and token.endswith("aux") and not token.endswith("taux"):
+        return token[:-3] + "al"
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    "L'impôt sur les sociétés" -> ["impot", "societe"].
+    """
+    words = _WORD_RE.findall(_strip_accents((text or "").lower()))
+    return [_stem(w) for w in words if w not in STOPWORDS]
+
+
+# =========================
+# 1) BM25
+# =========================
+
+class BM25Index:
+    """
+    BM25 (k1, b) sur une liste de textes ; la ligne i = le texte i (= ligne FAISS).
+    """
+
+    def __init__(self, texts: Iterable[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        rows: Dict[str, List[int]] = defaultdict(list)
+        tfs: Dict[str, List[int]] = defaultdict(list)
+        lengths = []
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                rows[term].append(i)
+                tfs[term].append(tf)
+
+        self.n_docs = len(lengths)
+        self.doc_len = np.asarray(lengths, dtype="float32")
+        avg = float(self.doc_len.mean()) if self.n_docs else 1.0
+        # normalisation de longueur précalculée : k1 · (1 - b + b · |d| / avgdl)
+        self._norm = k1 * (1 - b + b * self.doc_len / max(avg, 1e-9))
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            t: (np.asarray(rows[t], dtype="int32"), np.asarray(tfs[t], dtype="float32")) for t in rows
+        }
+        self.idf = {
+            t: math.log(1 + (self.n_docs - len(r) + 0.5) / (len(r) + 0.5)) for t, r in rows.items()
+        }
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        Score BM25 de chaque ligne pour `query` (0 si aucun terme commun).
+        """
+        out = np.zeros(self.n_docs, dtype="float32")
+        for term, qtf in Counter(tokenize(query)).items():
+            post = self.postings.get(term)
+            if post is None:
+                continue
+            rows, tf = post
+            out[rows] += qtf * self.idf[term] * tf * (self.k1 + 1) / (tf + self._norm[rows])
+        return out
+
+    def search(self, query: str, k: int, rows: Optional[Sequence[int]] = None,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k [(ligne, score)] (score > 0). Restreint à `rows` : toutes ces lignes sont
+        classées, y compris à score 0 (ordre de `rows` en cas d'égalité).
+        `allowed` : masque bool des lignes admissibles (filtre de métadonnées).
+        """
+        scores = self.scores(query)
+        if allowed is not None:
+            scores[~allowed] = 0.0
+        if rows is not None:
+            rows = np.asarray(rows, dtype="int64")
+            sub = scores[rows]
+            order = np.argsort(-sub, kind="stable")[:k]
+            return [(int(rows[i]), float(sub[i])) for i in order]
+        k = min(k, self.n_docs)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+
+# =========================
+# 2) Dictionnaire article → lignes
+# =========================
+
+def article_rows(chunks: Iterable[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    "ARTICLE 247" → lignes des chunks de l'article, dans l'ordre du document.
+    Le chemin structurel couvre aussi les chunks de suite (sans titre d'article) ;
+    articles du code seulement (les "Article N" des annexes ne sont pas indexés) ;
+    clés au format de `article_refs.question_articles`.
+    """
+    out: Dict[str, List[int]] = defaultdict(list)
+    for i, (c, path, _) in enumerate(iter_with_paths(chunks)):
+        article = code_article(c, path)
+        if article:
+            out[normalize_article_key(article)].append(i)
+    return dict(out)
+
+
+def single_block(rows: Sequence[int]) -> bool:
+    """
+    Lignes contiguës : l'article est un seul bloc du document. Sinon la clé est ambiguë
+    (numéro repris ailleurs) et le retriever repasse par la recherche dense.
+    """
+    return all(b == a + 1 for a, b in zip(rows, rows[1:]))
+
+
+def rank_article_rows(index: BM25Index, query: str, rows: Sequence[int], k: int) -> List[Tuple[int, float]]:
+    """
+    Top-k des chunks d'un article : le chunk de tête (titre de l'article) d'abord, puis
+    les suites par BM25. Sans tête imposée, "que prévoit l'article 6 ?" n'a aucun terme
+    de contenu et BM25 classe en premier les paragraphes "(abrogé)" les plus courts.
+    """
+    if not rows:
+        return []
+    ranked = index.search(query, len(rows), rows=rows)
+    head = [x for x in ranked if x[0] == rows[0]]
+    return (head + [x for x in ranked if x[0] != rows[0]])[:k]
+
+
+# =========================
+# 3) Fusion
+# =========================
+
+def rrf(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Reciprocal rank fusion : score(d) = Σ 1 / (k + rang de d dans chaque liste).
+    Retourne [(ligne, score)] trié décroissant (égalités : ordre de première apparition).
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: -x[1])
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    from chunks_io import default_chunks_path, iter_chunks
+
+    parser = argparse.ArgumentParser(description="Recherche BM25 sur les chunks")
+    parser.add_argument("query", type=str)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = list(iter_chunks(default_chunks_path()))
+    t0 = time.perf_counter()
+    index = BM25Index(c.get("text") or "" for c in chunks)
+    articles = article_rows(chunks)
+    print(f"📦 {index.n_docs} chunks, {len(index.postings)} termes, {len(articles)} articles "
+          f"indexés en {(time.perf_counter() - t0) * 1e3:.0f} ms")
+
+    t0 = time.perf_counter()
+    hits = index.search(args.query, args.k)
+    dt = (time.perf_counter() - t0) * 1e3
+    for row, score in hits:
+        c = chunks[row]
+        print(f"{score:6.2f}  [{c.get('id')}] {c.get('article') or ''} {(c.get('title') or '')[:70]}")
+    print(f"⏱️ {dt:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# src/mmr.py
+"""
+Diversification MMR (maximal marginal relevance) des candidats après le rerank.
+
+    score(d) = λ · sim(q, d) - (1 - λ) · max_{s ∈ choisis} sim(d, s)
+
+- le meilleur candidat du rerank est gardé en tête ; les suivants sont choisis
+  glouton parmi les MMR_FETCH_K premiers : pertinent ET différent de ce qui est
+  déjà retenu (deux sections quasi identiques d'un même article ne passent plus
+  toutes les deux dans le prompt) ;
+- sim(q, d) : score du cross-encoder ramené à [0, 1] (min-max sur les candidats)
+  quand le rerank a tourné, l'ordre du rerank n'est pas jeté ; cosinus sinon ;
+- vecteurs des candidats relus dans l'index FAISS (reconstruct), question servie
+  par le cache d'embeddings : aucun appel d'embedding supplémentaire ;
+- calcul en numpy : une matrice de similarités [m, m] (un produit matriciel), puis
+  une mise à jour vectorisée du max par candidat à chaque choix.
+
+    python mmr.py [--k 3] [--mmr-k 2] [--lambda 0.5]   # TOP_K sans MMR vs MMR_TOP_K avec (all_questions.csv)
+"""
+import argparse
+import csv
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from config_cgi import MMR_LAMBDA, MMR_TOP_K, PROJECT_ROOT, TOP_K
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype="float32")
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _minmax(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype="float32")
+    span = float(x.max() - x.min())
+    return (x - x.min()) / span if span > 0 else np.ones_like(x)
+
+
+def mmr_order(query: np.ndarray, vectors: np.ndarray, lambda_: float = MMR_LAMBDA, first: int = 0,
+              relevance: Optional[Sequence[float]] = None) -> List[int]:
+    """
+    Ordre MMR des `vectors` [m, d] pour `query` [d] (similarité cosinus).
+    `first` : candidat imposé en tête (le meilleur du rerank).
+    `relevance` : scores du rerank des candidats (normalisés min-max), à la place
+    du cosinus question / candidat.
+    """
+    m = len(vectors)
+    if m <= 1:
+        return list(range(m))
+    v = _unit(vectors)
+    rel = _minmax(relevance) if relevance is not None else v @ _unit(query)
+    sim = v @ v.T
+
+    order = [first]
+    free = np.ones(m, dtype=bool)
+    free[first] = False
+    max_sim = sim[first].copy()
+    for _ in range(m - 1):
+        score = lambda_ * rel - (1.0 - lambda_) * max_sim
+        score[~free] = -np.inf
+        j = int(np.argmax(score))
+        order.append(j)
+        free[j] = False
+        np.maximum(max_sim, sim[j], out=max_sim)
+    return order
+
+
+def redundancy(vectors: np.ndarray) -> float:
+    """
+    Similarité cosinus maximale entre deux éléments d'un lot (1.0 = doublon).
+    """
+    if len(vectors) < 2:
+        return 0.0
+    v = _unit(vectors)
+    sim = v @ v.T
+    np.fill_diagonal(sim, -np.inf)
+    return float(sim.max())
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    import retriever_faiss as R
+    from passages import count_tokens
+
+    parser = argparse.ArgumentParser(description="Effet de la diversification MMR sur all_questions.csv")
+    parser.add_argument("--questions", type=str, default=str(PROJECT_ROOT / "all_questions.csv"))
+    parser.add_argument("--k", type=int, default=TOP_K, help="chunks envoyés sans MMR")
+    parser.add_argument("--mmr-k", type=int, default=MMR_TOP_K, help="chunks envoyés avec MMR")
+    parser.add_argument("--lambda", dest="lambda_", type=float, default=MMR_LAMBDA)
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [row["question"] for row in csv.DictReader(f, delimiter=";") if row.get("question")]
+
+    for name, k, use_mmr in ((f"rerank k={args.k}", args.k, False), (f"mmr k={args.mmr_k}", args.mmr_k, True),
+                             (f"mmr k={args.k}", args.k, True)):
+        results = R.search_chunks_batch(questions, k=k, mmr=use_mmr, mmr_lambda=args.lambda_,
+                                        article_fast_path=False)
+        tokens, articles, redund = [], [], []
+        for res in results:
+            chunks = [r["chunk"] for r in res]
+            tokens.append(sum(count_tokens(c.get("text") or "") for c in chunks))
+            articles.append(len({c.get("article") or c.get("title") for c in chunks}))
+            redund.append(redundancy(R.chunk_vectors(chunks)))
+        print(f"📏 {name:14s} tokens de contexte {np.mean(tokens):7.0f}  articles distincts {np.mean(articles):.2f}  "
+              f"redondance max {np.mean(redund):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# src/passages.py
+"""
+Couche "passages" (small-to-big) :
+  - chaque chunk (section '## ') est découpé en passages bornés en tokens (tiktoken),
+    en coupant de préférence sur les subdivisions d'article (I.-, A-, 1°, a) ...),
+    avec un recouvrement entre passages consécutifs ;
+  - les passages sont embeddés / rerankés, puis remontés vers leur chunk parent.
+
+Un passage ne stocke pas son texte : seulement (chunk_id, start, end) dans le texte du chunk.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+import tiktoken
+
+from config_cgi import OPENAI_EMBED_MODEL, PASSAGE_MAX_TOKENS, PASSAGE_OVERLAP_TOKENS
+
+# Début de subdivision d'article : "I.-", "II. -", "A-", "B.-", "1°", "2°-", "a)", "- "
+_SUBDIVISION_RE = re.compile(
+    r"^\s*(?:[IVXLC]+\s*\.?\s*-|[A-H]\s*\.?\s*-|\d+\s*°|[a-z]\)|-\s)"
+)
+_SENTENCE_RE = re.compile(r"(?<=[.;:!?])\s+")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.encoding_for_model(OPENAI_EMBED_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text or "", disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    toks = _encoding().encode(text or "", disallowed_special=())
+    return text if len(toks) <= max_tokens else _encoding().decode(toks[:max_tokens])
+
+
+# =========================
+# 1) Découpe en unités (paragraphes / subdivisions / phrases)
+# =========================
+
+def _units(text: str, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """
+    Découpe `text` en unités (start, end, n_tokens) qui tiennent chacune dans `max_tokens`.
+    Une unité = un paragraphe ; les paragraphes trop longs sont recoupés en phrases,
+    puis en fenêtres de tokens en dernier recours.
+    """
+    units: List[Tuple[int, int, int]] = []
+
+    # paragraphes : lignes séparées par une ligne vide, ou ligne qui ouvre une subdivision
+    spans = []
+    pos = 0
+    start = None
+    for line in text.splitlines(keepends=True):
+        is_blank = not line.strip()
+        if start is not None and (is_blank or _SUBDIVISION_RE.match(line)):
+            spans.append((start, pos))
+            start = None
+        if not is_blank and start is None:
+            start = pos
+        pos += len(line)
+    if start is not None:
+        spans.append((start, pos))
+
+    enc = _encoding()
+    for s, e in spans:
+        n = count_tokens(text[s:e])
+        if n <= max_tokens:
+            units.append((s, e, n))
+            continue
+
+        # phrases
+        cursor = s
+        for piece in _SENTENCE_RE.split(text[s:e]):
+            if not piece:
+                continue
+            ps = text.index(piece, cursor)
+            pe = ps + len(piece)
+            cursor = pe
+            pn = count_tokens(piece)
+            if pn <= max_tokens:
+                units.append((ps, pe, pn))
+                continue
+
+            # fenêtres de tokens (tableaux, énumérations sans ponctuation...)
+            toks = enc.encode(piece, disallowed_special=())
+            offset = ps
+            for i in range(0, len(toks), max_tokens):
+                sub = enc.decode(toks[i : i + max_tokens])
+                sub_end = min(offset + len(sub), pe)
+                units.append((offset, sub_end, min(max_tokens, len(toks) - i)))
+                offset = sub_end
+    return units
+
+
+# =========================
+# 2) Assemblage en passages avec recouvrement
+# =========================
+
+def split_passages(
+    chunk: Dict[str, Any],
+    max_tokens: int = PASSAGE_MAX_TOKENS,
+    overlap_tokens: int = PASSAGE_OVERLAP_TOKENS,
+) -> List[Dict[str, Any]]:
+    """
+    Découpe un chunk en passages.
+
+    Champs de chaque passage :
+      - passage_id : '<chunk_id>:<n>'
+      - chunk_id   : id du chunk parent
+      - start, end : offsets (caractères) dans chunk["text"]
+      - n_tokens   : nombre de tokens de la fenêtre
+    """
+    text = chunk.get("text") or ""
+    chunk_id = chunk["id"]
+    if not text.strip():
+        return []
+
+    n_total = chunk.get("n_tokens") or count_tokens(text)
+    if n_total <= max_tokens:
+        return [{"passage_id": f"{chunk_id}:0", "chunk_id": chunk_id,
+                 "start": 0, "end": len(text), "n_tokens": n_total}]
+
+    units = _units(text, max_tokens)
+    passages = []
+    i = 0
+    while i < len(units):
+        j = i
+        n = 0
+        while j < len(units) and n + units[j][2] <= max_tokens:
+            n += units[j][2]
+            j += 1
+        j = max(j, i + 1)  # toujours avancer
+
+        start, end = units[i][0], units[j - 1][1]
+        passages.append({
+            "passage_id": f"{chunk_id}:{len(passages)}",
+            "chunk_id": chunk_id,
+            "start": start,
+            "end": end,
+            "n_tokens": count_tokens(text[start:end]),
+        })
+        if j >= len(units):
+            break
+
+        # recouvrement : on reprend les dernières unités jusqu'à `overlap_tokens`
+        k = j
+        back = 0
+        while k - 1 > i and back + units[k - 1][2] <= overlap_tokens:
+            back += units[k - 1][2]
+            k -= 1
+        i = k
+    return passages
+
+
+def passage_text(chunk: Dict[str, Any], passage: Dict[str, Any]) -> str:
+    """
+    Fenêtre de texte du passage (slice du texte du chunk parent).
+    """
+    return (chunk.get("text") or "")[passage["start"] : passage["end"]]
+
+
+def passage_embedding_text(chunk: Dict[str, Any], passage: Dict[str, Any]) -> str:
+    """
+    Texte embeddé / reranké : le titre de la section (article) est répété en tête
+    de chaque passage pour qu'il reste interprétable isolément.
+    """
+    window = passage_text(chunk, passage)
+    title = chunk.get("title") or ""
+    if passage["start"] == 0 or not title:
+        return window
+    return f"## {title}\n{window}"
+
+
+def iter_passages(chunks: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    (chunk, passage) pour tous les passages d'un flux de chunks.
+    """
+    for chunk in chunks:
+        for p in split_passages(chunk):
+            yield chunk, p
+
+
+def pack_by_tokens(items: Iterable[Any], n_tokens: Callable[[Any], int],
+                   max_tokens: int, max_items: int = 2048) -> Iterator[List[Any]]:
+    """
+    Regroupe des éléments en batches dont la somme de tokens reste <= `max_tokens`
+    (à partir des comptes déjà stockés : pas de re-tokenisation).
+    """
+    batch: List[Any] = []
+    total = 0
+    for it in items:
+        n = n_tokens(it)
+        if batch and (total + n > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, total = [], 0
+        batch.append(it)
+        total += n
+    if batch:
+        yield batch
@@ -0,0 +1,491 @@
+# src/rate_tables.py
+"""
+Index structuré des faits chiffrés du CGI (taux, montants / seuils, délais).
+
+Hors ligne : les chunks sont parcourus dans l'ordre du document ; les tableaux
+markdown et les phrases contenant un pourcentage, un montant en dirhams ou
+"dans un délai de N jours" sont transformés en faits typés, rangés dans une base
+SQLite indexée par (impôt, catégorie) et par article.
+
+En ligne : `lookup(question)` reconnaît les questions de consultation simples
+("quel est le taux de l'IS", "délai de dépôt de la déclaration de TVA"...) et y
+répond en quelques millisecondes avec la citation de l'article, sans embedding ni LLM.
+Si la question n'est pas une consultation reconnue, retourne None (→ RAG classique).
+
+    python rate_tables.py build
+    python rate_tables.py query "quel est le taux de l'IS ?"
+"""
+import argparse
+import re
+import sqlite3
+import time
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cgi_structure import ARTICLE_RE, StructureTracker, article_from_title
+from chunks_io import default_chunks_path, iter_chunks
+from config_cgi import FACTS_DB_PATH
+
+# Impôts : (code, libellé, formes longues dans le document, abréviations dans les questions)
+TAXES = [
+    ("IS", "impôt sur les sociétés", ["impot sur les societes"], ["IS"]),
+    ("IR", "impôt sur le revenu", ["impot sur le revenu"], ["IR"]),
+    ("TVA", "taxe sur la valeur ajoutée", ["taxe sur la valeur ajoutee"], ["TVA"]),
+    ("DE", "droits d'enregistrement", ["droits d'enregistrement", "droit d'enregistrement"], []),
+    ("DT", "droits de timbre", ["droits de timbre", "droit de timbre"], []),
+    ("TSAV", "taxe spéciale annuelle sur les véhicules",
+     ["taxe speciale annuelle sur les vehicules", "vignette"], ["TSAV"]),
+    ("TCA", "taxe sur les contrats d'assurances", ["taxe sur les contrats d'assurances"], []),
+    ("TSC", "taxe spéciale sur le ciment", ["taxe speciale sur le ciment"], []),
+    ("CSS", "contribution sociale de solidarité", ["contribution sociale de solidarite"], []),
+]
+TAX_LABELS = {code: label for code, label, _, _ in TAXES}
+
+# mots-clés de catégorie dans les questions / titres de section
+CATEGORY_WORDS = {
+    "taux": ["taux", "pourcentage", "%"],
+    "delai": ["delai", "combien de jours", "combien de mois", "date limite"],
+    "seuil": ["seuil", "plafond", "minimum", "maximum", "a partir de quel", "montant"],
+}
+
+_STOPWORDS = set("""
+a au aux avec ce ces cet cette combien d de des du elle en est et il la le les l leur
+leurs lui ma mon ne ni nos notre ou par pas pour quel quelle quelles quels qu que qui
+quoi sa se ses si son sont sur ta te tes ton un une vos votre y applicable applicables
+appliquer applique actuel actuelle fixe fixes maroc marocain cgi impot impots taxe
+article articles
+""".split())
+
+_SEP_ROW_RE = re.compile(r"^\|?\s*:?-{3,}")
+_PERCENT_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s?%")
+_AMOUNT_RE = re.compile(
+    r"\(?(\d{1,3}(?:[ . ]\d{3})+|\d+(?:,\d+)?)\)?\s*(?:de\s+)?(?:dirhams|DH\b|MAD\b)",
+    re.IGNORECASE,
+)
+_DELAY_RE = re.compile(
+    r"d[ée]lai[^.;]{0,40}?(\d+)\)?\s*(?:\([^)]{1,20}\)\s*)?(jours|mois|ans|ann[ée]es)",
+    re.IGNORECASE,
+)
+_THRESHOLD_RE = re.compile(
+    r"(?i)(sup[ée]rieur|inf[ée]rieur|exc[ée]d|au-del[àa]|n'exc|seuil|plafond|minimum|"
+    r"chiffre d'affaires|moins de|plus de|à partir de)"
+)
+# renvois de notes de bas de page collés au texte par l'extraction PDF :
+# "35%141" / "35% 322 pour" → "35%", "immobilisations163" → "immobilisations",
+# titre "... (abrogé) 442"
+_GLUED_NOTE_RE = re.compile(r"(?<=%)\d{1,4}\b|(?<=%) \d{2,4}(?= [a-zà-ÿ])|(?<=[a-zà-ÿ])\d{2,4}\b")
+_TRAILING_NOTE_RE = re.compile(r"\s+\d{1,4}\s*$")
+_STRUCT_LINE_RE = re.compile(r"^(TITRE|SOUS[\s-]+TITRE|LIVRE|[A-Z]+IEME PARTIE|PREMIERE PARTIE|DECRET)\b")
+_RESET_LINE_RE = re.compile(r"^(TITRE|LIVRE|[A-Z]+IEME PARTIE|PREMIERE PARTIE|DECRET)\b")
+
+
+def _fold(text: str) -> str:
+    """
+    Minuscules sans accents, apostrophes normalisées (comparaisons tolérantes).
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return text.replace("’", "'").casefold()
+
+
+def _strip_notes(text: str, title: bool = False) -> str:
+    """
+    Libellé sans les numéros de notes de bas de page (cf. chunks_io._norm_title) ;
+    `title` : retire aussi le renvoi isolé en fin d'intitulé.
+    """
+    text = _GLUED_NOTE_RE.sub("", text or "")
+    return _TRAILING_NOTE_RE.sub("", text) if title else text
+
+
+def _to_number(raw: str) -> Optional[float]:
+    raw = raw.replace(" ", "").replace(" ", "")
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", raw):
+        raw = raw.replace(".", "")
+    raw = raw.replace(",", ".")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def _tax_in(text: str) -> Optional[str]:
+    folded = _fold(text)
+    for code, _, forms, _ in TAXES:
+        if any(f in folded for f in forms):
+            return code
+    return None
+
+
+def _sentence(text: str, start: int, end: int, width: int = 280) -> str:
+    """
+    Phrase (ou élément de liste) autour d'un match, bornée en longueur.
+    """
+    s = max(text.rfind(". ", 0, start), text.rfind("\n", 0, start)) + 1
+    e_candidates = [i for i in (text.find(". ", end), text.find("\n", end)) if i != -1]
+    e = min(e_candidates) if e_candidates else len(text)
+    snippet = re.sub(r"\s+", " ", text[s:e]).strip(" -#")
+    if len(snippet) > width:
+        mid = (start - s)
+        lo = max(0, mid - width // 2)
+        snippet = "…" + snippet[lo:lo + width] + "…"
+    return snippet
+
+
+# =========================
+# 1) Extraction
+# =========================
+
+def _split_tables(text: str) -> Iterator[Tuple[str, str]]:
+    """
+    Découpe le texte en segments ("text", ...) / ("table", ...).
+    Les cellules d'en-tête peuvent contenir des retours à la ligne (sortie Docling).
+    """
+    lines = text.split("\n")
+    i = 0
+    buf: List[str] = []
+    while i < len(lines):
+        if _SEP_ROW_RE.match(lines[i].strip()) and "|" in lines[i]:
+            # en-tête : lignes précédentes jusqu'à la dernière ligne vide
+            k = len(buf)
+            while k > 0 and buf[k - 1].strip():
+                k -= 1
+            if buf[:k]:
+                yield "text", "\n".join(buf[:k])
+            table = buf[k:] + [lines[i]]
+            i += 1
+            while i < len(lines) and lines[i].lstrip().startswith("|"):
+                table.append(lines[i])
+                i += 1
+            yield "table", "\n".join(table)
+            buf = []
+            continue
+        buf.append(lines[i])
+        i += 1
+    if buf:
+        yield "text", "\n".join(buf)
+
+
+def _cells(row: str) -> List[str]:
+    row = row.strip()
+    if row.startswith("|"):
+        row = row[1:]
+    if row.endswith("|"):
+        row = row[:-1]
+    return [re.sub(r"\s+", " ", c).strip() for c in row.split("|")]
+
+
+def _table_facts(table: str) -> Iterator[Dict[str, Any]]:
+    lines = table.split("\n")
+    sep = next(i for i, l in enumerate(lines) if _SEP_ROW_RE.match(l.strip()))
+    header = _cells(" ".join(l.strip() for l in lines[:sep]))
+    for row in lines[sep + 1:]:
+        cells = _cells(row)
+        if len(cells) < 2:
+            continue
+        label = cells[0]
+        for col, cell in enumerate(cells[1:], start=1):
+            head = header[col] if col < len(header) else ""
+            m = _PERCENT_RE.search(cell)
+            if m:
+                value = _to_number(m.group(1))
+                if value is not None and value <= 100:
+                    yield {"category": "taux", "value": value, "unit": "%",
+                           "label": f"{head} — {label}".strip(" —"), "in_table": 1}
+                continue
+            value = _to_number(cell) if re.fullmatch(r"[\d ., ]+", cell or "x") else None
+            if value is None:
+                continue
+            folded_head = _fold(head)
+            if "taux" in folded_head:
+                yield {"category": "taux", "value": value, "unit": "%",
+                       "label": f"{head} — {label}".strip(" —"), "in_table": 1}
+            elif "dirham" in folded_head or "montant" in folded_head:
+                yield {"category": "seuil" if _THRESHOLD_RE.search(label) else "montant",
+                       "value": value, "unit": "MAD",
+                       "label": f"{head} — {label}".strip(" —"), "in_table": 1}
+
+
+def _text_facts(text: str) -> Iterator[Dict[str, Any]]:
+    for m in _PERCENT_RE.finditer(text):
+        value = _to_number(m.group(1))
+        if value is None or value > 100:
+            continue
+        yield {"category": "taux", "value": value, "unit": "%",
+               "label": _sentence(text, m.start(), m.end()), "in_table": 0}
+
+    for m in _AMOUNT_RE.finditer(text):
+        value = _to_number(m.group(1))
+        if value is None:
+            continue
+        ctx = _sentence(text, m.start(), m.end())
+        window = text[max(0, m.start() - 80):m.start()]
+        yield {"category": "seuil" if _THRESHOLD_RE.search(window) else "montant",
+               "value": value, "unit": "MAD", "label": ctx, "in_table": 0}
+
+    for m in _DELAY_RE.finditer(text):
+        unit = _fold(m.group(2)).replace("annees", "ans")
+        yield {"category": "delai", "value": float(m.group(1)), "unit": unit,
+               "label": _sentence(text, m.start(), m.end()), "in_table": 0}
+
+
+def extract_facts(chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Parcourt les chunks dans l'ordre du document et produit les faits typés.
+    L'impôt courant est suivi à partir des intitulés (TITRE II L'IMPOT SUR LE REVENU...),
+    l'article courant à partir des titres "Article N" (ou du `path` du chunk).
+    """
+    tracker = StructureTracker()
+    current_tax: Optional[str] = None
+    article_title = ""
+
+    def _observe(line: str):
+        nonlocal current_tax
+        s = line.strip().lstrip("#").strip()
+        if not _STRUCT_LINE_RE.match(s):
+            return
+        tax = _tax_in(s)
+        if tax:
+            current_tax = tax
+        elif _RESET_LINE_RE.match(s):
+            current_tax = None
+
+    for c in chunks:
+        title = c.get("title") or ""
+        tracker.observe_heading(title)
+        _observe(title)
+        if article_from_title(title):
+            article_title = title
+
+        path = c.get("path") or {}
+        article = path.get("article") or tracker.snapshot()["article"] or c.get("article")
+
+        for kind, segment in _split_tables(c.get("text") or ""):
+            if kind == "table":
+                facts = _table_facts(segment)
+            else:
+                for line in segment.split("\n"):
+                    tracker.observe_line(line.strip())
+                    _observe(line)
+                facts = _text_facts(segment)
+
+            for f in facts:
+                f["label"] = _strip_notes(f["label"])
+                f.update({
+                    "tax": _tax_in(f["label"]) if current_tax is None else current_tax,
+                    "article": article,
+                    "section": _strip_notes(title, title=True),
+                    "article_title": _strip_notes(article_title, title=True) if article else "",
+                    "chunk_id": str(c["id"]),
+                    "source": c.get("source"),
+                })
+                yield f
+
+
+# =========================
+# 2) Stockage SQLite
+# =========================
+
+_SCHEMA = """
+CREATE TABLE facts (
+    id            INTEGER PRIMARY KEY,
+    tax           TEXT,
+    article       TEXT,
+    category      TEXT NOT NULL,
+    value         REAL NOT NULL,
+    unit          TEXT NOT NULL,
+    label         TEXT NOT NULL,
+    section       TEXT,
+    article_title TEXT,
+    chunk_id      TEXT NOT NULL,
+    source        TEXT,
+    in_table      INTEGER NOT NULL DEFAULT 0,
+    search        TEXT NOT NULL
+);
+CREATE INDEX facts_tax_category ON facts (tax, category);
+CREATE INDEX facts_article ON facts (article, category);
+"""
+
+
+def build_facts_db(chunks: Iterable[Dict[str, Any]], db_path: Path = FACTS_DB_PATH) -> int:
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = db_path.with_name(db_path.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+
+    con = sqlite3.connect(tmp)
+    con.executescript(_SCHEMA)
+    rows = (
+        (f["tax"], f["article"], f["category"], f["value"], f["unit"], f["label"],
+         f["section"], f["article_title"], f["chunk_id"], f["source"], f["in_table"],
+         _fold(f"{f['section']} {f['article_title']} {f['label']}"))
+        for f in extract_facts(chunks)
+    )
+    con.executemany(
+        "INSERT INTO facts (tax, article, category, value, unit, label, section, article_title, "
+        "chunk_id, source, in_table, search) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+        rows,
+    )
+    n = con.execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+    con.commit()
+    con.close()
+    tmp.replace(db_path)
+    return n
+
+
+@lru_cache(maxsize=1)
+def _connection(db_path: str) -> sqlite3.Connection:
+    # lecture seule, partagée par les requêtes du processus
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+
+# =========================
+# 3) Consultation
+# =========================
+
+def parse_question(question: str) -> Dict[str, Any]:
+    """
+    Impôt, catégorie, article et termes résiduels d'une question.
+    """
+    folded = _fold(question)
+
+    tax = None
+    for code, _, forms, abbrevs in TAXES:
+        if any(f in folded for f in forms) or any(
+            re.search(rf"(?<![\w]){a}(?![\w])", question) for a in abbrevs
+        ) or (code == "TVA" and re.search(r"\btva\b", folded)):
+            tax = code
+            break
+
+    category = None
+    for cat, words in CATEGORY_WORDS.items():
+        if any(w in folded for w in words):
+            category = cat
+            break
+
+    m = ARTICLE_RE.search(question)
+    article = f"ARTICLE {m.group(1).upper()}" if m else None
+
+    ignored = set(_STOPWORDS)
+    for words in CATEGORY_WORDS.values():
+        ignored.update(w for w in words if " " not in w)
+    if tax:
+        code, _, forms, abbrevs = next(t for t in TAXES if t[0] == tax)
+        for f in forms:
+            ignored.update(f.replace("'", " ").split())
+        ignored.update(a.lower() for a in abbrevs)
+    terms = [
+        t for t in re.findall(r"[a-z0-9]+", folded.replace("'", " "))
+        if len(t) > 2 and t not in ignored and not t.isdigit()
+    ]
+    return {"tax": tax, "category": category, "article": article, "terms": terms}
+
+
+def lookup(question: str, db_path: Path = FACTS_DB_PATH, limit: int = 8) -> Optional[Dict[str, Any]]:
+    """
+    Réponse directe à une question de consultation (taux / seuil / délai), ou None.
+
+    Retour : {"reponse_textuelle", "articles_cites", "chunks_ids", "facts", "elapsed_ms"}
+    """
+    if not Path(db_path).exists():
+        return None
+
+    t0 = time.perf_counter()
+    q = parse_question(question)
+    if not q["category"] or not (q["tax"] or q["article"]):
+        return None
+
+    where = ["category IN ('seuil', 'montant')" if q["category"] == "seuil" else "category = ?"]
+    params: List[Any] = [] if q["category"] == "seuil" else [q["category"]]
+    if q["tax"]:
+        where.append("tax = ?")
+        params.append(q["tax"])
+    if q["article"]:
+        where.append("article = ?")
+        params.append(q["article"])
+
+    con = _connection(str(db_path))
+    rows = con.execute(
+        "SELECT tax, article, category, value, unit, label, section, article_title, chunk_id, "
+        f"in_table, search FROM facts WHERE {' AND '.join(where)} ORDER BY id",
+        params,
+    ).fetchall()
+    if not rows:
+        return None
+
+    # termes propres à la question (ex: "retenue à la source", "eau") : tous requis
+    if q["terms"]:
+        rows = [r for r in rows if all(t in r[10] for t in q["terms"])]
+        if not rows:
+            return None
+
+    # priorité aux sections dont l'intitulé porte sur la catégorie ("Taux de l'impôt"...)
+    keys = [w for w in CATEGORY_WORDS[q["category"]] if w.isalpha()]
+    titled = [r for r in rows if any(k in _fold(f"{r[6]} {r[7]}") for k in keys)]
+    rows = (titled or rows)
+    rows.sort(key=lambda r: -r[9])  # tableaux d'abord (tri stable : ordre du document)
+    rows = rows[:limit]
+
+    label = TAX_LABELS.get(q["tax"], q["article"] or "")
+    head = {"taux": "Taux", "delai": "Délais", "seuil": "Seuils et montants"}[q["category"]]
+    lines = [f"**{head} — {label}** (extraits du CGI) :", ""]
+    articles, chunk_ids, facts = [], [], []
+    for tax, article, category, value, unit, text, section, art_title, chunk_id, in_table, _ in rows:
+        shown = f"{value:g} {unit}" if unit != "MAD" else f"{value:,.0f} MAD".replace(",", " ")
+        where_txt = article or section
+        lines.append(f"- **{shown}** — {text} ({where_txt}) [Data: Sources ({chunk_id})]")
+        if chunk_id not in chunk_ids:
+            chunk_ids.append(chunk_id)
+        entry = {"article": article or "", "titre": art_title or section}
+        if entry not in articles:
+            articles.append(entry)
+        facts.append({"tax": tax, "article": article, "category": category, "value": value,
+                      "unit": unit, "label": text, "chunk_id": chunk_id})
+
+    return {
+        "reponse_textuelle": "\n".join(lines),
+        "articles_cites": articles,
+        "chunks_ids": chunk_ids,
+        "facts": facts,
+        "elapsed_ms": (time.perf_counter() - t0) * 1e3,
+    }
+
+
+# =========================
+# 4) CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Index des taux / seuils / délais du CGI")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Extrait les faits des chunks vers la base SQLite")
+    p_build.add_argument("--chunks", type=str, default=None)
+    p_query = sub.add_parser("query", help="Consultation directe")
+    p_query.add_argument("question", type=str)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        chunks_path = Path(args.chunks) if args.chunks else default_chunks_path()
+        n = build_facts_db(iter_chunks(chunks_path), FACTS_DB_PATH)
+        con = sqlite3.connect(FACTS_DB_PATH)
+        stats = con.execute(
+            "SELECT category, COUNT(*), COUNT(DISTINCT article) FROM facts GROUP BY category"
+        ).fetchall()
+        con.close()
+        print(f"✅ {n} faits extraits → {FACTS_DB_PATH}")
+        for cat, count, n_articles in stats:
+            print(f"   - {cat:8s}: {count} faits, {n_articles} articles")
+        return
+
+    res = lookup(args.question)
+    if res is None:
+        print("∅ Pas une consultation reconnue (→ RAG classique).")
+        return
+    print(res["reponse_textuelle"])
+    print(f"\n⏱️ {res['elapsed_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# src/rerank_cascade.py
+"""
+Rerank en cascade : le cross-encoder ne score que ce qui peut changer le top-k.
+
+Pour chaque question, sur les `faiss_top_k` candidats (ordre FAISS / RRF) :
+  1) skip   : écart FAISS décisif entre le rang 1 et le rang k
+             (distance[k] - distance[1] ≥ seuil "margin") → pas de rerank ;
+  2) head   : sinon rerank des `first` premiers (8) ; si leurs scores sont
+             nettement séparés (max - min ≥ seuil "flat"), on s'arrête là ;
+  3) extend : scores plats → rerank des candidats restants, fusion des deux lots.
+
+Les seuils dépendent de l'index (échelle des distances) et du modèle de rerank :
+ils sont calibrés hors ligne sur all_questions.csv contre le rerank complet
+(accord du top-k ≥ --target) et écrits dans RERANK_CASCADE_PATH. Sans fichier de
+calibration, le retriever fait le rerank complet.
+
+    python rerank_cascade.py [--target 0.95] [--first 8]
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config_cgi import FAISS_K, PROJECT_ROOT, RERANK_CASCADE_FIRST, RERANK_CASCADE_PATH, TOP_K
+
+
+# =========================
+# 1) Règles de décision
+# =========================
+
+def load_cascade(path: Path = RERANK_CASCADE_PATH) -> Optional[Dict[str, Any]]:
+    """
+    Seuils calibrés ({"margin", "flat", "first", "k", "mode", ...}) ou None.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def faiss_margin(candidates: Sequence[Dict[str, Any]], k: int, metric: str = "l2") -> Optional[float]:
+    """
+    Écart de score FAISS entre le rang 1 et le rang k (positif = rang 1 meilleur).
+    None si moins de k candidats denses (ex. candidats apportés par BM25 seul).
+    """
+    k = max(k, 2)
+    dense = sorted((c["rank_faiss"], c["score_faiss"]) for c in candidates if c.get("rank_faiss") is not None)
+    if len(dense) < k:
+        return None
+    first, kth = dense[0][1], dense[k - 1][1]
+    # L2 : plus petit = meilleur ; produit scalaire : plus grand = meilleur
+    return kth - first if metric == "l2" else first - kth
+
+
+def rerank_spread(scored: Sequence[Dict[str, Any]]) -> float:
+    """
+    Séparation des scores rerank d'un lot (max - min) ; petit = scores plats.
+    """
+    scores = [c["score_rerank"] for c in scored if c.get("score_rerank") is not None]
+    return max(scores) - min(scores) if len(scores) > 1 else float("inf")
+
+
+# =========================
+# 2) Calibration hors ligne
+# =========================
+
+def _agreement(a: Sequence[Any], b: Sequence[Any], k: int) -> float:
+    return len(set(a[:k]) & set(b[:k])) / max(1, min(k, len(b)))
+
+
+def _threshold(values: List[float], agreements: List[float], target: float) -> float:
+    """
+    Plus petit seuil t tel que l'accord moyen des questions de valeur ≥ t atteigne
+    `target` (en descendant depuis les plus grandes valeurs). inf si aucun.
+    """
+    best = float("inf")
+    total = 0.0
+    order = np.argsort(values)[::-1]
+    for n, i in enumerate(order, start=1):
+        total += agreements[i]
+        if total / n >= target:
+            best = values[i]
+    return best
+
+
+def calibrate(questions: List[str], k: int, faiss_top_k: int, first: int, target: float) -> Dict[str, Any]:
+    import retriever_faiss as R
+
+    per_question, text_of, mode = R._dense_candidates(questions, faiss_top_k)
+    metric = R.FAISS_METRIC if mode == "chunks" else R.PASSAGE_METRIC
+    key = (lambda c: c["passage"]["passage_id"]) if mode == "passages" else (lambda c: c["chunk"].get("id"))
+
+    # Référence : rerank complet (temps mesuré → coût d'une paire)
+    full = [list(c) for c in per_question]
+    t0 = time.perf_counter()
+    R._rerank(questions, full, text_of, R.RERANK_BATCH_SIZE)
+    n_pairs = sum(len(c) for c in full)
+    ms_per_pair = (time.perf_counter() - t0) * 1e3 / max(1, n_pairs)
+
+    margins, skip_agree, spreads, head_agree = [], [], [], []
+    for cands, ref in zip(per_question, full):
+        ref_ids = [key(c) for c in ref]
+        margins.append(faiss_margin(cands, k, metric))
+        skip_agree.append(_agreement([key(c) for c in cands], ref_ids, k))
+        # les dicts candidats portent déjà leur score rerank (listes copiées, pas les dicts)
+        head = sorted(cands[:first], key=lambda c: c["score_rerank"], reverse=True)
+        spreads.append(rerank_spread(head))
+        head_agree.append(_agreement([key(c) for c in head], ref_ids, k))
+
+    has_margin = [i for i, m in enumerate(margins) if m is not None]
+    margin = _threshold([margins[i] for i in has_margin], [skip_agree[i] for i in has_margin], target)
+    rest = [i for i in range(len(questions)) if margins[i] is None or margins[i] < margin]
+    flat = _threshold([spreads[i] for i in rest], [head_agree[i] for i in rest], target)
+
+    # Simulation des chemins avec les seuils retenus
+    paths = {"skip": 0, "head": 0, "extend": 0}
+    scored, agree = 0, []
+    for i, cands in enumerate(per_question):
+        if margins[i] is not None and margins[i] >= margin:
+            paths["skip"] += 1
+            agree.append(skip_agree[i])
+        elif len(cands) <= first or spreads[i] >= flat:
+            paths["head"] += 1
+            scored += min(first, len(cands))
+            agree.append(head_agree[i])
+        else:
+            paths["extend"] += 1
+            scored += len(cands)
+            agree.append(1.0)
+    return {
+        "margin": margin,
+        "flat": flat,
+        "first": first,
+        "k": k,
+        "faiss_top_k": faiss_top_k,
+        "mode": mode,
+        "metric": metric,
+        "target": target,
+        "n_questions": len(questions),
+        "paths": paths,
+        "agreement@k": float(np.mean(agree)) if agree else 1.0,
+        "pairs_scored": scored,
+        "pairs_full": n_pairs,
+        "ms_per_pair": ms_per_pair,
+        "saved_ms_per_question": (n_pairs - scored) * ms_per_pair / max(1, len(questions)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibration du rerank en cascade (all_questions.csv)")
+    parser.add_argument("--questions", type=str, default=str(PROJECT_ROOT / "all_questions.csv"))
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--faiss-top-k", type=int, default=FAISS_K)
+    parser.add_argument("--first", type=int, default=RERANK_CASCADE_FIRST)
+    parser.add_argument("--target", type=float, default=0.95, help="accord moyen du top-k avec le rerank complet")
+    parser.add_argument("--out", type=str, default=str(RERANK_CASCADE_PATH))
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [row["question"] for row in csv.DictReader(f, delimiter=";") if row.get("question")]
+    res = calibrate(questions, args.k, args.faiss_top_k, args.first, args.target)
+
+    out = Path(args.out)
+    tmp = out.with_name(out.name + ".tmp")
+    tmp.write_text(json.dumps(res, indent=2), encoding="utf-8")
+    os.replace(tmp, out)
+
+    n = res["n_questions"]
+    print(f"📏 {n} questions ({res['mode']}) : margin ≥ {res['margin']:.4f}, flat < {res['flat']:.4f}")
+    print("   " + "  ".join(f"{p} {c} ({c / max(1, n):.0%})" for p, c in res["paths"].items()))
+    print(f"   paires scorées {res['pairs_scored']} / {res['pairs_full']}  accord@{res['k']} {res['agreement@k']:.3f}  "
+          f"gain ≈ {res['saved_ms_per_question']:.1f} ms / question")
+    print(f"💾 {out}")
+
+
+if __name__ == "__main__":
+    main()
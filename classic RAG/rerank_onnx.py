@@ -0,0 +1,281 @@
+# src/rerank_onnx.py
+"""
+Rerank cross-encoder sur CPU : export ONNX quantifié int8 + bundle local.
+
+  - export : télécharge une fois `RERANK_MODEL`, l'écrit dans data/models
+    (copie PyTorch pour le repli hors ligne + ONNX quantifié int8 dynamique
+    + tokenizer.json) ; au démarrage plus aucun accès au hub ;
+  - OnnxCrossEncoder : même `predict(pairs, batch_size)` que
+    sentence_transformers.CrossEncoder ; les paires sont tokenisées une fois,
+    triées par longueur puis regroupées en lots de longueurs proches (padding
+    minimal), threads onnxruntime réglables (RERANK_THREADS) ;
+  - bench : latence de rerank par question (20 candidats) et accord des scores
+    avec le modèle PyTorch fp32 d'origine.
+
+    python rerank_onnx.py export
+    python rerank_onnx.py bench [--threads 1 2 4] [--candidates 20]
+"""
+import argparse
+import csv
+import inspect
+import json
+import time
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config_cgi import (
+    PROJECT_ROOT,
+    RERANK_BACKEND,
+    RERANK_MAX_LENGTH,
+    RERANK_MODEL,
+    RERANK_ONNX_DIR,
+    RERANK_THREADS,
+    RERANK_TORCH_DIR,
+)
+
+ONNX_FILE = "model.onnx"
+META_FILE = "meta.json"
+
+
+# =========================
+# 1) Export (une fois, avec accès au hub)
+# =========================
+
+def export_model(
+    model_name: str = RERANK_MODEL,
+    onnx_dir: Path = RERANK_ONNX_DIR,
+    torch_dir: Path = RERANK_TORCH_DIR,
+    max_length: int = RERANK_MAX_LENGTH,
+) -> None:
+    """
+    Écrit le bundle local :
+      - torch_dir : modèle sentence-transformers d'origine (repli fp32 hors ligne) ;
+      - onnx_dir  : model.onnx (int8 dynamique), tokenizer.json, meta.json.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import CrossEncoder
+
+    onnx_dir, torch_dir = Path(onnx_dir), Path(torch_dir)
+    ce = CrossEncoder(model_name, max_length=max_length)
+    torch_dir.mkdir(parents=True, exist_ok=True)
+    ce.save(str(torch_dir))
+    print(f"💾 Modèle PyTorch : {torch_dir}")
+
+    onnx_dir.mkdir(parents=True, exist_ok=True)
+    ce.tokenizer.save_pretrained(str(onnx_dir))
+    model = ce.model.eval()
+    sample = ce.tokenizer([("question", "texte du chunk")], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    fp32_path = onnx_dir / "model_fp32.onnx"
+    # exporteur TorchScript : l'exporteur dynamo (défaut des torch récents) exige onnxscript
+    # et son graphe échoue à l'inférence de formes de quantize_dynamic
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[n] for n in names),
+            str(fp32_path),
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes={**{n: {0: "batch", 1: "seq"} for n in names}, "logits": {0: "batch"}},
+            opset_version=17,
+            **legacy,
+        )
+    # int8 dynamique : poids des Linear quantifiés, activations quantifiées à la volée
+    quantize_dynamic(str(fp32_path), str(onnx_dir / ONNX_FILE), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+
+    # même activation de sortie que CrossEncoder.predict (scores comparables)
+    act = getattr(ce, "activation_fn", None) or getattr(ce, "default_activation_function", None)
+    meta = {
+        "model": model_name,
+        "max_length": max_length,
+        "activation": "sigmoid" if isinstance(act, torch.nn.Sigmoid) else "identity",
+        "inputs": names,
+        "quantization": "dynamic int8 (QInt8)",
+    }
+    (onnx_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    size = (onnx_dir / ONNX_FILE).stat().st_size / 1e6
+    print(f"💾 ONNX int8 : {onnx_dir / ONNX_FILE} ({size:.1f} Mo), activation={meta['activation']}")
+
+
+def onnx_bundle_available(onnx_dir: Path = RERANK_ONNX_DIR) -> bool:
+    onnx_dir = Path(onnx_dir)
+    return all((onnx_dir / f).exists() for f in (ONNX_FILE, "tokenizer.json", META_FILE))
+
+
+# =========================
+# 2) Inférence ONNX
+# =========================
+
+class OnnxCrossEncoder:
+    """
+    Cross-encoder ONNX (onnxruntime + tokenizers), interface de
+    `sentence_transformers.CrossEncoder.predict`.
+    """
+
+    def __init__(self, onnx_dir: Path = RERANK_ONNX_DIR, threads: Optional[int] = RERANK_THREADS,
+                 max_length: Optional[int] = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        onnx_dir = Path(onnx_dir)
+        self.meta = json.loads((onnx_dir / META_FILE).read_text(encoding="utf-8"))
+        self.max_length = max_length or self.meta.get("max_length", RERANK_MAX_LENGTH)
+
+        self.tokenizer = Tokenizer.from_file(str(onnx_dir / "tokenizer.json"))
+        self.tokenizer.no_padding()  # padding fait par lot, après tri par longueur
+        self.tokenizer.enable_truncation(self.max_length, strategy="longest_first")
+        pad_id = self.tokenizer.token_to_id("[PAD]")
+        self.pad_id = 0 if pad_id is None else pad_id
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.inter_op_num_threads = 1
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(onnx_dir / ONNX_FILE), opts, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.sigmoid = self.meta.get("activation") == "sigmoid"
+
+    def _feed(self, encodings: Sequence[Any]) -> dict:
+        width = max(len(e.ids) for e in encodings)
+        ids = np.full((len(encodings), width), self.pad_id, dtype="int64")
+        mask = np.zeros((len(encodings), width), dtype="int64")
+        types = np.zeros((len(encodings), width), dtype="int64")
+        for i, e in enumerate(encodings):
+            n = len(e.ids)
+            ids[i, :n] = e.ids
+            mask[i, :n] = 1
+            types[i, :n] = e.type_ids
+        arrays = {"input_ids": ids, "attention_mask": mask, "token_type_ids": types}
+        return {name: arrays[name] for name in self.input_names}
+
+    def predict(self, pairs: Iterable[Tuple[str, str]], batch_size: int = 32, **_) -> np.ndarray:
+        """
+        Scores des paires (question, texte), dans l'ordre des paires.
+        """
+        pairs = [(q, t or "") for q, t in pairs]
+        scores = np.empty(len(pairs), dtype="float32")
+        if not pairs:
+            return scores
+        encodings = self.tokenizer.encode_batch(pairs)
+        order = np.argsort([len(e.ids) for e in encodings], kind="stable")
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            logits = self.session.run(None, self._feed([encodings[i] for i in rows]))[0]
+            scores[rows] = logits[:, 0]
+        if self.sigmoid:
+            scores = 1.0 / (1.0 + np.exp(-scores))
+        return scores
+
+
+def _torch_cross_encoder():
+    from sentence_transformers import CrossEncoder
+
+    # bundle local s'il existe : pas d'accès au hub au démarrage
+    source = RERANK_TORCH_DIR if (Path(RERANK_TORCH_DIR) / "config.json").exists() else RERANK_MODEL
+    return CrossEncoder(str(source), max_length=RERANK_MAX_LENGTH)
+
+
+def load_cross_encoder(backend: str = RERANK_BACKEND, threads: Optional[int] = RERANK_THREADS):
+    """
+    Cross-encoder du retriever : "onnx", "torch" ou "auto" (ONNX si disponible).
+    """
+    if backend not in ("auto", "onnx", "torch"):
+        raise ValueError(f"RERANK_BACKEND inconnu : {backend}")
+    if backend != "torch":
+        if onnx_bundle_available():
+            try:
+                return OnnxCrossEncoder(threads=threads)
+            except ImportError as e:
+                if backend == "onnx":
+                    raise
+                print(f"⚠️ onnxruntime / tokenizers indisponibles ({e}) : rerank PyTorch")
+        elif backend == "onnx":
+            raise FileNotFoundError(f"{RERANK_ONNX_DIR} incomplet : lancer `python rerank_onnx.py export`")
+    return _torch_cross_encoder()
+
+
+# =========================
+# 3) Bench latence / accord vs PyTorch fp32
+# =========================
+
+def _ranks(x: np.ndarray) -> np.ndarray:
+    return np.argsort(np.argsort(-x, kind="stable"), kind="stable").astype("float64")
+
+
+def _spearman(a: np.ndarray, b: np.ndarray) -> float:
+    ra, rb = _ranks(a), _ranks(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return 1.0
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def _bench_pairs(questions_path: Path, n_candidates: int) -> List[List[Tuple[str, str]]]:
+    """
+    Pour chaque question de all_questions.csv : ses `n_candidates` meilleurs chunks
+    BM25 (pas d'appel d'embeddings), comme une liste de candidats à reranker.
+    """
+    from chunks_io import default_chunks_path, iter_chunks
+    from lexical_index import BM25Index
+
+    chunks = list(iter_chunks(default_chunks_path()))
+    bm25 = BM25Index(c.get("text") or "" for c in chunks)
+    with questions_path.open(encoding="utf-8") as f:
+        questions = [row["question"] for row in csv.DictReader(f, delimiter=";") if row.get("question")]
+    return [[(q, chunks[row].get("text") or "") for row, _ in bm25.search(q, n_candidates)] for q in questions]
+
+
+def _timed(model, per_query: List[List[Tuple[str, str]]], batch_size: int):
+    model.predict(per_query[0], batch_size=batch_size)  # chauffe
+    scores, times = [], []
+    for pairs in per_query:
+        t0 = time.perf_counter()
+        scores.append(np.asarray(model.predict(pairs, batch_size=batch_size), dtype="float32"))
+        times.append((time.perf_counter() - t0) * 1e3)
+    return scores, np.array(times)
+
+
+def bench(threads: Sequence[Optional[int]], n_candidates: int, batch_size: int, questions_path: Path) -> None:
+    per_query = [p for p in _bench_pairs(questions_path, n_candidates) if p]
+    print(f"📦 {len(per_query)} questions × ≤ {n_candidates} candidats")
+
+    ref, t_ref = _timed(_torch_cross_encoder(), per_query, batch_size)
+    print(f"torch fp32        : p50 {np.percentile(t_ref, 50):7.1f} ms  p99 {np.percentile(t_ref, 99):7.1f} ms")
+
+    for n in threads:
+        scores, t = _timed(OnnxCrossEncoder(threads=n), per_query, batch_size)
+        rho = np.mean([_spearman(a, b) for a, b in zip(ref, scores)])
+        top1 = np.mean([np.argmax(a) == np.argmax(b) for a, b in zip(ref, scores)])
+        top3 = np.mean([len(set(np.argsort(-a)[:3]) & set(np.argsort(-b)[:3])) / min(3, len(a))
+                        for a, b in zip(ref, scores)])
+        err = max(float(np.abs(a - b).max()) for a, b in zip(ref, scores))
+        print(f"onnx int8 ({n or 'auto'} thr) : p50 {np.percentile(t, 50):7.1f} ms  p99 {np.percentile(t, 99):7.1f} ms  "
+              f"x{np.percentile(t_ref, 50) / np.percentile(t, 50):4.1f}  spearman {rho:.3f}  "
+              f"top1 {top1:.2f}  top3 {top3:.2f}  |Δscore| max {err:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-encoder ONNX int8 : export du bundle local / bench")
+    parser.add_argument("cmd", choices=["export", "bench"])
+    parser.add_argument("--model", type=str, default=RERANK_MODEL)
+    parser.add_argument("--threads", type=int, nargs="+", default=[RERANK_THREADS])
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--questions", type=str, default=str(PROJECT_ROOT / "all_questions.csv"))
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        export_model(args.model)
+        return
+    if not onnx_bundle_available():
+        raise SystemExit(f"{RERANK_ONNX_DIR} incomplet : lancer `python rerank_onnx.py export`")
+    bench(args.threads, args.candidates, args.batch_size, Path(args.questions))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,56 @@
 # src/retriever_faiss.py
 
-import json
+import logging
+import time
+from collections import Counter
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-import faiss
 import numpy as np
 from dotenv import load_dotenv
 from openai import OpenAI
-from sentence_transformers import CrossEncoder
 
+from ann_index import load_index, load_meta, reconstruct_ids, search_parameters
+from article_refs import cited_chunk_ids, question_articles
+from binary_index import BinaryIndex, binary_index_available
+from chunk_filters import ChunkAttributes, filter_key, id_selector, rows_mask
+from chunk_index import FaissRowMap
+from chunk_store import ChunkStore, is_stale
+from chunks_io import default_chunks_path, iter_chunks
+from embed_batches import embed_request
+from embedding_cache import embed_cached
 from config_cgi import (
-    CHUNKS_PATH,
+    BINARY_RESCORE_K,
+    BM25_TOP_K,
+    CHUNK_STORE_PATH,
     FAISS_INDEX_PATH,
+    MMR_FETCH_K,
+    MMR_LAMBDA,
     OPENAI_EMBED_MODEL,
     ENV_PATH,
+    PASSAGE_INDEX_PATH,
+    PASSAGE_WINDOW_ONLY,
+    PASSAGES_PATH,
+    RERANK_BATCH_SIZE,
+    RERANK_CASCADE_LOG_EVERY,
+    RERANK_CASCADE_PATH,
+    RRF_K,
+    USE_ARTICLE_FAST_PATH,
+    USE_BINARY_SEARCH,
+    USE_HYBRID,
+    USE_MMR,
+    USE_PASSAGES,
+    USE_RERANK_CASCADE,
 )
+from lexical_index import BM25Index, article_rows, rank_article_rows, rrf, single_block
+from mmr import mmr_order
+from passages import passage_embedding_text, passage_text
+from rerank_cascade import faiss_margin, load_cascade, rerank_spread
+from rerank_onnx import load_cross_encoder
+from versioned_index import VersionedStore, versioned_index_available
+
+_log = logging.getLogger(__name__)
 
 # =========================
 # 1) Chargement config & clients
@@ -25,45 +60,170 @@ from config_cgi import (
 load_dotenv(ENV_PATH)
 client = OpenAI()
 
-# Charger les chunks JSON (liste de dict)
-CHUNKS_PATH = Path(CHUNKS_PATH)
-with CHUNKS_PATH.open("r", encoding="utf-8") as f:
-    CHUNKS: List[Dict[str, Any]] = json.load(f)
-
-# Charger l’index FAISS
+# Charger les chunks, alignés sur FAISS (ligne i = chunk i) :
+#  - store compact en mmap s'il est à jour (rien n'est parsé au démarrage) ;
+#  - sinon JSONL du corpus / ancien JSON chargé en liste de dict.
+CHUNKS_PATH = default_chunks_path()
+if not is_stale(CHUNK_STORE_PATH, CHUNKS_PATH):
+    CHUNKS = ChunkStore(CHUNK_STORE_PATH)
+    CHUNKS_BY_ID = CHUNKS  # store.get(chunk_id) : O(1)
+else:
+    if Path(CHUNK_STORE_PATH).exists():
+        print(f"⚠️ {CHUNK_STORE_PATH} plus ancien que {CHUNKS_PATH} : lancer chunk_store.py")
+    CHUNKS = list(iter_chunks(CHUNKS_PATH))
+    CHUNKS_BY_ID = {c["id"]: c for c in CHUNKS}
+
+# Charger l’index FAISS des chunks (sections entières) ; type d'index et
+# paramètres de recherche (nprobe / efSearch) lus dans <index>.meta.json
 FAISS_INDEX_PATH = Path(FAISS_INDEX_PATH)
-faiss_index = faiss.read_index(str(FAISS_INDEX_PATH))
+faiss_index = load_index(FAISS_INDEX_PATH) if FAISS_INDEX_PATH.exists() else None
+
+# Index à ids stables (chunk_index.py) : id FAISS → ligne de CHUNKS
+faiss_rows = None
+if faiss_index is not None and load_meta(FAISS_INDEX_PATH).get("id_map"):
+    if isinstance(CHUNKS, ChunkStore):
+        faiss_rows = FaissRowMap(CHUNKS.id_at(i) for i in range(len(CHUNKS)))  # ids sans lire les blocs
+    else:
+        faiss_rows = FaissRowMap(c["id"] for c in CHUNKS)
+
+# Recherche en deux temps (Hamming 1 bit → rescoring float32 en mmap), mêmes lignes que FAISS
+binary_index = BinaryIndex() if USE_BINARY_SEARCH and binary_index_available() else None
+
+# Index des passages (small-to-big) : 1 ligne FAISS = 1 passage de PASSAGES
+passage_index = None
+PASSAGES: List[Dict[str, Any]] = []
+if USE_PASSAGES and Path(PASSAGE_INDEX_PATH).exists() and Path(PASSAGES_PATH).exists():
+    passage_index = load_index(PASSAGE_INDEX_PATH)
+    PASSAGES = list(iter_chunks(PASSAGES_PATH))
+
+if faiss_index is None and passage_index is None:
+    raise FileNotFoundError(
+        f"Aucun index FAISS trouvé ({FAISS_INDEX_PATH} / {PASSAGE_INDEX_PATH}). "
+        "Lancer build_faiss_index.py."
+    )
+
+# Dimension d'embedding de chaque index (None = native), imposée aux questions,
+# et métrique (sens des scores FAISS pour la cascade de rerank)
+CHUNK_DIMS = load_meta(FAISS_INDEX_PATH).get("dims")
+PASSAGE_DIMS = load_meta(PASSAGE_INDEX_PATH).get("dims")
+FAISS_METRIC = load_meta(FAISS_INDEX_PATH).get("metric", "l2")
+PASSAGE_METRIC = load_meta(PASSAGE_INDEX_PATH).get("metric", "l2")
+
+# Compteurs du rerank (chemins de la cascade, paires scorées / évitées, temps)
+RERANK_STATS: Counter = Counter()
 
 # Cross-encoder (reranker) – lazy load
-_CROSS_ENCODER: CrossEncoder | None = None
+_CROSS_ENCODER = None
 
 
-def _get_cross_encoder() -> CrossEncoder:
+def _get_cross_encoder():
     """
-    Charge le modèle de rerank une seule fois (lazy).
+    Charge le modèle de rerank une seule fois (lazy) : ONNX int8 du bundle local
+    (data/models) s'il existe, sinon sentence-transformers (RERANK_BACKEND).
     """
     global _CROSS_ENCODER
     if _CROSS_ENCODER is None:
-        # Modèle standard pour le rerank, rapide et efficace
-        _CROSS_ENCODER = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+        _CROSS_ENCODER = load_cross_encoder()
     return _CROSS_ENCODER
 
 
+@lru_cache(maxsize=2)
+def _lexical_index(passages: bool) -> BM25Index:
+    """
+    BM25 aligné sur l'index FAISS interrogé (chunks ou passages), construit au
+    premier appel.
+    """
+    if not passages:
+        return BM25Index(c.get("text") or "" for c in CHUNKS)
+    texts = []
+    for p in PASSAGES:
+        chunk = CHUNKS_BY_ID.get(p["chunk_id"])
+        texts.append(passage_embedding_text(chunk, p) if chunk is not None else "")
+    return BM25Index(texts)
+
+
+@lru_cache(maxsize=1)
+def _article_rows() -> Dict[str, List[int]]:
+    return article_rows(CHUNKS)
+
+
+@lru_cache(maxsize=1)
+def _versioned_store() -> VersionedStore:
+    """
+    Éditions du CGI (versioned_index.py), chargées à la première recherche `as_of`.
+    """
+    if not versioned_index_available():
+        raise FileNotFoundError("Aucun index versionné : lancer versioned_index.py add <année> --chunks ...")
+    return VersionedStore()
+
+
+@lru_cache(maxsize=1)
+def _versioned_bm25() -> BM25Index:
+    return BM25Index(c.get("text") or "" for c in _versioned_store().records)
+
+
+@lru_cache(maxsize=1)
+def _chunk_attributes() -> ChunkAttributes:
+    return ChunkAttributes(CHUNKS)
+
+
+@lru_cache(maxsize=32)
+def _row_filter(key: tuple) -> Dict[str, Any]:
+    """
+    Filtre de métadonnées compilé (une fois par filtre distinct) : masque des chunks
+    admissibles et paramètres de recherche (IDSelector) de chaque index.
+    """
+    attrs = _chunk_attributes()
+    bitmap = attrs.bitmap(key)
+    mask = attrs.mask(key)
+    out: Dict[str, Any] = {"chunks": mask, "n_chunks": int(mask.sum())}
+    if faiss_index is not None:
+        ids = faiss_rows.ids if faiss_rows is not None else None
+        out["faiss_params"] = search_parameters(faiss_index, id_selector(bitmap, attrs.n, ids))
+    if binary_index is not None:
+        out["binary_sel"] = id_selector(bitmap, attrs.n)
+    if passage_index is not None:
+        # passage admissible = chunk parent admissible
+        if isinstance(CHUNKS, ChunkStore):
+            parent = [CHUNKS.row_of(p["chunk_id"]) for p in PASSAGES]
+        else:
+            row_of = {c["id"]: i for i, c in enumerate(CHUNKS)}
+            parent = [row_of.get(p["chunk_id"]) for p in PASSAGES]
+        pmask = rows_mask(mask, [-1 if r is None else r for r in parent])
+        out["passages"] = pmask
+        out["passage_params"] = search_parameters(
+            passage_index, id_selector(np.packbits(pmask, bitorder="little"), len(pmask))
+        )
+    return out
+
+
 # =========================
 # 2) Embeddings OpenAI
 # =========================
 
-def _embed_texts(texts: List[str]) -> np.ndarray:
+def _embed_texts(texts: List[str], dims: Optional[int] = None) -> np.ndarray:
     """
-    Calcule les embeddings OpenAI pour une liste de textes.
+    Calcule les embeddings OpenAI pour une liste de textes (via le cache partagé :
+    une question déjà posée ne repart pas à l'API).
+    `dims` : dimension de l'index interrogé (embeddings tronqués).
     Retourne un array numpy [n, d].
     """
-    resp = client.embeddings.create(
-        model=OPENAI_EMBED_MODEL,
-        input=texts,
-    )
-    vectors = [d.embedding for d in resp.data]
-    return np.array(vectors, dtype="float32")
+    return embed_cached(texts, lambda missing: embed_request(client, OPENAI_EMBED_MODEL, missing, dims=dims),
+                        OPENAI_EMBED_MODEL, dims=dims)
+
+
+def _embed_questions(questions: List[str], index, dims: Optional[int]) -> np.ndarray:
+    """
+    Embeddings [n, d] des questions (une seule requête pour toutes les questions
+    absentes du cache), à la dimension de l'index interrogé.
+    """
+    q_vecs = _embed_texts(questions, dims).reshape(len(questions), -1)
+    if q_vecs.shape[1] != index.d:
+        raise ValueError(
+            f"Question embeddée en dim={q_vecs.shape[1]}, index en dim={index.d} : "
+            "méta de l'index absente ou incohérente, relancer build_faiss_index.py."
+        )
+    return q_vecs
 
 
 # =========================
@@ -75,13 +235,26 @@ def search_chunks(
     k: int = 3,
     use_rerank: bool = True,
     faiss_top_k: int = 20,
+    use_passages: bool = USE_PASSAGES,
+    window_only: bool = PASSAGE_WINDOW_ONLY,
+    rescore_k: int = BINARY_RESCORE_K,
+    hybrid: bool = USE_HYBRID,
+    article_fast_path: bool = USE_ARTICLE_FAST_PATH,
+    cascade: bool = USE_RERANK_CASCADE,
+    filters: Optional[Dict[str, Any]] = None,
+    as_of: Optional[int] = None,
+    mmr: bool = USE_MMR,
+    mmr_lambda: float = MMR_LAMBDA,
 ) -> List[Dict[str, Any]]:
     """
     Recherche des chunks pertinents avec FAISS + rerank (cross-encoder).
 
     Logique :
-      - FAISS → récupère `faiss_top_k` candidats (ex : 20).
-      - Cross-encoder → rerank ces candidats.
+      - Question qui nomme un article connu ("article 247") → chunks de cet article,
+        directement (ni embedding, ni FAISS, ni rerank).
+      - Sinon FAISS (+ BM25 fusionné par RRF) → `faiss_top_k` candidats (ex : 20).
+      - Cross-encoder → rerank ces candidats (en cascade si calibrée : tout, une
+        partie ou aucun selon l'écart des scores).
       - On renvoie les `k` meilleurs au moteur (ex : 3).
 
     Args
@@ -94,6 +267,38 @@ def search_chunks(
         Si False : on ne fait que FAISS.
     faiss_top_k : int
         Nombre de candidats à récupérer d’abord via FAISS.
+    use_passages : bool
+        Si True et que l'index des passages existe : FAISS + rerank se font sur des
+        passages bornés en tokens, puis chaque hit est remonté vers son chunk parent.
+    window_only : bool
+        (mode passages) Si True : "chunk" ne contient que la fenêtre du passage.
+    rescore_k : int
+        (index binaire) Nombre de candidats Hamming rescorés avec les vecteurs float.
+    hybrid : bool
+        Si True : les `BM25_TOP_K` meilleurs candidats BM25 sont fusionnés (RRF) à ceux
+        de FAISS avant le rerank (numéros, taux, termes exacts).
+    article_fast_path : bool
+        Si True : les questions qui citent un article existant sont servies par le
+        dictionnaire article → chunks.
+    cascade : bool
+        Si True et que les seuils sont calibrés (rerank_cascade.py) : rerank sauté
+        quand l'écart FAISS est décisif, sinon limité aux premiers candidats tant
+        que leurs scores sont bien séparés.
+    filters : dict | None
+        Filtre de métadonnées appliqué dans la recherche FAISS (voir chunk_filters.py) :
+        {"articles": (87, 125), "livre": "LIVRE PREMIER", "source": "cgi-2025", ...}.
+        Seuls les chunks admissibles sont candidats (FAISS, BM25 et articles cités).
+    as_of : int | None
+        Année : recherche dans l'index versionné (versioned_index.py), parmi les
+        versions des articles en vigueur dans l'édition applicable (la dernière ≤ as_of).
+        Le dictionnaire des articles ne couvre que l'édition courante : pas de
+        raccourci "article cité" dans ce mode.
+    mmr : bool
+        Si True : après le rerank, les `MMR_FETCH_K` premiers candidats sont réordonnés
+        par MMR (mmr.py) : le meilleur reste en tête, les suivants doivent être
+        pertinents et différents des précédents. Vecteurs relus dans l'index.
+    mmr_lambda : float
+        Compromis pertinence (1) / diversité (0) de la MMR.
 
     Returns
     -------
@@ -101,62 +306,521 @@ def search_chunks(
         Liste de résultats :
         [
           {
-            "rank_faiss": int,
-            "score_faiss": float,
+            "rank_faiss": int | None,    # None : candidat apporté par BM25 seul
+            "score_faiss": float | None,
             "score_rerank": float | None,
-            "chunk": { ... }  # dict du chunk complet
+            "chunk": { ... },  # dict du chunk complet
+            "passage": {...},  # (mode passages) passage_id, start, end, text
+            "rank_bm25": int | None,     # (hybride / article)
+            "score_bm25": float | None,
+            "score_rrf": float,          # (hybride)
+            "match": "article",          # (article cité) servi sans FAISS
           },
           ...
         ]
     """
-    if k <= 0:
-        return []
-
-    # 1) Embedding de la question
-    q_vec = _embed_texts([question])[0].reshape(1, -1)
-
-    # 2) Recherche FAISS
-    k_faiss = faiss_top_k if use_rerank else k
-    distances, indices = faiss_index.search(q_vec, k_faiss)
+    return search_chunks_batch(
+        [question], k=k, use_rerank=use_rerank, faiss_top_k=faiss_top_k,
+        use_passages=use_passages, window_only=window_only, rescore_k=rescore_k,
+        hybrid=hybrid, article_fast_path=article_fast_path, cascade=cascade, filters=filters, as_of=as_of,
+        mmr=mmr, mmr_lambda=mmr_lambda,
+    )[0]
 
-    distances = distances[0]
-    indices = indices[0]
 
+def search_chunks_batch(
+    questions: List[str],
+    k: int = 3,
+    use_rerank: bool = True,
+    faiss_top_k: int = 20,
+    use_passages: bool = USE_PASSAGES,
+    window_only: bool = PASSAGE_WINDOW_ONLY,
+    rescore_k: int = BINARY_RESCORE_K,
+    rerank_batch_size: int = RERANK_BATCH_SIZE,
+    hybrid: bool = USE_HYBRID,
+    article_fast_path: bool = USE_ARTICLE_FAST_PATH,
+    cascade: bool = USE_RERANK_CASCADE,
+    filters: Optional[Dict[str, Any]] = None,
+    as_of: Optional[int] = None,
+    mmr: bool = USE_MMR,
+    mmr_lambda: float = MMR_LAMBDA,
+) -> List[List[Dict[str, Any]]]:
+    """
+    `search_chunks` pour plusieurs questions (évaluation, mode back-office) :
+      - un seul appel embeddings pour toutes les questions ;
+      - une seule recherche FAISS sur la matrice [n_questions, d] ;
+      - un seul `predict` du cross-encoder sur toutes les paires (question, candidat),
+        par lots de `rerank_batch_size`.
+    Les questions servies par le dictionnaire des articles ne coûtent ni embedding
+    ni rerank. Les mêmes `filters` / `as_of` s'appliquent à toutes les questions.
+    Retourne une liste de résultats par question, identique à `search_chunks(q)`.
+    """
+    if not questions:
+        return []
+    key = filter_key(filters)
+    store = None
+    if as_of is not None:
+        # éditions : bitset de validité précalculé (∩ filtre), sur l'index versionné
+        store = _versioned_store()
+        row_filter = store.row_filter(as_of, key)
+        article_fast_path = False
+    else:
+        row_filter = _row_filter(key) if key else None
+    if k <= 0 or (row_filter is not None and not row_filter["n_chunks"]):
+        return [[] for _ in questions]
+
+    # 0) Article cité et connu → ses chunks, sans passer par FAISS
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(questions)
+    if article_fast_path:
+        allowed = row_filter["chunks"] if row_filter is not None else None
+        for i, q in enumerate(questions):
+            results[i] = _article_results(q, k, allowed)
+    todo = [i for i, r in enumerate(results) if r is None]
+    if not todo:
+        return results
+    sub = [questions[i] for i in todo]
+    for i, res in zip(todo, _search_dense(sub, k, use_rerank, faiss_top_k, use_passages,
+                                           window_only, rescore_k, rerank_batch_size, hybrid, cascade,
+                                           row_filter, store, mmr_lambda if mmr else None)):
+        results[i] = res
+    return results
+
+
+def _search_dense(
+    questions: List[str],
+    k: int,
+    use_rerank: bool,
+    faiss_top_k: int,
+    use_passages: bool,
+    window_only: bool,
+    rescore_k: int,
+    rerank_batch_size: int,
+    hybrid: bool,
+    cascade: bool,
+    row_filter: Optional[Dict[str, Any]] = None,
+    store: Optional[VersionedStore] = None,
+    mmr_lambda: Optional[float] = None,
+) -> List[List[Dict[str, Any]]]:
+    passages_mode = store is None and ((use_passages and passage_index is not None) or faiss_index is None)
+    if use_rerank:
+        k_faiss = faiss_top_k
+    else:
+        # plusieurs passages peuvent venir du même chunk → on prend plus large sans rerank
+        k_faiss = max(k * 4, k) if passages_mode else k
+    if mmr_lambda is not None:
+        k_faiss = max(k_faiss, MMR_FETCH_K)  # la MMR choisit parmi MMR_FETCH_K candidats
+    per_question, text_of, mode = _dense_candidates(questions, k_faiss, use_passages, rescore_k, hybrid,
+                                                    row_filter, store)
+
+    # Si pas de rerank → on garde juste les k premiers (FAISS / RRF)
+    if use_rerank:
+        # Rerank avec cross-encoder (complet ou en cascade), trié décroissant sur le score rerank
+        policy = _cascade_policy(mode) if cascade else None
+        if policy is not None:
+            _rerank_cascade(questions, per_question, text_of, rerank_batch_size, policy,
+                            FAISS_METRIC if mode == "chunks" else PASSAGE_METRIC)
+        else:
+            _rerank(questions, per_question, text_of, rerank_batch_size)
+            RERANK_STATS["full"] += len(questions)
+        _log_rerank_stats(len(questions))
+
+    # Diversification MMR des premiers candidats (vecteurs relus dans l'index)
+    if mmr_lambda is not None:
+        per_question = _diversify(questions, per_question, mode, store, mmr_lambda)
+    for cands in per_question:
+        for c in cands:
+            c.pop("_row", None)
+
+    # Retourner les k meilleurs au moteur
+    if mode == "passages":
+        return [_to_parent_chunks(c, k, window_only) for c in per_question]
+    return [c[:k] for c in per_question]
+
+
+def _vector_source(mode: str, store: Optional[VersionedStore] = None):
+    """
+    (index interrogé, dims, vecteurs des lignes) pour un mode de recherche : les
+    vecteurs des candidats sont relus dans l'index (reconstruct), pas réembeddés.
+    """
+    if store is not None:
+        return store.index, store.dims, lambda rows: reconstruct_ids(store.index, store.rows.ids[rows])
+    if mode == "passages":
+        return passage_index, PASSAGE_DIMS, lambda rows: reconstruct_ids(passage_index, rows)
+    if binary_index is not None:
+        return faiss_index, CHUNK_DIMS, lambda rows: np.asarray(binary_index.vectors[rows], dtype="float32")
+    if faiss_rows is not None:
+        return faiss_index, CHUNK_DIMS, lambda rows: reconstruct_ids(faiss_index, faiss_rows.ids[rows])
+    return faiss_index, CHUNK_DIMS, lambda rows: reconstruct_ids(faiss_index, rows)
+
+
+def _diversify(
+    questions: List[str],
+    per_question: List[List[Dict[str, Any]]],
+    mode: str,
+    store: Optional[VersionedStore],
+    lambda_: float,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Réordonne les `MMR_FETCH_K` premiers candidats de chaque question par MMR (le
+    premier du rerank reste en tête) ; la suite garde son ordre. Embeddings des
+    questions servis par le cache (déjà calculés pour la recherche).
+    Après un rerank, pertinence = score du cross-encoder et seuls les candidats
+    scorés sont réordonnés (cascade "head" : la queue non scorée reste derrière).
+    """
+    index, dims, vectors_of = _vector_source(mode, store)
+    q_vecs = _embed_questions(questions, index, dims)
+    out = []
+    for q_vec, cands in zip(q_vecs, per_question):
+        n = min(len(cands), MMR_FETCH_K)
+        scored = next((i for i, c in enumerate(cands[:n]) if c.get("score_rerank") is None), n)
+        head = cands[:scored or n]
+        if len(head) < 3:
+            out.append(cands)
+            continue
+        relevance = [c["score_rerank"] for c in head] if scored else None
+        vectors = vectors_of(np.array([c["_row"] for c in head], dtype="int64"))
+        out.append([head[i] for i in mmr_order(q_vec, vectors, lambda_, relevance=relevance)] + cands[len(head):])
+    return out
+
+
+def chunk_vectors(chunks: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Vecteurs [n, d] de chunks du corpus courant, relus dans l'index des chunks
+    (mesure de redondance d'un contexte, voir mmr.py).
+    """
+    if faiss_index is None:
+        raise ValueError(f"{FAISS_INDEX_PATH} absent : pas de vecteurs de chunks")
+    if isinstance(CHUNKS, ChunkStore):
+        rows = [CHUNKS.row_of(c["id"]) for c in chunks]
+    else:
+        row_of = _chunk_row_of()
+        rows = [row_of[c["id"]] for c in chunks]
+    return _vector_source("chunks")[2](np.array(rows, dtype="int64"))
+
+
+@lru_cache(maxsize=1)
+def _chunk_row_of() -> Dict[Any, int]:
+    return {c["id"]: i for i, c in enumerate(CHUNKS)}
+
+
+def _dense_candidates(
+    questions: List[str],
+    k_faiss: int,
+    use_passages: bool = USE_PASSAGES,
+    rescore_k: int = BINARY_RESCORE_K,
+    hybrid: bool = USE_HYBRID,
+    row_filter: Optional[Dict[str, Any]] = None,
+    store: Optional[VersionedStore] = None,
+):
+    """
+    Candidats avant rerank, dans l'ordre FAISS (ou RRF si `hybrid`).
+    `row_filter` (`_row_filter`) : seules les lignes admissibles sont scorées.
+    `store` : recherche dans l'index versionné (`row_filter` = versions en vigueur).
+    Retourne (candidats par question, texte à reranker d'un candidat, "chunks" | "passages").
+    """
+    rf = row_filter or {}
+    if store is not None:
+        q_vecs = _embed_questions(questions, store.index, store.dims)
+        distances, indices = store.index.search(q_vecs, k_faiss, params=rf.get("faiss_params"))
+        indices = store.rows.rows(indices)
+        per_question = [
+            _candidates(q, I, D, store.candidate, k_faiss, _versioned_bm25() if hybrid else None, rf.get("chunks"))
+            for q, I, D in zip(questions, indices, distances)
+        ]
+        return per_question, lambda c: c["chunk"].get("text", ""), "chunks"
+
+    # 1) Embeddings des questions (dimension de l'index interrogé)
+    if (use_passages and passage_index is not None) or faiss_index is None:
+        q_vecs = _embed_questions(questions, passage_index, PASSAGE_DIMS)
+        distances, indices = passage_index.search(q_vecs, k_faiss, params=rf.get("passage_params"))
+        per_question = [
+            _candidates(q, I, D, _passage_candidate, k_faiss, _lexical_index(True) if hybrid else None,
+                        rf.get("passages"))
+            for q, I, D in zip(questions, indices, distances)
+        ]
+        # Rerank sur des passages courts : plus de troncature silencieuse du cross-encoder
+        return per_question, lambda c: c["_rerank_text"], "passages"
+
+    q_vecs = _embed_questions(questions, faiss_index, CHUNK_DIMS)
+
+    # 2) Recherche FAISS (+ BM25 fusionné par RRF)
+    if binary_index is not None:
+        distances, indices = binary_index.search(q_vecs, k_faiss, rescore_k=rescore_k, sel=rf.get("binary_sel"))
+    else:
+        distances, indices = faiss_index.search(q_vecs, k_faiss, params=rf.get("faiss_params"))
+        if faiss_rows is not None:
+            indices = faiss_rows.rows(indices)
+    per_question = [
+        _candidates(q, I, D, _chunk_candidate, k_faiss, _lexical_index(False) if hybrid else None,
+                    rf.get("chunks"))
+        for q, I, D in zip(questions, indices, distances)
+    ]
+    return per_question, lambda c: c["chunk"].get("text", ""), "chunks"
+
+
+def _article_results(question: str, k: int, allowed: Optional[np.ndarray] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Chunks des articles nommés dans la question (None si aucun n'existe dans le
+    corpus ou n'est admis par le filtre `allowed`, ou si un article couvre plusieurs
+    blocs du document : recherche dense). Dans chaque article le titre vient en tête,
+    les suites sont classées par BM25 ; plusieurs articles sont servis à tour de rôle
+    ("articles 6 et 7" → 6, 7, 6, ...).
+    """
+    rows_by_article = _article_rows()
+    if not all(single_block(rows_by_article[a]) for a in question_articles(question) if a in rows_by_article):
+        return None
+    if allowed is not None:
+        rows_by_article = {a: [r for r in rows_by_article[a] if allowed[r]]
+                           for a in question_articles(question) if a in rows_by_article}
+    articles = [a for a in question_articles(question) if rows_by_article.get(a)]
+    if not articles:
+        return None
+    bm25 = _lexical_index(False)
+    queues = [rank_article_rows(bm25, question, rows_by_article[a], k) for a in articles]
+    results: List[Dict[str, Any]] = []
+    depth = 0
+    while len(results) < k and any(depth < len(q) for q in queues):
+        for q in queues:
+            if depth < len(q) and len(results) < k:
+                row, score = q[depth]
+                results.append(
+                    {
+                        "rank_faiss": None,
+                        "score_faiss": None,
+                        "score_rerank": None,
+                        "chunk": CHUNKS[row],
+                        "rank_bm25": depth + 1,
+                        "score_bm25": score,
+                        "match": "article",
+                    }
+                )
+        depth += 1
+    return results
+
+
+def _candidates(
+    question: str,
+    indices: np.ndarray,
+    distances: np.ndarray,
+    make,
+    limit: int,
+    bm25: Optional[BM25Index] = None,
+    allowed: Optional[np.ndarray] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Candidats d'une question : lignes FAISS, ou (si `bm25`) fusion RRF des lignes
+    FAISS et des `BM25_TOP_K` lignes BM25, tronquée à `limit`.
+    `make(row, rank_faiss, score_faiss)` → dict candidat (ou None si ligne orpheline).
+    `allowed` : masque des lignes admissibles (déjà appliqué côté FAISS, ici pour BM25).
+    """
+    # FAISS peut renvoyer -1 si pas assez de résultats
+    dense = [(int(idx), rank, float(dist))
+             for rank, (idx, dist) in enumerate(zip(indices, distances), start=1) if idx >= 0]
+    if bm25 is None:
+        candidates = []
+        for row, rank, dist in dense:
+            c = make(row, rank, dist)
+            if c is not None:
+                c["_row"] = row  # ligne de l'index (vecteur relu par la MMR)
+                candidates.append(c)
+        return candidates
+
+    hits = bm25.search(question, BM25_TOP_K, allowed=allowed)
+    by_dense = {row: (rank, dist) for row, rank, dist in dense}
+    by_bm25 = {row: (rank, score) for rank, (row, score) in enumerate(hits, start=1)}
     candidates: List[Dict[str, Any]] = []
-    for rank, (idx, dist) in enumerate(zip(indices, distances), start=1):
-        if idx < 0:
-            continue  # FAISS peut renvoyer -1 si pas assez de résultats
+    for row, score in rrf([[row for row, _, _ in dense], [row for row, _ in hits]], k=RRF_K):
+        c = make(row, *by_dense.get(row, (None, None)))
+        if c is None:
+            continue
+        c["_row"] = row
+        c["rank_bm25"], c["score_bm25"] = by_bm25.get(row, (None, None))
+        c["score_rrf"] = score
+        candidates.append(c)
+        if len(candidates) >= limit:
+            break
+    return candidates
+
+
+def _chunk_candidate(row: int, rank: Optional[int], dist: Optional[float]) -> Dict[str, Any]:
+    return {
+        "rank_faiss": rank,
+        "score_faiss": dist,
+        "score_rerank": None,
+        "chunk": CHUNKS[row],
+    }
+
+
+def _passage_candidate(row: int, rank: Optional[int], dist: Optional[float]) -> Optional[Dict[str, Any]]:
+    p = PASSAGES[row]
+    chunk = CHUNKS_BY_ID.get(p["chunk_id"])
+    if chunk is None:
+        return None
+    return {
+        "rank_faiss": rank,
+        "score_faiss": dist,
+        "score_rerank": None,
+        "chunk": chunk,
+        "passage": {
+            "passage_id": p["passage_id"],
+            "start": p["start"],
+            "end": p["end"],
+            "text": passage_text(chunk, p),
+        },
+        "_rerank_text": passage_embedding_text(chunk, p),
+    }
+
+
+def _rerank(questions: List[str], per_question: List[List[Dict[str, Any]]], text_of, batch_size: int) -> None:
+    """
+    Score toutes les paires (question, candidat) en un seul `predict`, puis trie
+    chaque liste par score rerank décroissant (en place).
+    """
+    pairs = [(q, text_of(c)) for q, cands in zip(questions, per_question) for c in cands]
+    if not pairs:
+        return
+    t0 = time.perf_counter()
+    scores = _get_cross_encoder().predict(pairs, batch_size=batch_size)
+    RERANK_STATS["rerank_ms"] += (time.perf_counter() - t0) * 1e3
+    RERANK_STATS["pairs_scored"] += len(pairs)
+    pos = 0
+    for cands in per_question:
+        for c in cands:
+            c["score_rerank"] = float(scores[pos])
+            pos += 1
+        cands.sort(key=lambda x: x["score_rerank"], reverse=True)
+
+
+@lru_cache(maxsize=2)
+def _cascade_policy(mode: str) -> Optional[Dict[str, Any]]:
+    """
+    Seuils de la cascade calibrés pour ce mode (chunks / passages), sinon None
+    (rerank complet).
+    """
+    policy = load_cascade()
+    if policy is None:
+        return None
+    if policy.get("mode") != mode:
+        print(f"⚠️ {RERANK_CASCADE_PATH} calibré en mode {policy.get('mode')} (recherche : {mode}) : "
+              "rerank complet, relancer rerank_cascade.py")
+        return None
+    return policy
+
+
+def _rerank_cascade(
+    questions: List[str],
+    per_question: List[List[Dict[str, Any]]],
+    text_of,
+    batch_size: int,
+    policy: Dict[str, Any],
+    metric: str,
+) -> None:
+    """
+    Rerank en cascade (en place, voir rerank_cascade.py) :
+      - skip   : écart FAISS rang 1 / rang k décisif → ordre FAISS / RRF conservé ;
+      - head   : rerank des `first` premiers, scores séparés → la queue reste non scorée ;
+      - extend : scores plats → rerank de la queue et tri de l'ensemble.
+    Les lots head et extend de toutes les questions font chacun un seul `predict`.
+    """
+    first = policy["first"]
+    active = []
+    for i, cands in enumerate(per_question):
+        margin = faiss_margin(cands, policy["k"], metric)
+        if margin is not None and margin >= policy["margin"]:
+            RERANK_STATS["skip"] += 1
+            RERANK_STATS["pairs_saved"] += len(cands)
+        else:
+            active.append(i)
+
+    heads = [per_question[i][:first] for i in active]
+    _rerank([questions[i] for i in active], heads, text_of, batch_size)
+
+    flat = [j for j, i in enumerate(active)
+            if len(per_question[i]) > first and rerank_spread(heads[j]) < policy["flat"]]
+    tails = [per_question[active[j]][first:] for j in flat]
+    _rerank([questions[active[j]] for j in flat], tails, text_of, batch_size)
+    extended = dict(zip(flat, tails))
+
+    for j, i in enumerate(active):
+        tail = per_question[i][first:]
+        if j in extended:
+            per_question[i] = sorted(heads[j] + extended[j], key=lambda x: x["score_rerank"], reverse=True)
+            RERANK_STATS["extend"] += 1
+        else:
+            per_question[i] = heads[j] + tail  # queue non scorée (score_rerank None)
+            RERANK_STATS["head"] += 1
+            RERANK_STATS["pairs_saved"] += len(tail)
+
+
+def rerank_stats() -> Dict[str, Any]:
+    """
+    Compteurs du rerank depuis le démarrage : questions par chemin (full / skip /
+    head / extend), paires scorées / évitées, temps de rerank et gain estimé
+    (paires évitées × coût moyen d'une paire).
+    """
+    stats = {key: RERANK_STATS.get(key, 0) for key in ("full", "skip", "head", "extend", "pairs_scored", "pairs_saved")}
+    ms_per_pair = RERANK_STATS["rerank_ms"] / RERANK_STATS["pairs_scored"] if RERANK_STATS["pairs_scored"] else 0.0
+    stats["rerank_ms"] = RERANK_STATS["rerank_ms"]
+    stats["saved_ms"] = stats["pairs_saved"] * ms_per_pair
+    return stats
+
+
+def _log_rerank_stats(n_new: int) -> None:
+    total = sum(RERANK_STATS[p] for p in ("full", "skip", "head", "extend"))
+    if total // RERANK_CASCADE_LOG_EVERY == (total - n_new) // RERANK_CASCADE_LOG_EVERY:
+        return
+    s = rerank_stats()
+    _log.info(
+        "rerank %d questions : full %d, skip %d, head %d, extend %d | paires %d scorées, %d évitées | "
+        "%.0f ms de rerank, ≈ %.0f ms économisées",
+        total, s["full"], s["skip"], s["head"], s["extend"], s["pairs_scored"], s["pairs_saved"],
+        s["rerank_ms"], s["saved_ms"],
+    )
+
 
-        chunk = CHUNKS[idx]
-        candidates.append(
+def _to_parent_chunks(candidates: List[Dict[str, Any]], k: int, window_only: bool) -> List[Dict[str, Any]]:
+    """
+    Small-to-big : remontée vers le chunk parent, dédoublonnage par chunk
+    (le meilleur passage de chaque chunk le représente).
+    """
+    results: List[Dict[str, Any]] = []
+    seen = set()
+    for c in candidates:
+        c.pop("_rerank_text", None)
+        chunk_id = c["chunk"].get("id")
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        if window_only:
+            c["chunk"] = dict(c["chunk"], text=c["passage"]["text"])
+        results.append(c)
+        if len(results) >= k:
+            break
+    return results
+
+
+def expand_references(results: List[Dict[str, Any]], k: int = 2) -> List[Dict[str, Any]]:
+    """
+    Chunks des articles cités par les résultats (index des renvois précalculé :
+    aucune recherche FAISS ni rerank supplémentaire). Retourne au plus `k` résultats
+    de la même forme, avec "cited_by" (ids des chunks qui les citent).
+    """
+    if k <= 0 or not results:
+        return []
+    extra: List[Dict[str, Any]] = []
+    for ref in cited_chunk_ids([r["chunk"].get("id") for r in results], limit=k):
+        chunk = CHUNKS_BY_ID.get(ref["chunk_id"])
+        if chunk is None:
+            continue
+        extra.append(
             {
-                "rank_faiss": rank,
-                "score_faiss": float(dist),
+                "rank_faiss": None,
+                "score_faiss": None,
                 "score_rerank": None,
                 "chunk": chunk,
+                "cited_by": ref["cited_by"],
             }
         )
-
-    if not candidates:
-        return []
-
-    # 3) Si pas de rerank → on garde juste les k premiers FAISS
-    if not use_rerank:
-        return candidates[:k]
-
-    # 4) Rerank avec cross-encoder
-    model = _get_cross_encoder()
-    pairs = [(question, c["chunk"].get("text", "")) for c in candidates]
-    scores = model.predict(pairs)
-
-    for c, s in zip(candidates, scores):
-        c["score_rerank"] = float(s)
-
-    # 5) Trie décroissant sur le score rerank
-    candidates.sort(key=lambda x: x["score_rerank"], reverse=True)
-
-    # 6) Retourner les k meilleurs au moteur
-    return candidates[:k]
+    return extra
 
 
 # =========================
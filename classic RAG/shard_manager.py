@@ -0,0 +1,416 @@
+# src/shard_manager.py
+"""
+Index répartis : un shard par corpus / version (CGI 2025, CGI 2024, autre code...),
+interrogés en parallèle puis fusionnés.
+
+    SHARDS_DIR/<nom>/shard.json          : corpus, version, chemins, résumé des métadonnées
+    SHARDS_DIR/<nom>/<nom>_faiss.index   : index FAISS du shard (+ .meta.json, <nom>_metadata.json)
+
+- ajouter un corpus = ajouter un shard (`add`) : les autres index ne bougent pas ;
+  un index déjà construit peut être enregistré tel quel (`--index`), sans ré-embedding ;
+- recherche : une requête d'embedding par dimension d'index, puis un `search` FAISS
+  par shard dans un pool de threads (FAISS relâche le GIL pendant la recherche),
+  fusion des top-k par score FAISS (même modèle d'embedding et même métrique exigés
+  pour que les scores soient comparables ; shards de dimensions différentes : fusion
+  par rangs, RRF), rerank des candidats fusionnés ;
+- routage : le résumé de chaque shard (sources, valeurs des niveaux du chemin
+  structurel, plage d'articles, corpus / version) écarte sans recherche les shards
+  qui ne peuvent pas satisfaire les filtres. Filtres = ceux de chunk_filters.py
+  (appliqués dans chaque shard) + "shard", "corpus", "version" (niveau shard).
+
+    python shard_manager.py add cgi-2025 --chunks data/json/cgi-2025_chunks.json \\
+        --index data/index/cgi-2025_faiss.index --corpus cgi --version 2025
+    python shard_manager.py add cgi-2024 --chunks data/json/cgi-2024_chunks.json --corpus cgi --version 2024
+    python shard_manager.py list
+    python shard_manager.py search "taux de l'IS" --version 2025 --livre "LIVRE PREMIER"
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ann_index import load_index, load_meta, search_parameters
+from chunk_filters import PATH_LEVELS, ChunkAttributes, filter_key, id_selector
+from chunk_index import FaissRowMap
+from chunks_io import iter_chunks
+from config_cgi import (
+    ENV_PATH,
+    OPENAI_EMBED_MODEL,
+    PROJECT_ROOT,
+    RERANK_BATCH_SIZE,
+    SHARD_WORKERS,
+    SHARDS_DIR,
+)
+from lexical_index import rrf
+
+# filtres évalués au niveau du shard (les autres sont passés à chunk_filters)
+SHARD_KEYS = ("shard", "corpus", "version")
+
+
+def _resolve(path: str) -> Path:
+    p = Path(path)
+    return p if p.is_absolute() else PROJECT_ROOT / p
+
+
+def _relative(path: Path) -> str:
+    path = Path(path).resolve()
+    try:
+        return str(path.relative_to(PROJECT_ROOT))
+    except ValueError:
+        return str(path)
+
+
+def _as_set(value: Any) -> set:
+    values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+    return {str(v) for v in values}
+
+
+# =========================
+# 1) Résumé et routage
+# =========================
+
+def shard_summary(chunks: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Valeurs présentes dans un shard, pour le routage : sources, niveaux du chemin
+    structurel (valeurs normalisées de chunk_filters) et plage des numéros d'article.
+    """
+    attrs = ChunkAttributes(chunks)
+    numbers = attrs.article_number[attrs.article_number >= 0]
+    summary: Dict[str, Any] = {"n_chunks": attrs.n, "source": attrs.values("source")}
+    for lvl in PATH_LEVELS:
+        summary[lvl] = attrs.values(lvl)
+    summary["articles"] = [int(numbers.min()), int(numbers.max())] if len(numbers) else None
+    return summary
+
+
+def split_filters(filters: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Optional[Tuple]]:
+    """
+    (filtres niveau shard, filtre chunk canonique `chunk_filters.filter_key`).
+    """
+    filters = dict(filters or {})
+    shard_filters = {name: filters.pop(name, None) for name in SHARD_KEYS}
+    return {n: v for n, v in shard_filters.items() if v is not None}, filter_key(filters)
+
+
+def may_match(info: Dict[str, Any], shard_filters: Dict[str, Any], key: Optional[Tuple]) -> bool:
+    """
+    False si le shard ne peut contenir aucun chunk admissible (d'après son résumé).
+    """
+    for name, want in shard_filters.items():
+        if str(info.get("name" if name == "shard" else name)) not in _as_set(want):
+            return False
+    summary = info.get("summary")
+    if not summary:
+        return True  # shard sans résumé : toujours interrogé
+    for name, value in key or ():
+        if name == "articles":
+            span = summary.get("articles")
+            lo, hi = value
+            if span is None or (hi is not None and hi < span[0]) or (lo is not None and lo > span[1]):
+                return False
+        elif not set(value) & set(summary.get(name, ())):
+            return False
+    return True
+
+
+# =========================
+# 2) Shard
+# =========================
+
+class Shard:
+    """
+    Un index FAISS + ses chunks (ligne FAISS, ou id stable → ligne de `chunks`).
+    """
+
+    def __init__(self, shard_dir: Path):
+        self.dir = Path(shard_dir)
+        self.info = json.loads((self.dir / "shard.json").read_text(encoding="utf-8"))
+        self.name = self.info["name"]
+        index_path = _resolve(self.info["index_path"])
+        self.meta = load_meta(index_path)
+        self.index = load_index(index_path)
+        self.chunks = list(iter_chunks(_resolve(self.info["chunks_path"])))
+        self.rows = FaissRowMap(c["id"] for c in self.chunks) if self.meta.get("id_map") else None
+        if self.rows is None and self.index.ntotal != len(self.chunks):
+            raise ValueError(f"shard {self.name} : {self.index.ntotal} vecteurs pour {len(self.chunks)} chunks, "
+                             "reconstruire l'index du shard")
+        self.metric = self.meta.get("metric", "l2")
+        self.dims = self.meta.get("dims")
+        self.embed_model = self.meta.get("embed_model", OPENAI_EMBED_MODEL)
+        self._attrs: Optional[ChunkAttributes] = None
+        self._params: Dict[Tuple, Any] = {}
+
+    def _search_params(self, key: Tuple):
+        # filtre compilé une fois par filtre distinct ; False : aucun chunk admissible
+        if key not in self._params:
+            if self._attrs is None:
+                self._attrs = ChunkAttributes(self.chunks)
+            bitmap = self._attrs.bitmap(key)
+            if not bitmap.any():
+                self._params[key] = False
+            else:
+                ids = self.rows.ids if self.rows is not None else None
+                self._params[key] = search_parameters(self.index, id_selector(bitmap, self._attrs.n, ids))
+        return self._params[key]
+
+    def search(self, q_vecs: np.ndarray, k: int, key: Optional[Tuple] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (distances, lignes de `chunks`) [n_questions, k] ; ligne -1 : pas de résultat.
+        """
+        params = self._search_params(key) if key else None
+        if params is False:
+            return (np.full((len(q_vecs), k), np.nan, dtype="float32"),
+                    np.full((len(q_vecs), k), -1, dtype="int64"))
+        D, I = self.index.search(q_vecs, k, params=params)
+        if self.rows is not None:
+            I = self.rows.rows(I)
+        return D, I
+
+
+# =========================
+# 3) Scatter-gather
+# =========================
+
+class ShardManager:
+    """
+    Shards de SHARDS_DIR, recherchés en parallèle (`search_chunks` / `search_chunks_batch` :
+    mêmes paramètres et même format de résultat que retriever_faiss, + "shard").
+    """
+
+    def __init__(self, shards_dir: Path = SHARDS_DIR, workers: int = SHARD_WORKERS):
+        shards_dir = Path(shards_dir)
+        dirs = sorted(d for d in shards_dir.iterdir() if (d / "shard.json").exists()) if shards_dir.exists() else []
+        if not dirs:
+            raise FileNotFoundError(f"Aucun shard dans {shards_dir} (python shard_manager.py add ...)")
+        self.shards = [Shard(d) for d in dirs]
+
+        # fusion par score FAISS : scores comparables entre shards
+        metrics = {s.metric for s in self.shards}
+        models = {s.embed_model for s in self.shards}
+        if len(metrics) > 1 or len(models) > 1:
+            raise ValueError(f"shards non fusionnables (métriques {sorted(metrics)}, modèles {sorted(models)}) : "
+                             "reconstruire avec le même modèle d'embedding et la même métrique")
+        self.metric = metrics.pop()
+        self.embed_model = models.pop()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="shard")
+        self._client = None
+        self._cross_encoder = None
+
+    def route(self, filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Shard], Optional[Tuple]]:
+        """
+        Shards qui peuvent satisfaire `filters`, et filtre chunk canonique à leur appliquer.
+        """
+        shard_filters, key = split_filters(filters)
+        return [s for s in self.shards if may_match(s.info, shard_filters, key)], key
+
+    def _embed(self, questions: List[str], dims: Optional[int]) -> np.ndarray:
+        from dotenv import load_dotenv
+        from openai import OpenAI
+
+        from embed_batches import embed_request
+        from embedding_cache import embed_cached
+
+        if self._client is None:
+            load_dotenv(ENV_PATH)
+            self._client = OpenAI()
+        vecs = embed_cached(questions, lambda missing: embed_request(self._client, self.embed_model, missing, dims=dims),
+                            self.embed_model, dims=dims)
+        return np.ascontiguousarray(vecs, dtype="float32").reshape(len(questions), -1)
+
+    def search_chunks(self, question: str, **kwargs) -> List[Dict[str, Any]]:
+        return self.search_chunks_batch([question], **kwargs)[0]
+
+    def search_chunks_batch(
+        self,
+        questions: List[str],
+        k: int = 3,
+        use_rerank: bool = True,
+        faiss_top_k: int = 20,
+        filters: Optional[Dict[str, Any]] = None,
+        rerank_batch_size: int = RERANK_BATCH_SIZE,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Scatter : chaque shard routé cherche ses `faiss_top_k` meilleurs (en parallèle).
+        Gather : fusion par score FAISS (par rangs si les dimensions diffèrent),
+        `faiss_top_k` candidats, rerank, top-k.
+        """
+        shards, key = self.route(filters)
+        if not questions or k <= 0 or not shards:
+            return [[] for _ in questions]
+
+        # 1) embeddings : une requête par dimension d'index distincte
+        vecs = {dims: self._embed(questions, dims) for dims in {s.dims for s in shards}}
+
+        # 2) scatter / gather
+        futures = [self._pool.submit(s.search, vecs[s.dims], faiss_top_k, key) for s in shards]
+        parts = [f.result() for f in futures]
+
+        # 3) fusion : meilleurs scores FAISS tous shards confondus ; dimensions différentes
+        #    (scores non comparables d'un espace à l'autre) → fusion par rangs (RRF)
+        fused = (self._fuse_by_rank(parts, faiss_top_k) if len({s.dims for s in shards}) > 1
+                 else self._fuse_by_score(parts, faiss_top_k))
+        per_question = []
+        for hits in fused:
+            cands = []
+            for owner, row, score in hits:
+                shard = shards[owner]
+                cands.append({
+                    "rank_faiss": len(cands) + 1,
+                    "score_faiss": score,
+                    "score_rerank": None,
+                    "chunk": shard.chunks[row],
+                    "shard": shard.name,
+                })
+            per_question.append(cands)
+
+        # 4) rerank des candidats fusionnés (un seul predict)
+        if use_rerank:
+            pairs = [(q, c["chunk"].get("text", "")) for q, cands in zip(questions, per_question) for c in cands]
+            if pairs:
+                if self._cross_encoder is None:
+                    from rerank_onnx import load_cross_encoder
+                    self._cross_encoder = load_cross_encoder()
+                scores = iter(self._cross_encoder.predict(pairs, batch_size=rerank_batch_size))
+                for cands in per_question:
+                    for c in cands:
+                        c["score_rerank"] = float(next(scores))
+                    cands.sort(key=lambda x: x["score_rerank"], reverse=True)
+        return [cands[:k] for cands in per_question]
+
+    def _fuse_by_score(self, parts: List[Tuple[np.ndarray, np.ndarray]], top_k: int) -> List[List[Tuple[int, int, float]]]:
+        """
+        [(shard, ligne, score FAISS)] par question : top_k des scores bruts, tous shards confondus.
+        """
+        D = np.hstack([d for d, _ in parts])
+        I = np.hstack([i for _, i in parts])
+        owner = np.repeat(np.arange(len(parts)), [i.shape[1] for _, i in parts])
+        worst = -np.inf if self.metric == "ip" else np.inf
+        D = np.where(I >= 0, D, worst)
+        order = np.argsort(-D if self.metric == "ip" else D, axis=1, kind="stable")[:, :top_k]
+        return [[(int(owner[j]), int(I[qi, j]), float(D[qi, j])) for j in order[qi] if I[qi, j] >= 0]
+                for qi in range(len(order))]
+
+    @staticmethod
+    def _fuse_by_rank(parts: List[Tuple[np.ndarray, np.ndarray]], top_k: int) -> List[List[Tuple[int, int, float]]]:
+        """
+        Idem par reciprocal rank fusion des classements de chaque shard (le score
+        FAISS gardé est celui du shard d'origine, à titre indicatif).
+        """
+        out = []
+        for qi in range(len(parts[0][1])):
+            rankings = [[(owner, int(row)) for row in I[qi] if row >= 0] for owner, (_, I) in enumerate(parts)]
+            raw = {(owner, int(row)): float(d) for owner, (D, I) in enumerate(parts)
+                   for d, row in zip(D[qi], I[qi]) if row >= 0}
+            out.append([(owner, row, raw[(owner, row)]) for (owner, row), _ in rrf(rankings)[:top_k]])
+        return out
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+# =========================
+# 4) Ajout d'un shard
+# =========================
+
+def add_shard(name: str, chunks_path: Path, corpus: Optional[str] = None, version: Optional[str] = None,
+              index_path: Optional[Path] = None, shards_dir: Path = SHARDS_DIR, spec: Optional[str] = None,
+              update: bool = False) -> Path:
+    """
+    Enregistre un shard : index existant (`index_path`, pas de ré-embedding) ou
+    index construit dans le dossier du shard. Écrit shard.json (atomique).
+    `update` : index du shard déjà construit → mis à jour en place (chunks modifiés
+    seulement, voir build_faiss_index.update_chunk_index).
+    """
+    shard_dir = Path(shards_dir) / name
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    chunks_path = Path(chunks_path)
+    if index_path is None:
+        from build_faiss_index import build_chunk_index, update_chunk_index
+
+        index_path = shard_dir / f"{name}_faiss.index"
+        if update and index_path.exists():
+            update_chunk_index(chunks_path, shard_dir, stem=name)
+        else:
+            kwargs = {"spec": spec} if spec else {}
+            build_chunk_index(chunks_path, shard_dir, binary=False, stem=name, **kwargs)
+
+    chunks = list(iter_chunks(chunks_path))
+    info = {
+        "name": name,
+        "corpus": corpus,
+        "version": version,
+        "chunks_path": _relative(chunks_path),
+        "index_path": _relative(index_path),
+        "summary": shard_summary(chunks),
+    }
+    out = shard_dir / "shard.json"
+    tmp = out.with_name(out.name + ".tmp")
+    tmp.write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, out)
+    return out
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Shards FAISS (un index par corpus / version)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_add = sub.add_parser("add", help="Ajoute (ou met à jour) un shard")
+    p_add.add_argument("name")
+    p_add.add_argument("--chunks", type=str, required=True)
+    p_add.add_argument("--index", type=str, default=None, help="Index existant (sinon construit dans le shard)")
+    p_add.add_argument("--corpus", type=str, default=None)
+    p_add.add_argument("--version", type=str, default=None)
+    p_add.add_argument("--index-spec", type=str, default=None)
+    p_add.add_argument("--update", action="store_true",
+                       help="Index du shard mis à jour en place (chunks modifiés seulement)")
+
+    sub.add_parser("list", help="Shards et résumé de leurs métadonnées")
+
+    p_search = sub.add_parser("search", help="Recherche scatter-gather")
+    p_search.add_argument("question")
+    p_search.add_argument("--k", type=int, default=5)
+    p_search.add_argument("--no-rerank", action="store_true")
+    for name in ("shard", "corpus", "version", "source", *PATH_LEVELS):
+        p_search.add_argument(f"--{name.replace('_', '-')}", dest=name, type=str, default=None)
+    p_search.add_argument("--articles", type=int, nargs=2, metavar=("DEBUT", "FIN"))
+    args = parser.parse_args()
+
+    if args.cmd == "add":
+        out = add_shard(args.name, _resolve(args.chunks), args.corpus, args.version,
+                        _resolve(args.index) if args.index else None, spec=args.index_spec, update=args.update)
+        print(f"💾 Shard {args.name} : {out}")
+        return
+
+    manager = ShardManager()
+    if args.cmd == "list":
+        for s in manager.shards:
+            summary = s.info.get("summary") or {}
+            print(f"📦 {s.name:15s} corpus={s.info.get('corpus')} version={s.info.get('version')} "
+                  f"{s.index.ntotal} vecteurs (dim={s.index.d}, {s.metric}) articles={summary.get('articles')} "
+                  f"livres={', '.join(summary.get('livre', []))}")
+        return
+
+    filters = {name: getattr(args, name) for name in ("shard", "corpus", "version", "source", "articles", *PATH_LEVELS)}
+    shards, _ = manager.route(filters)
+    print(f"🧭 {len(shards)} / {len(manager.shards)} shards : {', '.join(s.name for s in shards) or '-'}")
+    t0 = time.perf_counter()
+    results = manager.search_chunks(args.question, k=args.k, use_rerank=not args.no_rerank, filters=filters)
+    for r in results:
+        c = r["chunk"]
+        print(f"[{r['shard']}] {c.get('id')}  {c.get('article') or ''}  faiss={r['score_faiss']:.4f}  "
+              f"rerank={r['score_rerank']}  {(c.get('title') or '')[:60]}")
+    print(f"⏱️ {(time.perf_counter() - t0) * 1e3:.1f} ms")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
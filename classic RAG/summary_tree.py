@@ -0,0 +1,490 @@
+# src/summary_tree.py
+"""
+Arbre de résumés le long de la hiérarchie du code (Document / Livre / Titre /
+Sous-titre / Chapitre / Section / Article).
+
+Hors ligne : les chunks sont regroupés dans l'ordre du document selon leur chemin
+structurel, puis chaque nœud est résumé de bas en haut (articles à partir du texte
+des chunks, niveaux supérieurs à partir des résumés de leurs enfants).
+Chaque résumé :
+  - est borné en tokens (SUMMARY_MAX_TOKENS) ;
+  - est identifié par l'empreinte du contenu de ses enfants : au rebuild, un nœud
+    dont aucun descendant n'a changé reprend son résumé et son vecteur précédents ;
+  - est embeddé dans un index FAISS (produit scalaire sur vecteurs normalisés).
+
+En ligne : `search_tree(question)` choisit le niveau de l'arbre selon la portée de
+la question — une question large ("quelles sont les principales exonérations...")
+est servie par quelques nœuds de haut niveau, une question précise par des
+sections / articles — au lieu d'envoyer de nombreux chunks bruts au LLM.
+
+    python summary_tree.py build [--full]
+    python summary_tree.py query "quelles sont les principales exonérations de TVA ?"
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from cgi_structure import ARTICLE_RE, LEVELS, iter_with_paths
+from chunks_io import content_hash, default_chunks_path, iter_chunks
+from config_cgi import (
+    EMBED_MAX_TOKENS_PER_REQUEST,
+    ENV_PATH,
+    OPENAI_CHAT_MODEL,
+    OPENAI_EMBED_MODEL,
+    SUMMARY_INPUT_TOKENS,
+    SUMMARY_MAX_TOKENS,
+    SUMMARY_TREE_INDEX_PATH,
+    SUMMARY_TREE_PATH,
+    SUMMARY_WORKERS,
+    TREE_TOP_K,
+)
+from embed_batches import embed_request
+from embedding_cache import embed_cached
+from passages import count_tokens, pack_by_tokens, truncate_tokens
+
+# Niveaux de l'arbre, du plus général au plus fin (profondeur = position) ;
+# "annexe" (lois de finances, décrets reproduits après le code) est un frère des livres
+TREE_LEVELS = ["document", "annexe"] + LEVELS
+
+# Niveaux servis selon la portée de la question
+BROAD_LEVELS = {"document", "annexe", "livre", "titre", "sous_titre", "chapitre"}
+PRECISE_LEVELS = {"section", "article"}
+
+# Demandes explicites de synthèse ou de vue d'ensemble. Les tournures interrogatives
+# ("quelles sont les conditions...", "tous les", "les différents régimes") en sont
+# exclues : elles introduisent surtout des questions de détail (18/30 dans all_questions.csv)
+_BROAD_RE = re.compile(
+    r"\b(principa(?:l|les|ux)|ensemble|liste[rz]?|panorama|"
+    r"resume[rz]?|synthese|vue d'ensemble|globalement|en general|grandes lignes)\b"
+)
+
+# Toute modification du prompt invalide les résumés en cache
+PROMPT_VERSION = 1
+
+_client: Optional[OpenAI] = None
+
+
+def _get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        load_dotenv(ENV_PATH)
+        _client = OpenAI()
+    return _client
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower().replace("’", "'")
+
+
+# =========================
+# 1) Construction de l'arbre (structure seule)
+# =========================
+
+def build_tree(chunks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Regroupe les chunks (dans l'ordre du document) en nœuds hiérarchiques.
+
+    Un nœud est ouvert quand le chemin change à son niveau : deux "TITRE PREMIER"
+    de livres différents (ou consécutifs mais d'intitulés différents) sont deux nœuds.
+    Chaque nœud : id, level, label, parent, children (ids de nœuds), chunks
+    (ids des chunks rattachés directement) et leurs (texte, empreinte, tokens).
+    Les nœuds sont retournés parents avant enfants.
+    """
+    nodes: List[Dict[str, Any]] = []
+    roots: Dict[str, Dict[str, Any]] = {}
+    stack: List[Dict[str, Any]] = []
+
+    def _open(level: str, value: str, label: str, parent: Optional[Dict[str, Any]]):
+        base = f"{parent['id'] if parent else ''}/{level}:{label}"
+        siblings = parent["children"] if parent else []
+        node = {
+            "id": "n_" + hashlib.sha1(f"{base}#{len(siblings)}".encode("utf-8")).hexdigest()[:12],
+            "level": level,
+            "value": value,
+            "label": label,
+            "parent": parent["id"] if parent else None,
+            "children": [],
+            "chunks": [],
+            "_leaves": [],
+        }
+        if parent:
+            parent["children"].append(node["id"])
+        nodes.append(node)
+        return node
+
+    for c, path, labels in iter_with_paths(chunks):
+        source = c.get("source") or "document"
+        if source not in roots:
+            roots[source] = _open("document", source, source, None)
+        if not stack or stack[0] is not roots[source]:
+            stack = [roots[source]]
+
+        # niveaux présents dans le chemin du chunk : (level, value, label)
+        wanted = [(lvl, path[lvl], labels.get(lvl) or path[lvl]) for lvl in TREE_LEVELS[1:] if path.get(lvl)]
+        depth = 1
+        for lvl, value, label in wanted:
+            if (len(stack) > depth and stack[depth]["level"] == lvl
+                    and stack[depth]["value"] == value and stack[depth]["label"] == label):
+                depth += 1
+                continue
+            del stack[depth:]
+            stack.append(_open(lvl, value, label, stack[-1]))
+            depth += 1
+        del stack[depth:]
+
+        leaf = stack[-1]
+        text = c.get("text") or ""
+        leaf["chunks"].append(str(c["id"]))
+        leaf["_leaves"].append({
+            "text": text,
+            "hash": c.get("content_hash") or content_hash(text),
+            "n_tokens": c.get("n_tokens") or count_tokens(text),
+        })
+
+    return nodes
+
+
+def _depth_order(nodes: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Nœuds groupés par profondeur, du plus profond au plus haut (ordre de résumé).
+    """
+    depth: Dict[str, int] = {}
+    layers: Dict[int, List[Dict[str, Any]]] = {}
+    for n in nodes:  # parents avant enfants
+        depth[n["id"]] = depth[n["parent"]] + 1 if n["parent"] else 0
+        layers.setdefault(depth[n["id"]], []).append(n)
+    return [layers[d] for d in sorted(layers, reverse=True)]
+
+
+# =========================
+# 2) Résumés (bornés, en cache par empreinte des enfants)
+# =========================
+
+def _node_hash(node: Dict[str, Any], by_id: Dict[str, Dict[str, Any]]) -> str:
+    parts = [f"v{PROMPT_VERSION}", OPENAI_CHAT_MODEL, str(SUMMARY_MAX_TOKENS), node["level"], node["label"]]
+    parts += [leaf["hash"] for leaf in node["_leaves"]]
+    parts += [by_id[cid]["hash"] for cid in node["children"]]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _node_inputs(node: Dict[str, Any], by_id: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Textes à résumer pour un nœud : texte des chunks rattachés puis résumés des enfants,
+    chacun tronqué au budget d'entrée.
+    """
+    items = []
+    for leaf in node["_leaves"]:
+        text, n = leaf["text"], leaf["n_tokens"]
+        if n > SUMMARY_INPUT_TOKENS:
+            text, n = truncate_tokens(text, SUMMARY_INPUT_TOKENS), SUMMARY_INPUT_TOKENS
+        items.append({"text": text, "n_tokens": n})
+    for cid in node["children"]:
+        child = by_id[cid]
+        items.append({"text": f"{child['label']}\n{child['summary']}", "n_tokens": child["n_tokens"] + 16})
+    return items
+
+
+def _summarize(label: str, level: str, texts: Sequence[str]) -> str:
+    prompt = (
+        f"Vous résumez un extrait du Code Général des Impôts marocain ({level} : {label}).\n"
+        f"Rédigez en français un résumé factuel d'au plus {SUMMARY_MAX_TOKENS} tokens qui couvre "
+        "l'ensemble des sujets traités : impôts et opérations visés, principes, exonérations, "
+        "taux, seuils, délais et numéros d'articles. N'inventez rien, pas d'introduction.\n\n"
+        "---Extraits---\n" + "\n\n---\n\n".join(texts)
+    )
+    resp = _get_client().chat.completions.create(
+        model=OPENAI_CHAT_MODEL,
+        temperature=0,
+        max_tokens=SUMMARY_MAX_TOKENS,
+        messages=[{"role": "user", "content": prompt}],
+    )
+    return truncate_tokens((resp.choices[0].message.content or "").strip(), SUMMARY_MAX_TOKENS)
+
+
+def _summarize_node(node: Dict[str, Any], by_id: Dict[str, Dict[str, Any]]) -> int:
+    """
+    Résume un nœud ; retourne le nombre d'appels LLM.
+    Pas d'appel si le contenu tient déjà dans le budget (article court, nœud à enfant unique).
+    Si les entrées dépassent SUMMARY_INPUT_TOKENS : résumés partiels puis résumé des partiels.
+    """
+    items = _node_inputs(node, by_id)
+    total = sum(it["n_tokens"] for it in items)
+    if len(items) == 1 and node["children"] and not node["_leaves"]:
+        node["summary"] = by_id[node["children"][0]]["summary"]
+        return 0
+    if total <= SUMMARY_MAX_TOKENS:
+        node["summary"] = "\n".join(it["text"] for it in items)
+        return 0
+
+    calls = 0
+    while True:
+        groups = list(pack_by_tokens(items, lambda it: it["n_tokens"], SUMMARY_INPUT_TOKENS))
+        partial = [_summarize(node["label"], node["level"], [it["text"] for it in g]) for g in groups]
+        calls += len(groups)
+        if len(partial) == 1:
+            node["summary"] = partial[0]
+            return calls
+        items = [{"text": s, "n_tokens": SUMMARY_MAX_TOKENS} for s in partial]
+
+
+def _load_previous(tree_path: Path, index_path: Path):
+    """
+    Arbre + index du build précédent : ({empreinte -> nœud}, index) ou ({}, None).
+    """
+    if not tree_path.exists():
+        return {}, None
+    prev = json.loads(tree_path.read_text(encoding="utf-8"))
+    index = faiss.read_index(str(index_path)) if index_path.exists() else None
+    if index is not None and index.ntotal != len(prev["nodes"]):
+        index = None
+    return {n["hash"]: dict(n, row=i) for i, n in enumerate(prev["nodes"])}, index
+
+
+def _embed(texts: List[str]) -> np.ndarray:
+    vecs = embed_cached(texts, lambda missing: embed_request(_get_client(), OPENAI_EMBED_MODEL, missing),
+                        OPENAI_EMBED_MODEL).copy()
+    faiss.normalize_L2(vecs)
+    return vecs
+
+
+def build_summary_tree(
+    chunks: Iterable[Dict[str, Any]],
+    tree_path: Path = SUMMARY_TREE_PATH,
+    index_path: Path = SUMMARY_TREE_INDEX_PATH,
+    incremental: bool = True,
+) -> Dict[str, int]:
+    """
+    Construit (ou met à jour) l'arbre de résumés et son index FAISS.
+    Retourne des compteurs : nœuds, résumés repris, appels LLM, vecteurs repris.
+    """
+    tree_path, index_path = Path(tree_path), Path(index_path)
+    nodes = build_tree(chunks)
+    by_id = {n["id"]: n for n in nodes}
+    prev, prev_index = _load_previous(tree_path, index_path) if incremental else ({}, None)
+
+    stats = {"nodes": len(nodes), "reused": 0, "llm_calls": 0, "vectors_reused": 0}
+
+    # résumés de bas en haut ; les nœuds d'une même profondeur sont indépendants
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as pool:
+        for layer in _depth_order(nodes):
+            todo = []
+            for n in layer:
+                n["hash"] = _node_hash(n, by_id)
+                old = prev.get(n["hash"])
+                if old is not None:
+                    n["summary"] = old["summary"]
+                    stats["reused"] += 1
+                else:
+                    todo.append(n)
+            stats["llm_calls"] += sum(pool.map(lambda n: _summarize_node(n, by_id), todo))
+            for n in layer:
+                n["n_tokens"] = count_tokens(n["summary"])
+
+    if not nodes:
+        raise RuntimeError("Aucun chunk : arbre de résumés vide")
+
+    # embeddings : repris depuis l'index précédent si même empreinte
+    rows: List[Optional[np.ndarray]] = [None] * len(nodes)
+    todo = []
+    for i, n in enumerate(nodes):
+        old = prev.get(n["hash"])
+        if prev_index is not None and old is not None:
+            rows[i] = prev_index.reconstruct(old["row"])
+            stats["vectors_reused"] += 1
+        else:
+            todo.append(i)
+    items = [(i, f"{nodes[i]['label']}\n{nodes[i]['summary']}") for i in todo]
+    for batch in pack_by_tokens(items, lambda it: nodes[it[0]]["n_tokens"] + 32, EMBED_MAX_TOKENS_PER_REQUEST):
+        for (i, _), v in zip(batch, _embed([t for _, t in batch])):
+            rows[i] = v
+    vectors = np.vstack(rows).astype("float32")
+
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+
+    out_nodes = []
+    for n in nodes:
+        out_nodes.append({
+            "id": n["id"],
+            "level": n["level"],
+            "label": n["label"],
+            "parent": n["parent"],
+            "children": n["children"],
+            "chunks": n["chunks"],
+            "hash": n["hash"],
+            "n_tokens": n["n_tokens"],
+            "summary": n["summary"],
+        })
+
+    tree_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = tree_path.with_name(tree_path.name + ".tmp")
+    tmp.write_text(json.dumps({"version": PROMPT_VERSION, "nodes": out_nodes}, ensure_ascii=False),
+                   encoding="utf-8")
+    faiss.write_index(index, str(index_path))
+    os.replace(tmp, tree_path)
+    _load_tree.cache_clear()
+    return stats
+
+
+# =========================
+# 3) Recherche : choix du niveau selon la portée de la question
+# =========================
+
+@lru_cache(maxsize=1)
+def _load_tree(tree_path: str, index_path: str):
+    data = json.loads(Path(tree_path).read_text(encoding="utf-8"))
+    nodes = data["nodes"]
+    return nodes, {n["id"]: n for n in nodes}, faiss.read_index(index_path)
+
+
+def tree_available(tree_path: Path = SUMMARY_TREE_PATH, index_path: Path = SUMMARY_TREE_INDEX_PATH) -> bool:
+    return Path(tree_path).exists() and Path(index_path).exists()
+
+
+def is_broad_question(question: str) -> bool:
+    """
+    Question de synthèse (plusieurs articles / tout un impôt) plutôt que de détail.
+    Une question qui cite un article précis n'est jamais considérée comme large.
+    """
+    if ARTICLE_RE.search(question or ""):
+        return False
+    return bool(_BROAD_RE.search(_fold(question)))
+
+
+def _ancestors(node_id: str, by_id: Dict[str, Dict[str, Any]]) -> List[str]:
+    out = []
+    parent = by_id[node_id]["parent"]
+    while parent:
+        out.append(parent)
+        parent = by_id[parent]["parent"]
+    return out
+
+
+def search_tree(
+    question: str,
+    k: int = TREE_TOP_K,
+    levels: Optional[Sequence[str]] = None,
+    q_vec: Optional[np.ndarray] = None,
+    candidates: int = 64,
+    tree_path: Path = SUMMARY_TREE_PATH,
+    index_path: Path = SUMMARY_TREE_INDEX_PATH,
+) -> List[Dict[str, Any]]:
+    """
+    Nœuds de l'arbre les plus proches de la question, au niveau adapté.
+
+    levels : niveaux autorisés ; par défaut BROAD_LEVELS si la question est large,
+             sinon PRECISE_LEVELS.
+    Les nœuds retenus ne se recouvrent pas : un nœud dont un ancêtre (ou un descendant)
+    est déjà retenu est écarté, pour ne pas envoyer deux fois le même contenu.
+
+    Retourne [{"node": {...}, "score": float}, ...] (au plus k).
+    """
+    nodes, by_id, index = _load_tree(str(tree_path), str(index_path))
+    allowed = set(levels) if levels else (BROAD_LEVELS if is_broad_question(question) else PRECISE_LEVELS)
+
+    if q_vec is None:
+        q_vec = _embed([question])
+    q_vec = np.asarray(q_vec, dtype="float32").reshape(1, -1)
+
+    # recherche restreinte aux lignes des niveaux autorisés
+    rows = np.array([i for i, n in enumerate(nodes) if n["level"] in allowed], dtype="int64")
+    if not len(rows):
+        return []
+    params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(rows))
+    scores, idx = index.search(q_vec, min(max(candidates, k), len(rows)), params=params)
+
+    results: List[Dict[str, Any]] = []
+    selected = set()
+    above = set()  # ancêtres des nœuds retenus
+    for s, i in zip(scores[0], idx[0]):
+        if i < 0:
+            continue
+        node = nodes[i]
+        lineage = _ancestors(node["id"], by_id)
+        if node["id"] in above or any(a in selected for a in lineage):
+            continue
+        results.append({"node": node, "score": float(s)})
+        selected.add(node["id"])
+        above.update(lineage)
+        if len(results) >= k:
+            break
+    return results
+
+
+def node_articles(node: Dict[str, Any], by_id: Optional[Dict[str, Dict[str, Any]]] = None,
+                  limit: int = 8) -> List[str]:
+    """
+    Articles couverts par un nœud (ses descendants de niveau article), pour les citations.
+    """
+    if by_id is None:
+        by_id = _load_tree(str(SUMMARY_TREE_PATH), str(SUMMARY_TREE_INDEX_PATH))[1]
+    out: List[str] = []
+    todo = [node["id"]]
+    while todo and len(out) < limit:
+        n = by_id[todo.pop(0)]
+        if n["level"] == "article":
+            out.append(n["label"])
+        todo.extend(n["children"])
+    return out
+
+
+# =========================
+# 4) CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Arbre de résumés hiérarchiques du CGI")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Construit / met à jour l'arbre et son index")
+    p_build.add_argument("--chunks", type=str, default=None)
+    p_build.add_argument("--full", action="store_true", help="Ignore les résumés du build précédent")
+    p_query = sub.add_parser("query", help="Nœuds retenus pour une question")
+    p_query.add_argument("question", type=str)
+    p_query.add_argument("--k", type=int, default=TREE_TOP_K)
+    p_query.add_argument("--levels", nargs="*", choices=TREE_LEVELS, default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        chunks_path = Path(args.chunks) if args.chunks else default_chunks_path()
+        t0 = time.perf_counter()
+        stats = build_summary_tree(iter_chunks(chunks_path), incremental=not args.full)
+        print(f"✅ {stats['nodes']} nœuds ({stats['reused']} résumés repris, {stats['llm_calls']} appels LLM, "
+              f"{stats['vectors_reused']} vecteurs repris) en {time.perf_counter() - t0:.1f} s")
+
+        nodes = _load_tree(str(SUMMARY_TREE_PATH), str(SUMMARY_TREE_INDEX_PATH))[0]
+        for lvl in TREE_LEVELS:
+            sel = [n for n in nodes if n["level"] == lvl]
+            if sel:
+                print(f"   {lvl:10s} {len(sel):5d} nœuds, {sum(n['n_tokens'] for n in sel):7d} tokens de résumé")
+        print(f"💾 Arbre : {SUMMARY_TREE_PATH}")
+        print(f"💾 Index : {SUMMARY_TREE_INDEX_PATH}")
+        return
+
+    t0 = time.perf_counter()
+    res = search_tree(args.question, k=args.k, levels=args.levels)
+    ms = (time.perf_counter() - t0) * 1e3
+    broad = "large" if is_broad_question(args.question) else "précise"
+    print(f"🔎 Question {broad} → {len(res)} nœuds, "
+          f"{sum(r['node']['n_tokens'] for r in res)} tokens de contexte ({ms:.0f} ms)")
+    for r in res:
+        n = r["node"]
+        print(f"\n[{n['level']}] {n['label']} (score={r['score']:.3f}, id={n['id']})")
+        print(n["summary"][:400].replace("\n", " "))
+
+
+if __name__ == "__main__":
+    main()
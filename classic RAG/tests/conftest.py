@@ -0,0 +1,6 @@
+# Les modules de "classic RAG" s'importent à plat (python build_faiss_index.py, ...) :
+# le dossier parent est ajouté au chemin d'import des tests.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,71 @@
+from article_refs import question_articles
+from cgi_structure import StructureTracker
+from lexical_index import BM25Index, article_rows, rank_article_rows, single_block
+
+CHUNKS = [
+    {"id": 1, "title": "Article 247.- Dates d'effet et dispositions transitoires", "text": "..."},
+    {"id": 2, "title": "XI . -(abrogé) 1671", "text": "..."},
+    {"id": 3, "title": "Article 247 bis1747", "text": "..."},
+    {"id": 4, "title": "Article 15 bis136 -Rémunérations allouées", "text": "..."},
+    {"id": 5, "title": "Article 42 bis252 . -Détermination de la base", "text": "..."},
+]
+
+
+def _fast_path_rows(question):
+    rows = article_rows(CHUNKS)
+    return [r for a in question_articles(question) for r in rows.get(a, [])]
+
+
+def test_suffix_glued_to_footnote_number():
+    for title, key in [
+        ("Article 15 bis136 -Rémunérations", "ARTICLE 15 BIS"),
+        ("Article 42 bis252 . -Détermination", "ARTICLE 42 BIS"),
+        ("Article 82 bis472 . -Déclaration", "ARTICLE 82 BIS"),
+        ("Article 230 bis1587 -Procédure", "ARTICLE 230 BIS"),
+        ("Article 247 bis1747", "ARTICLE 247 BIS"),
+        ("Article 9 bis.- Exonérations", "ARTICLE 9 BIS"),
+        ("Article 247.- Dates d'effet", "ARTICLE 247"),
+    ]:
+        tracker = StructureTracker()
+        tracker.observe_heading(title)
+        assert tracker.path["article"] == key
+
+
+def test_article_question_returns_base_article_only():
+    assert _fast_path_rows("que prévoit l'article 247 ?") == [0, 1]
+
+
+def test_article_bis_question_hits_fast_path():
+    assert _fast_path_rows("article 247 bis") == [2]
+
+
+# Corps du code puis annexes : les "Article 6/7" des lois de finances reproduites
+# après le code ne doivent pas rejoindre les articles 6 et 7 du CGI.
+CODE_AND_ANNEX = [
+    {"id": 10, "title": "CODE GENERAL DES IMPOTS LIVRE PREMIER ASSIETTE ET RECOUVREMENT", "text": "..."},
+    {"id": 11, "title": "Article 6.- Exonérations", "text": "Article 6.- Exonérations\nsont exonérées de l'impôt sur les sociétés"},
+    {"id": 12, "title": "D.- (abrogé) 59", "text": "D.- (abrogé)"},
+    {"id": 13, "title": "Article 7.- Conditions d'exonération", "text": "Article 7.- Conditions d'exonération\n..."},
+    {"id": 14, "title": "ANNEXES AU CODE GENERAL DES IMPOTS", "text": "..."},
+    {"id": 15, "title": "Article 6", "text": "Dispositions de la loi de finances pour l'année budgétaire 2023"},
+    {"id": 16, "title": "Article 7", "text": "Dispositions de la loi de finances pour l'année budgétaire 2023"},
+    {"id": 17, "title": "ARTICLE 7 du décret n° 2-08-124", "text": "..."},
+]
+
+
+def test_annex_articles_are_not_code_articles():
+    rows = article_rows(CODE_AND_ANNEX)
+    assert rows["ARTICLE 6"] == [1, 2]
+    assert rows["ARTICLE 7"] == [3]
+    assert all(single_block(r) for r in rows.values())
+
+
+def test_article_heading_ranked_before_repealed_stub():
+    rows = article_rows(CODE_AND_ANNEX)
+    bm25 = BM25Index([c["text"] for c in CODE_AND_ANNEX])
+    ranked = rank_article_rows(bm25, "que prévoit l'article 6 ?", rows["ARTICLE 6"], 2)
+    assert [r for r, _ in ranked] == [1, 2]
+
+
+def test_split_article_is_not_a_single_block():
+    assert not single_block([408, 410])
@@ -0,0 +1,24 @@
+import numpy as np
+
+from chunk_filters import ChunkAttributes, filter_key
+
+CHUNKS = [
+    {"id": 1, "title": "CODE GENERAL DES IMPOTS LIVRE PREMIER ASSIETTE ET RECOUVREMENT", "text": "..."},
+    {"id": 2, "title": "Article 6.- Exonérations", "text": "..."},
+    {"id": 3, "title": "D.- (abrogé) 59", "text": "..."},
+    {"id": 4, "title": "Article 12.- Produits imposables", "text": "..."},
+    {"id": 5, "title": "ANNEXES AU CODE GENERAL DES IMPOTS", "text": "..."},
+    {"id": 6, "title": "Article 6", "text": "Dispositions de la loi de finances"},
+    {"id": 7, "title": "ARTICLE 7 du décret n° 2-08-124", "text": "..."},
+]
+
+
+def _rows(filters):
+    attrs = ChunkAttributes(CHUNKS)
+    mask = np.unpackbits(attrs.bitmap(filter_key(filters)), bitorder="little")[:attrs.n]
+    return np.flatnonzero(mask).tolist()
+
+
+def test_article_range_excludes_annex_articles():
+    assert _rows({"articles": (1, 10)}) == [1, 2]
+    assert _rows({"articles": 6}) == [1, 2]
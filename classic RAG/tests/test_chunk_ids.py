@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import pytest
+
+import build_chunks_from_markdown as B
+
+MD = """# CODE GÉNÉRAL DES IMPÔTS
+
+## LIVRE PREMIER : ASSIETTE ET RECOUVREMENT
+
+## Article premier.- Champ d'application
+
+I.- Sont soumises à l'impôt sur les sociétés...
+
+## I.- Définitions
+
+Texte de la section.
+
+## Article 2.- Personnes imposables
+
+Texte de l'article 2.
+
+## I.- Définitions
+
+Autre section de même titre.
+"""
+
+
+def _write(tmp_path: Path, name: str) -> Path:
+    path = tmp_path / name
+    path.write_text(MD, encoding="utf-8")
+    return path
+
+
+def _chunks(paths, monkeypatch):
+    monkeypatch.setattr(B, "count_tokens", lambda text: len(text.split()))  # sans tiktoken
+    return list(B.iter_corpus_chunks(paths))
+
+
+def test_two_editions_of_one_code_are_rejected(tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        _chunks([_write(tmp_path, "cgi-2024.md"), _write(tmp_path, "cgi-2025.md")], monkeypatch)
+
+
+def test_ids_unique_across_families(tmp_path, monkeypatch):
+    chunks = _chunks([_write(tmp_path, "cgi-2025.md"), _write(tmp_path, "lf-2025.md")], monkeypatch)
+    ids = [c["id"] for c in chunks]
+    assert len(chunks) == 10
+    assert len(set(ids)) == len(ids)
+
+
+def test_ids_stable_between_single_edition_builds(tmp_path, monkeypatch):
+    old = _chunks([_write(tmp_path, "cgi-2024.md")], monkeypatch)
+    new = _chunks([_write(tmp_path, "cgi-2025.md")], monkeypatch)
+    assert [c["id"] for c in old] == [c["id"] for c in new]
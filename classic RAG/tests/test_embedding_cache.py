@@ -0,0 +1,21 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache, cache_key
+
+
+def _stored_bytes(cache):
+    (n,) = cache._con.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()
+    return n
+
+
+def test_size_counter_ignores_replaced_keys(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", max_mb=1)
+    keys = [cache_key(f"texte {i}", "m") for i in range(100)]
+    for _ in range(50):  # 50 × 25,6 ko : sans dédoublonnage, le compteur dépasserait 1 Mo
+        cache.put_many(keys, np.ones((100, 64), dtype="float32"), "m")
+    cache.put_many(keys[:1] * 3, np.ones((3, 64), dtype="float32"), "m")
+    cache.put_many(keys[:10], np.ones((10, 128), dtype="float32"), "m")
+
+    assert cache._bytes == _stored_bytes(cache) == 90 * 64 * 4 + 10 * 128 * 4
+    assert len(cache.get_many(keys)) == 100 and cache.misses == 0
+    cache.close()
@@ -0,0 +1,18 @@
+import numpy as np
+
+from mmr import mmr_order
+
+QUERY = np.array([1.0, 0.0, 0.0])
+# cosinus à la question : 2 > 1 > 0 ; rerank : 0 > 1 > 2
+VECTORS = np.array([[0.2, 1.0, 0.0], [0.6, 0.0, 1.0], [1.0, 0.1, 0.0]])
+RERANK = [4.0, 1.5, -3.0]
+
+
+def test_rerank_scores_drive_relevance():
+    assert mmr_order(QUERY, VECTORS, lambda_=1.0, relevance=RERANK) == [0, 1, 2]
+    assert mmr_order(QUERY, VECTORS, lambda_=1.0, first=2) == [2, 1, 0]
+
+
+def test_duplicate_pushed_back():
+    vectors = np.array([[1.0, 0.0], [1.0, 0.01], [0.0, 1.0]])
+    assert mmr_order(np.array([1.0, 0.0]), vectors, lambda_=0.5, relevance=[3.0, 2.9, 1.0]) == [0, 2, 1]
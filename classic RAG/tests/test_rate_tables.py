@@ -0,0 +1,21 @@
+from rate_tables import extract_facts
+
+CHUNKS = [
+    {"id": 1, "title": "Article 19.- Taux d’imposition", "text": "## Article 19.- Taux d’imposition\n\nI.- L'impôt est calculé :"},
+    {"id": 2, "title": "H.- (abrogé) 442", "text": (
+        "## H.- (abrogé) 442\n\n"
+        "B.-35%141, en ce qui concerne les sociétés dont le bénéfice net est supérieur.\n"
+        "- -0,5% 443 du chiffre d'affaires encaissé ;\n"
+        "- le montant brut qui ne dépasse pas annuellement 168 000 dirhams329 ;"
+    )},
+]
+
+
+def test_footnote_numbers_stripped_from_fact_labels():
+    facts = list(extract_facts(CHUNKS))
+    labels = {f["value"]: f["label"] for f in facts}
+    assert labels[35.0].startswith("B.-35%, en ce qui concerne")
+    assert labels[0.5].startswith("0,5% du chiffre")
+    assert labels[168000.0].endswith("168 000 dirhams ;")
+    assert {f["section"] for f in facts} == {"H.- (abrogé)"}
+    assert {f["article"] for f in facts} == {"ARTICLE 19"}
@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from rerank_onnx import OnnxCrossEncoder
+
+
+class _Tokenizer:
+    # un token par mot du texte : longueur connue à l'avance
+    def encode_batch(self, pairs):
+        out = []
+        for q, t in pairs:
+            ids = [len(w) + 1 for w in f"{q} {t}".split()]
+            out.append(SimpleNamespace(ids=ids, type_ids=[0] * len(ids)))
+        return out
+
+
+class _Session:
+    # logit = somme des ids non masqués : dépend du contenu, pas du padding
+    def __init__(self):
+        self.batches = []
+
+    def run(self, _outputs, feed):
+        self.batches.append({k: v.copy() for k, v in feed.items()})
+        logits = (feed["input_ids"] * feed["attention_mask"]).sum(axis=1, keepdims=True)
+        return [logits.astype("float32")]
+
+
+def _encoder(sigmoid=False):
+    ce = OnnxCrossEncoder.__new__(OnnxCrossEncoder)  # sans onnxruntime ni bundle
+    ce.tokenizer = _Tokenizer()
+    ce.session = _Session()
+    ce.input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    ce.pad_id = 0
+    ce.sigmoid = sigmoid
+    return ce
+
+
+PAIRS = [
+    ("q", "un texte nettement plus long que les autres candidats"),
+    ("q", "court"),
+    ("q", "longueur moyenne ici"),
+    ("q", ""),
+    ("q", "encore un texte de longueur moyenne"),
+]
+
+
+def _expected(pairs):
+    return np.array([sum(e.ids) for e in _Tokenizer().encode_batch(pairs)], dtype="float32")
+
+
+def test_scores_follow_pair_order():
+    ce = _encoder()
+    np.testing.assert_allclose(ce.predict(PAIRS, batch_size=2), _expected(PAIRS))
+
+
+def test_batches_sorted_by_length_and_padded_to_batch_width():
+    ce = _encoder()
+    ce.predict(PAIRS, batch_size=2)
+    widths = [b["input_ids"].shape[1] for b in ce.session.batches]
+    assert widths == sorted(widths)
+    for b in ce.session.batches:
+        lengths = b["attention_mask"].sum(axis=1)
+        assert lengths.max() == b["input_ids"].shape[1]
+        for row, n in zip(b["input_ids"], lengths):
+            assert (row[n:] == 0).all()
+
+
+def test_sigmoid_and_empty_input():
+    ce = _encoder(sigmoid=True)
+    scores = ce.predict(PAIRS[:2])
+    np.testing.assert_allclose(scores, 1 / (1 + np.exp(-_expected(PAIRS[:2]))), rtol=1e-6)
+    assert len(_encoder().predict([])) == 0
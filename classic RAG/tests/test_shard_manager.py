@@ -0,0 +1,29 @@
+import numpy as np
+
+from shard_manager import ShardManager
+
+# deux shards, deux questions : (distances, lignes), ligne -1 = pas de résultat
+PARTS = [
+    (np.array([[0.1, 0.2, 0.3], [0.5, 0.6, np.nan]], dtype="float32"), np.array([[4, 5, 6], [7, 8, -1]])),
+    (np.array([[10.0, 20.0, 30.0], [0.2, 0.3, 0.4]], dtype="float32"), np.array([[0, 1, 2], [3, 9, 2]])),
+]
+
+
+def _manager(metric="l2"):
+    manager = ShardManager.__new__(ShardManager)  # sans shards sur disque
+    manager.metric = metric
+    return manager
+
+
+def test_same_dims_merge_by_raw_score():
+    fused = _manager()._fuse_by_score(PARTS, 3)
+    assert [(o, r) for o, r, _ in fused[0]] == [(0, 4), (0, 5), (0, 6)]
+    assert [(o, r) for o, r, _ in fused[1]] == [(1, 3), (1, 9), (1, 2)]
+
+
+def test_mixed_dims_merge_by_rank():
+    fused = ShardManager._fuse_by_rank(PARTS, 4)
+    # classements entrelacés : les distances d'un espace plus grand ne dominent plus
+    assert [(o, r) for o, r, _ in fused[0]] == [(0, 4), (1, 0), (0, 5), (1, 1)]
+    assert fused[0][1][2] == 10.0
+    assert (0, -1) not in [(o, r) for o, r, _ in fused[1]]
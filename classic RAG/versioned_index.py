@@ -0,0 +1,254 @@
+# src/versioned_index.py
+"""
+Index versionné des éditions du CGI : une loi de finances ne modifie qu'une petite
+partie des articles, on ne stocke (et n'embedde) que les deltas.
+
+    VERSIONED_CHUNKS_PATH : une ligne par version d'un chunk
+        {...chunk, "version_id": "<id>@2024", "valid_from": 2024, "valid_to": 2025 | null, "faiss_id"}
+    VERSIONED_INDEX_PATH  : un vecteur par version (ids stables, méta "editions")
+
+- `add_edition(2025, chunks)` : chunk inchangé (même id, même content_hash) → la
+  version en cours reste valide, rien n'est embeddé ; chunk modifié → sa version
+  est close (valid_to = 2025) et une nouvelle est embeddée ; chunk absent → close ;
+- `search_chunks(question, as_of=2024)` (retriever_faiss) : l'édition en vigueur
+  (la dernière ≤ 2024) a un bitset de validité précalculé au chargement, passé à
+  FAISS comme IDSelector : pas de coût de requête supplémentaire, seules les
+  versions valides sont scorées. Combinable avec `filters` (chunk_filters.py).
+
+Les éditions s'ajoutent dans l'ordre chronologique.
+
+    python versioned_index.py add 2024 --chunks data/json/cgi-2024_chunks.json
+    python versioned_index.py add 2025 --chunks data/json/cgi-2025_chunks.json
+    python versioned_index.py list
+"""
+import argparse
+import json
+import os
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from ann_index import (
+    METRICS,
+    apply_search_params,
+    convert_index,
+    load_index,
+    load_meta,
+    save_index,
+    search_parameters,
+)
+from cgi_structure import iter_with_paths
+from chunk_filters import ChunkAttributes, id_selector
+from chunk_index import FaissRowMap, chunk_faiss_id, chunk_faiss_ids
+from chunks_io import content_hash, iter_chunks
+from config_cgi import ANN_EF_SEARCH, ANN_NPROBE, VERSIONED_CHUNKS_PATH, VERSIONED_INDEX_PATH
+
+_OPEN = np.iinfo("int32").max  # valid_to d'une version toujours en vigueur
+_SAVE_ARGS = ("spec", "factory", "metric", "nprobe", "efSearch", "dim", "ntotal", "report")
+
+
+def version_id(chunk_id: Any, edition: int) -> str:
+    return f"{chunk_id}@{edition}"
+
+
+class VersionedStore:
+    """
+    Versions des chunks + index FAISS des versions (ligne i de `records` ↔ id `faiss_id`).
+    """
+
+    def __init__(self, index_path: Path = VERSIONED_INDEX_PATH, records_path: Path = VERSIONED_CHUNKS_PATH,
+                 mmap: bool = True):
+        self.index_path = Path(index_path)
+        self.records_path = Path(records_path)
+        self.meta = load_meta(self.index_path)
+        exists = self.index_path.exists() and self.records_path.exists()
+        self.index = load_index(self.index_path, mmap=mmap) if exists else None
+        self.records: List[Dict[str, Any]] = list(iter_chunks(self.records_path)) if exists else []
+        self.editions: List[int] = sorted(self.meta.get("editions", [])) if exists else []
+        self.dims = self.meta.get("dims")
+        self._index_intervals()
+
+    def _index_intervals(self) -> None:
+        # intervalles de validité → un bitset par édition (précalculé, ordre "little" des IDSelectorBitmap)
+        self.rows = FaissRowMap(r["version_id"] for r in self.records)
+        self.valid_from = np.array([r["valid_from"] for r in self.records], dtype="int32")
+        self.valid_to = np.array([_OPEN if r.get("valid_to") is None else r["valid_to"] for r in self.records],
+                                 dtype="int32")
+        self.edition_bits = {
+            e: np.packbits((self.valid_from <= e) & (self.valid_to > e), bitorder="little") for e in self.editions
+        }
+        self._attrs: Optional[ChunkAttributes] = None
+        self._filters: Dict[Tuple, Dict[str, Any]] = {}
+
+    # --- lecture ---
+
+    def edition_at(self, as_of: int) -> int:
+        """
+        Édition en vigueur à la date `as_of` (année) : la dernière ≤ as_of.
+        """
+        pos = bisect_right(self.editions, int(as_of))
+        if not pos:
+            raise ValueError(f"aucune édition ≤ {as_of} (éditions indexées : {self.editions})")
+        return self.editions[pos - 1]
+
+    def row_filter(self, as_of: int, key: Optional[Tuple] = None) -> Dict[str, Any]:
+        """
+        Masque des versions valides à `as_of` (∩ filtre de métadonnées `key`) et paramètres
+        de recherche FAISS correspondants, même forme que `retriever_faiss._row_filter`.
+        Compilé une fois par (édition, filtre).
+        """
+        edition = self.edition_at(as_of)
+        cache_key = (edition, key)
+        if cache_key not in self._filters:
+            bitmap = self.edition_bits[edition]
+            if key:
+                if self._attrs is None:
+                    self._attrs = ChunkAttributes(self.records)  # chemin structurel stocké par version
+                bitmap = bitmap & self._attrs.bitmap(key)
+            n = len(self.records)
+            mask = np.unpackbits(bitmap, count=n, bitorder="little").astype(bool)
+            self._filters[cache_key] = {
+                "chunks": mask,
+                "n_chunks": int(mask.sum()),
+                "faiss_params": search_parameters(self.index, id_selector(bitmap, n, self.rows.ids)),
+                "edition": edition,
+            }
+        return self._filters[cache_key]
+
+    def candidate(self, row: int, rank: Optional[int], dist: Optional[float]) -> Dict[str, Any]:
+        return {
+            "rank_faiss": rank,
+            "score_faiss": dist,
+            "score_rerank": None,
+            "chunk": self.records[row],
+        }
+
+    # --- ajout d'une édition ---
+
+    def add_edition(self, edition: int, chunks: Iterable[Dict[str, Any]],
+                    embed_fn: Callable[[List[str]], np.ndarray], spec: str = "flat") -> Dict[str, int]:
+        """
+        Ajoute une édition : seules les versions nouvelles (chunks ajoutés ou modifiés)
+        sont embeddées (`embed_fn(textes)` → [n, d]). Retourne les compteurs.
+        """
+        edition = int(edition)
+        if self.editions and edition <= self.editions[-1]:
+            raise ValueError(f"édition {edition} ≤ dernière édition indexée ({self.editions[-1]}) : "
+                             "les éditions s'ajoutent dans l'ordre")
+        current = {str(r["id"]): r for r in self.records if r.get("valid_to") is None}
+        stats = {"shared": 0, "changed": 0, "added": 0, "repealed": 0}
+        fresh: List[Dict[str, Any]] = []
+        seen = set()
+        for c, path, _ in iter_with_paths(chunks):
+            cid = str(c["id"])
+            seen.add(cid)
+            h = c.get("content_hash") or content_hash(c.get("text") or "")
+            prev = current.get(cid)
+            if prev is not None and prev["content_hash"] == h:
+                stats["shared"] += 1
+                continue
+            if prev is not None:
+                prev["valid_to"] = edition
+                stats["changed"] += 1
+            else:
+                stats["added"] += 1
+            vid = version_id(c["id"], edition)
+            fresh.append(dict(c, path=path, content_hash=h, version_id=vid, valid_from=edition,
+                              valid_to=None, faiss_id=chunk_faiss_id(vid)))
+        for cid, prev in current.items():
+            if cid not in seen:
+                prev["valid_to"] = edition  # article abrogé
+                stats["repealed"] += 1
+
+        if fresh:
+            vectors = np.ascontiguousarray(embed_fn([c["text"] for c in fresh]), dtype="float32")
+            ids = chunk_faiss_ids(c["version_id"] for c in fresh)
+            if self.index is None:
+                flat = faiss.IndexFlat(vectors.shape[1], METRICS["l2"])
+                flat.add(vectors)
+                self.index, factory = convert_index(flat, spec, "l2", ids=ids)
+                apply_search_params(self.index, ANN_NPROBE, ANN_EF_SEARCH)
+                self.meta = {"spec": spec, "factory": factory, "metric": "l2"}
+            else:
+                self.index.add_with_ids(vectors, ids)
+        self.records.extend(fresh)
+        self.editions.append(edition)
+        self._index_intervals()
+        return stats
+
+    def save(self, **extra: Any) -> None:
+        """
+        Index (+ méta "editions") puis versions, écrits atomiquement (tmp + os.replace).
+        """
+        m = self.meta
+        meta = {k: v for k, v in m.items() if k not in _SAVE_ARGS}
+        meta.update(extra, id_map=True, editions=self.editions)
+        save_index(self.index, self.index_path, spec=m.get("spec", "flat"), factory=m.get("factory", "Flat"),
+                   metric=m.get("metric", "l2"), nprobe=m.get("nprobe", ANN_NPROBE),
+                   ef_search=m.get("efSearch", ANN_EF_SEARCH), **meta)
+        self.meta = load_meta(self.index_path)
+        self.dims = self.meta.get("dims")
+
+        tmp = self.records_path.with_name(self.records_path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for r in self.records:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.records_path)
+
+
+def versioned_index_available() -> bool:
+    return Path(VERSIONED_INDEX_PATH).exists() and Path(VERSIONED_CHUNKS_PATH).exists()
+
+
+# =========================
+# CLI
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description="Index versionné des éditions du CGI (deltas seulement)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_add = sub.add_parser("add", help="Ajoute une édition (année) à partir de ses chunks")
+    p_add.add_argument("edition", type=int)
+    p_add.add_argument("--chunks", type=str, required=True)
+    p_add.add_argument("--index-spec", type=str, default="flat", help="spec ANN à la création (ids stables)")
+    p_add.add_argument("--dims", type=int, choices=[256, 512, 1024, 1536], default=None)
+    sub.add_parser("list", help="Éditions, versions valides et partage entre éditions")
+    args = parser.parse_args()
+
+    if args.cmd == "add":
+        from build_faiss_index import EMBED_MODEL, _embed_batch
+        from config_cgi import EMBED_MAX_INPUT_TOKENS
+        from passages import truncate_tokens
+
+        store = VersionedStore(mmap=False)
+        if store.index is not None and store.dims != args.dims:
+            raise SystemExit(f"❌ index versionné en dims={store.dims} (demandé : {args.dims})")
+        stats = store.add_edition(
+            args.edition, iter_chunks(Path(args.chunks)),
+            lambda texts: _embed_batch([truncate_tokens(t, EMBED_MAX_INPUT_TOKENS) for t in texts], args.dims),
+            spec=args.index_spec,
+        )
+        store.save(embed_model=EMBED_MODEL, dims=args.dims)
+        print(f"✅ Édition {args.edition} : {stats['shared']} chunks partagés, {stats['changed']} modifiés, "
+              f"{stats['added']} ajoutés, {stats['repealed']} abrogés → "
+              f"{stats['changed'] + stats['added']} embeddés")
+        print(f"💾 {store.index_path} ({store.index.ntotal} versions), {store.records_path}")
+        return
+
+    store = VersionedStore()
+    if not store.editions:
+        raise SystemExit(f"❌ Aucune édition dans {store.records_path} (python versioned_index.py add ...)")
+    total = 0
+    for e in store.editions:
+        n = int(np.unpackbits(store.edition_bits[e], count=len(store.records), bitorder="little").sum())
+        total += n
+        print(f"📅 {e} : {n} chunks en vigueur")
+    print(f"📦 {len(store.records)} versions stockées pour {total} chunks × éditions "
+          f"({len(store.records) / max(1, total):.0%} d'une copie complète par édition)")
+
+
+if __name__ == "__main__":
+    main()